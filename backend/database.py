@@ -0,0 +1,151 @@
+"""
+Provedor único de acesso ao MongoDB
+Um só AsyncIOMotorClient (e portanto um só pool de conexões) por processo,
+aberto/fechado pelo lifespan da aplicação e compartilhado por rotas, socket e serviços.
+
+Variáveis de ambiente:
+- MONGO_URL / DB_NAME
+- MONGO_MAX_POOL_SIZE (padrão 100), MONGO_MIN_POOL_SIZE (padrão 0)
+- MONGO_MAX_IDLE_TIME_MS (padrão 60000)
+- MONGO_SERVER_SELECTION_TIMEOUT_MS (padrão 5000), MONGO_CONNECT_TIMEOUT_MS (padrão 10000)
+- MONGO_READ_PREFERENCE (primary, primaryPreferred, secondary, secondaryPreferred, nearest)
+- MONGO_WRITE_CONCERNS: sobrescreve o write concern por coleção, ex.: "transactions=majority,user_access=1"
+"""
+import os
+import logging
+from typing import Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import WriteConcern
+
+logger = logging.getLogger(__name__)
+
+# Write concern padrão por coleção (as demais usam o padrão do cluster)
+DEFAULT_WRITE_CONCERNS: Dict[str, WriteConcern] = {
+    "transactions": WriteConcern(w="majority"),
+    "payment_settings": WriteConcern(w="majority"),
+    "webhook_events": WriteConcern(w="majority"),
+    "certificates": WriteConcern(w="majority"),
+}
+
+
+def _parse_write_concerns(raw: str) -> Dict[str, WriteConcern]:
+    """Converte "colecao=w,colecao=w" em um dicionário de WriteConcern"""
+    concerns = {}
+    for item in raw.split(","):
+        if "=" not in item:
+            continue
+        name, w = (part.strip() for part in item.split("=", 1))
+        if not name or not w:
+            continue
+        concerns[name] = WriteConcern(w=int(w) if w.isdigit() else w)
+    return concerns
+
+
+class DatabaseProvider:
+    """Mantém o client compartilhado e entrega database/coleções configuradas"""
+
+    def __init__(self):
+        self._client: Optional[AsyncIOMotorClient] = None
+        self._database: Optional[AsyncIOMotorDatabase] = None
+        self._collections: Dict[str, AsyncIOMotorCollection] = {}
+        self.write_concerns: Dict[str, WriteConcern] = dict(DEFAULT_WRITE_CONCERNS)
+
+    def connect(self, **client_options) -> AsyncIOMotorDatabase:
+        """Cria o client (idempotente). client_options extras vão direto ao AsyncIOMotorClient"""
+        if self._database is not None:
+            return self._database
+
+        options = {
+            "maxPoolSize": int(os.environ.get('MONGO_MAX_POOL_SIZE', 100)),
+            "minPoolSize": int(os.environ.get('MONGO_MIN_POOL_SIZE', 0)),
+            "maxIdleTimeMS": int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 60000)),
+            "serverSelectionTimeoutMS": int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+            "connectTimeoutMS": int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 10000)),
+            "readPreference": os.environ.get('MONGO_READ_PREFERENCE', 'primary'),
+            # Datas BSON voltam como datetime UTC com fuso (serializadas com +00:00)
+            "tz_aware": True,
+        }
+        options.update(client_options)
+
+        self._client = AsyncIOMotorClient(os.environ['MONGO_URL'], **options)
+        self._database = self._client[os.environ['DB_NAME']]
+        self.write_concerns.update(_parse_write_concerns(os.environ.get('MONGO_WRITE_CONCERNS', '')))
+        self._collections = {}
+
+        logger.info(
+            "MongoDB conectado: %s (maxPoolSize=%s)",
+            os.environ['DB_NAME'], self._client.options.pool_options.max_pool_size
+        )
+        return self._database
+
+    def close(self):
+        """Fecha o pool de conexões"""
+        if self._client is not None:
+            self._client.close()
+        self._client = None
+        self._database = None
+        self._collections = {}
+
+    @property
+    def client(self) -> AsyncIOMotorClient:
+        self.connect()
+        return self._client
+
+    @property
+    def database(self) -> AsyncIOMotorDatabase:
+        return self.connect()
+
+    def collection(self, name: str) -> AsyncIOMotorCollection:
+        """Retorna a coleção com o write concern configurado (cacheada)"""
+        coll = self._collections.get(name)
+        if coll is None:
+            database = self.connect()
+            write_concern = self.write_concerns.get(name)
+            if write_concern is not None:
+                coll = database.get_collection(name, write_concern=write_concern)
+            else:
+                coll = database[name]
+            self._collections[name] = coll
+        return coll
+
+
+class DatabaseProxy:
+    """
+    Substituto do antigo `db = client[DB_NAME]` de cada módulo.
+    Resolve as coleções no provedor compartilhado no momento do uso,
+    então pode ser importado antes do lifespan abrir a conexão.
+    """
+
+    def __init__(self, provider: DatabaseProvider):
+        self._provider = provider
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self._provider.collection(name)
+
+    def __getitem__(self, name: str) -> AsyncIOMotorCollection:
+        return self._provider.collection(name)
+
+    async def command(self, *args, **kwargs):
+        return await self._provider.database.command(*args, **kwargs)
+
+    async def list_collection_names(self, *args, **kwargs):
+        return await self._provider.database.list_collection_names(*args, **kwargs)
+
+
+provider = DatabaseProvider()
+db = DatabaseProxy(provider)
+
+
+async def get_db() -> AsyncIOMotorDatabase:
+    """Dependência FastAPI: `db = Depends(get_db)`"""
+    return provider.database
+
+
+def get_collection(name: str):
+    """Fábrica de dependência para uma coleção: `Depends(get_collection("users"))`"""
+    async def dependency() -> AsyncIOMotorCollection:
+        return provider.collection(name)
+    return dependency
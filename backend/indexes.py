@@ -0,0 +1,398 @@
+"""
+Registro declarativo de índices do MongoDB
+Uma entrada por coleção, derivada das consultas feitas em backend/routes.
+Aplicado de forma idempotente no startup (database lifespan) e pelo init_database.py.
+
+Os índices são comparados pela chave (não pelo nome), então índices antigos
+criados com nome automático ("user_id_1") são reconhecidos e não duplicados.
+Índices existentes que não estão no registro são apenas reportados, nunca removidos.
+"""
+import logging
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Opções de índice que, se diferentes, caracterizam drift
+_COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+
+def _index(keys, **options) -> IndexModel:
+    if isinstance(keys, str):
+        keys = [(keys, ASCENDING)]
+    if "name" not in options:
+        options["name"] = "_".join(f"{field}_{direction}" for field, direction in keys)
+    return IndexModel(keys, **options)
+
+
+INDEX_REGISTRY: Dict[str, List[IndexModel]] = {
+    # ==================== USUÁRIOS ====================
+    "users": [
+        _index("id", unique=True),
+        _index("email", unique=True),
+        _index([("role", ASCENDING), ("points", DESCENDING)]),
+        _index([("supervisor_id", ASCENDING), ("role", ASCENDING)]),
+        _index([("role", ASCENDING), ("onboarding_stage", ASCENDING)]),
+        _index([("role", ASCENDING), ("created_at", ASCENDING)]),
+        _index([("category_id", ASCENDING), ("last_login", ASCENDING)]),
+        _index("rank_updated_at"),
+    ],
+    "user_accesses": [
+        _index([("user_id", ASCENDING), ("date", ASCENDING)]),
+        _index("date"),
+    ],
+    "user_access": [
+        _index([("user_id", ASCENDING), ("accessed_at", DESCENDING)]),
+        _index([("user_id", ASCENDING), ("date", ASCENDING)]),
+    ],
+    "points_ledger": [
+        _index("id", unique=True),
+        _index([("user_id", ASCENDING), ("key", ASCENDING)], unique=True,
+               partialFilterExpression={"key": {"$type": "string"}}),
+        _index([("user_id", ASCENDING), ("created_at", DESCENDING)]),
+        # Lançamentos ainda não aplicados (points.apply_pending)
+        _index([("applied", ASCENDING), ("created_at", ASCENDING)],
+               partialFilterExpression={"applied": False}),
+    ],
+    "points_daily": [
+        _index([("user_id", ASCENDING), ("day", ASCENDING)], unique=True),
+        _index([("role", ASCENDING), ("day", ASCENDING)]),
+        _index([("supervisor_id", ASCENDING), ("role", ASCENDING), ("day", ASCENDING)]),
+        _index([("category_id", ASCENDING), ("role", ASCENDING), ("day", ASCENDING)]),
+    ],
+    "activity_rollups": [
+        _index([("user_id", ASCENDING), ("day", ASCENDING), ("hour", ASCENDING)], unique=True),
+        _index([("supervisor_id", ASCENDING), ("role", ASCENDING), ("day", ASCENDING)]),
+        _index([("role", ASCENDING), ("day", ASCENDING)]),
+    ],
+    "user_streaks": [
+        _index("user_id"),
+    ],
+    "user_categories": [
+        _index("id", unique=True),
+        _index("name"),
+    ],
+    "supervisor_links": [
+        _index([("token", ASCENDING), ("active", ASCENDING)]),
+        _index([("supervisor_id", ASCENDING), ("active", ASCENDING)]),
+    ],
+
+    # ==================== CONTEÚDO ====================
+    "modules": [
+        _index("id", unique=True),
+        _index("order"),
+        _index("is_acolhimento"),
+    ],
+    "chapters": [
+        _index("id", unique=True),
+        _index([("module_id", ASCENDING), ("order", ASCENDING)]),
+    ],
+    "user_progress": [
+        # Único: o progresso é gravado com upsert por capítulo (migração 0003 remove duplicatas)
+        _index([("user_id", ASCENDING), ("chapter_id", ASCENDING)], unique=True),
+        _index([("user_id", ASCENDING), ("module_id", ASCENDING), ("completed", ASCENDING)]),
+        _index([("user_id", ASCENDING), ("completed", ASCENDING), ("completed_at", ASCENDING)]),
+        # Conclusões recentes de todos os usuários (chapter_completions.reconcile, desafios)
+        _index([("completed", ASCENDING), ("completed_at", ASCENDING)]),
+        _index("chapter_id"),
+        _index("module_id"),
+    ],
+    "user_module_progress": [
+        _index([("user_id", ASCENDING), ("module_id", ASCENDING)], unique=True),
+        _index([("user_id", ASCENDING), ("completed", ASCENDING)]),
+        _index("module_id"),
+    ],
+    "favorites": [
+        _index([("user_id", ASCENDING), ("chapter_id", ASCENDING)]),
+    ],
+    "file_repository": [
+        _index("id", unique=True),
+        _index("folder_id"),
+    ],
+    "file_folders": [
+        _index("id", unique=True),
+        _index("order"),
+    ],
+    "ozoxx_cast_videos": [
+        _index("id", unique=True),
+        _index("order"),
+    ],
+    "banners": [
+        _index([("active", ASCENDING), ("order", ASCENDING)]),
+    ],
+    "posts": [
+        _index([("active", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+
+    # ==================== AVALIAÇÕES E CERTIFICADOS ====================
+    "assessments": [
+        _index("id", unique=True),
+        _index("module_id"),
+    ],
+    "questions": [
+        _index("assessment_id"),
+    ],
+    "user_assessments": [
+        _index([("user_id", ASCENDING), ("assessment_id", ASCENDING), ("completed_at", DESCENDING)]),
+        _index([("assessment_id", ASCENDING), ("user_id", ASCENDING)]),
+    ],
+    "certificates": [
+        _index([("user_id", ASCENDING), ("module_id", ASCENDING)]),
+        _index([("user_id", ASCENDING), ("created_at", DESCENDING)]),
+        _index("module_id"),
+    ],
+    "certificate_jobs": [
+        _index("id", unique=True),
+        _index([("module_id", ASCENDING), ("status", ASCENDING)]),
+        _index("status"),
+        _index([("created_at", DESCENDING)]),
+    ],
+
+    # ==================== GAMIFICAÇÃO ====================
+    "badges": [
+        _index("id", unique=True),
+        _index("active"),
+    ],
+    "user_badges": [
+        _index([("user_id", ASCENDING), ("badge_id", ASCENDING)]),
+        _index("badge_id"),
+    ],
+    "weekly_challenges": [
+        _index("id", unique=True),
+        _index([("active", ASCENDING), ("start_date", ASCENDING), ("end_date", ASCENDING)]),
+    ],
+    "user_challenge_progress": [
+        _index([("user_id", ASCENDING), ("challenge_id", ASCENDING)]),
+        _index([("user_id", ASCENDING), ("completed", ASCENDING)]),
+        _index("challenge_id"),
+    ],
+    "levels": [
+        _index("id", unique=True),
+        _index("min_points"),
+    ],
+    "rewards": [
+        _index("id", unique=True),
+        _index("active"),
+    ],
+    "reward_redemptions": [
+        _index([("user_id", ASCENDING), ("reward_id", ASCENDING), ("status", ASCENDING)]),
+        _index("status"),
+    ],
+
+    # ==================== COMUNICAÇÃO ====================
+    "notifications": [
+        _index([("user_id", ASCENDING), ("created_at", DESCENDING)]),
+        _index([("user_id", ASCENDING), ("read", ASCENDING)]),
+        _index("id"),
+        # Resumos abertos de notificações dos admins
+        _index([("digest_key", ASCENDING), ("read", ASCENDING)],
+               partialFilterExpression={"digest_key": {"$type": "string"}}),
+    ],
+    "conversations": [
+        _index("id", unique=True),
+        _index([("user_id", ASCENDING), ("status", ASCENDING)]),
+        _index([("status", ASCENDING), ("last_message_at", DESCENDING)]),
+        _index("last_message_at"),
+    ],
+    "messages": [
+        # Paginação por cursor (created_at, id) dentro da conversa. Substitui
+        # conversation_id_1_created_at_1, que é prefixo deste e ficou redundante: em bancos
+        # antigos aparece em "extra" no GET /system/indexes e pode ser removido (dropIndex)
+        _index([("conversation_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)]),
+        # Não lidas após a marca d'água de leitura
+        _index([("conversation_id", ASCENDING), ("sender_role", ASCENDING), ("created_at", ASCENDING)]),
+    ],
+    "socket_connections": [
+        _index("sid", unique=True),
+        _index([("user_id", ASCENDING), ("last_seen", DESCENDING)]),
+        _index("host_id"),
+        # Conexões de processos que pararam de renovar last_seen
+        _index("last_seen", expireAfterSeconds=300),
+    ],
+    "unread_counters": [
+        _index("id", unique=True),
+    ],
+
+    # ==================== AGENDA E TREINAMENTO ====================
+    "appointments": [
+        _index([("user_id", ASCENDING), ("date", ASCENDING), ("time", ASCENDING)]),
+        _index("id"),
+    ],
+    "company_events": [
+        _index([("active", ASCENDING), ("date", ASCENDING)]),
+        _index("id"),
+    ],
+    "training_classes_v2": [
+        _index("id", unique=True),
+        _index("date"),
+    ],
+    "training_registrations": [
+        _index("id"),
+        _index("user_id"),
+        _index([("class_id", ASCENDING), ("payment_status", ASCENDING)]),
+    ],
+
+    # ==================== PAGAMENTOS ====================
+    "transactions": [
+        _index("id", unique=True),
+        _index([("user_id", ASCENDING), ("purpose", ASCENDING), ("status", ASCENDING)]),
+        _index([("user_id", ASCENDING), ("created_at", DESCENDING)]),
+        _index([("purpose", ASCENDING), ("status", ASCENDING)]),
+        _index("gateway_transaction_id", sparse=True),
+        _index("metadata.preference_id", sparse=True),
+        _index([("created_at", DESCENDING)]),
+    ],
+    "payment_links": [
+        _index("id", unique=True),
+        _index([("user_id", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    "webhook_logs": [
+        _index([("created_at", DESCENDING)]),
+    ],
+
+    # ==================== TRADUÇÃO ====================
+    "translation_memory": [
+        _index("key", unique=True),
+        _index([("source_language", ASCENDING), ("target_language", ASCENDING)]),
+    ],
+
+    # ==================== MIGRAÇÕES ====================
+    "schema_migrations": [
+        _index("version", unique=True),
+    ],
+
+    # ==================== EVENTOS ====================
+    "event_outbox": [
+        _index("id", unique=True),
+        _index([("status", ASCENDING), ("available_at", ASCENDING)]),
+        _index([("status", ASCENDING), ("locked_until", ASCENDING)]),
+        _index("key", unique=True, partialFilterExpression={"key": {"$type": "string"}}),
+        # Eventos processados são descartados após 7 dias
+        _index("processed_at", expireAfterSeconds=7 * 24 * 3600),
+    ],
+    "scheduled_jobs": [
+        _index("id", unique=True),
+    ],
+}
+
+
+def _normalize_key(key) -> tuple:
+    """Normaliza o campo "key" (SON/dict/lista) para comparação"""
+    items = key.items() if hasattr(key, "items") else key
+    return tuple((field, int(direction) if isinstance(direction, (int, float)) else direction)
+                 for field, direction in items)
+
+
+def _options_of(info: dict) -> dict:
+    return {opt: info[opt] for opt in _COMPARED_OPTIONS if info.get(opt) not in (None, False)}
+
+
+async def verify_indexes(database, registry: Optional[Dict[str, List[IndexModel]]] = None) -> dict:
+    """
+    Compara o registro com os índices existentes, sem alterar nada.
+    Retorna {"missing": [...], "drift": [...], "extra": [...], "ok": n}
+    """
+    registry = registry or INDEX_REGISTRY
+    report = {"missing": [], "drift": [], "extra": [], "ok": 0}
+
+    for collection_name, models in registry.items():
+        existing = await database[collection_name].index_information()
+        by_key = {_normalize_key(info["key"]): (name, info) for name, info in existing.items()}
+        expected_keys = set()
+
+        for model in models:
+            spec = model.document
+            key = _normalize_key(spec["key"])
+            expected_keys.add(key)
+            found = by_key.get(key)
+
+            if not found:
+                report["missing"].append({"collection": collection_name, "name": spec["name"], "key": list(key)})
+                continue
+
+            existing_name, info = found
+            if _options_of(info) != _options_of(spec):
+                report["drift"].append({
+                    "collection": collection_name,
+                    "name": existing_name,
+                    "key": list(key),
+                    "expected": _options_of(spec),
+                    "actual": _options_of(info),
+                })
+            else:
+                report["ok"] += 1
+
+        for key, (name, _) in by_key.items():
+            if name != "_id_" and key not in expected_keys:
+                report["extra"].append({"collection": collection_name, "name": name, "key": list(key)})
+
+    return report
+
+
+async def ensure_indexes(database, registry: Optional[Dict[str, List[IndexModel]]] = None) -> dict:
+    """
+    Cria os índices que faltam (idempotente) e retorna o relatório de verificação.
+    Falhas individuais (ex.: índice único com dados duplicados) não interrompem os demais.
+    """
+    registry = registry or INDEX_REGISTRY
+    report = await verify_indexes(database, registry)
+    created, errors = [], []
+
+    missing_by_collection: Dict[str, List[str]] = {}
+    for item in report["missing"]:
+        missing_by_collection.setdefault(item["collection"], []).append(item["name"])
+
+    for collection_name, names in missing_by_collection.items():
+        models = [m for m in registry[collection_name] if m.document["name"] in names]
+        for model in models:
+            try:
+                await database[collection_name].create_indexes([model])
+                created.append({"collection": collection_name, "name": model.document["name"]})
+            except OperationFailure as e:
+                errors.append({"collection": collection_name, "name": model.document["name"], "error": str(e)})
+                logger.warning("Falha ao criar índice %s.%s: %s", collection_name, model.document["name"], e)
+
+    for item in report["drift"]:
+        logger.warning(
+            "Drift no índice %s.%s: esperado %s, encontrado %s",
+            item["collection"], item["name"], item["expected"], item["actual"]
+        )
+
+    report["created"] = created
+    report["errors"] = errors
+    report["missing"] = [
+        item for item in report["missing"]
+        if not any(c["collection"] == item["collection"] and c["name"] == item["name"] for c in created)
+    ]
+
+    logger.info(
+        "Índices verificados: %s ok, %s criados, %s com drift, %s erros",
+        report["ok"], len(created), len(report["drift"]), len(errors)
+    )
+    return report
+
+
+async def index_usage_stats(database, registry: Optional[Dict[str, List[IndexModel]]] = None) -> List[dict]:
+    """Estatísticas de uso ($indexStats) de cada índice das coleções registradas"""
+    registry = registry or INDEX_REGISTRY
+    stats = []
+
+    for collection_name in registry:
+        try:
+            cursor = database[collection_name].aggregate([{"$indexStats": {}}])
+            async for item in cursor:
+                accesses = item.get("accesses", {})
+                since = accesses.get("since")
+                stats.append({
+                    "collection": collection_name,
+                    "name": item.get("name"),
+                    "key": list(_normalize_key(item.get("key", {}))),
+                    "ops": accesses.get("ops", 0),
+                    "since": since.isoformat() if hasattr(since, "isoformat") else since,
+                })
+        except OperationFailure as e:
+            stats.append({"collection": collection_name, "error": str(e)})
+
+    return stats
@@ -0,0 +1,13 @@
+"""
+Migrações de dados versionadas, aplicadas em ordem por run_migrations.py
+(executor em services/migrations.py). Novas versões entram no fim de MIGRATIONS.
+"""
+from migrations.m0001_timestamps_to_dates import TimestampsToDates
+from migrations.m0002_points_opening_balance import PointsOpeningBalance
+from migrations.m0003_user_progress_unique import UserProgressUnique
+
+MIGRATIONS = [
+    TimestampsToDates(),
+    PointsOpeningBalance(),
+    UserProgressUnique(),
+]
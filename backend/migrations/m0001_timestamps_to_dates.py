@@ -0,0 +1,38 @@
+"""
+0001 - Timestamps ISO em string -> datas BSON
+Converte os campos de data usados em consultas por faixa e agregações por período.
+Strings sem fuso são horário local do servidor (gravadas com datetime.now()).
+O código já lê os dois formatos (services/timestamps), então a aplicação pode ficar
+no ar durante a migração; valores que não são ISO válidos ficam como estão.
+"""
+from services import timestamps
+from services.migrations import Migration, MigrationContext
+
+FIELDS = {
+    "user_accesses": ["accessed_at"],
+    "user_progress": ["completed_at"],
+    "transactions": ["created_at", "updated_at", "paid_at", "refunded_at"],
+}
+
+
+def _converter(field: str):
+    def convert(document: dict):
+        parsed = timestamps.parse(document.get(field))
+        return {field: parsed} if parsed else None
+    return convert
+
+
+class TimestampsToDates(Migration):
+    version = 1
+    name = "timestamps_to_dates"
+
+    async def run(self, ctx: MigrationContext):
+        for collection, fields in FIELDS.items():
+            for field in fields:
+                await ctx.update_each(
+                    collection,
+                    {field: {"$type": "string"}},
+                    _converter(field),
+                    step=f"{collection}:{field}",
+                    projection={field: 1}
+                )
@@ -0,0 +1,69 @@
+"""
+0002 - Saldo de abertura do livro de pontos
+Lança, para cada usuário com pontos, a diferença entre users.points e o que já está no
+livro (prêmios concedidos depois do deploy) como OPENING_BALANCE no dia OPENING_DAY,
+fora de qualquer período dos rankings semanais/mensais. Idempotente: o lançamento tem
+chave fixa por usuário e o balde do dia de abertura é gravado com $set.
+"""
+import uuid
+from datetime import datetime, timezone
+from typing import List
+
+from pymongo import UpdateOne
+
+from database import db
+from services import points
+from services.migrations import Migration, MigrationContext
+
+OPENING_AT = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class PointsOpeningBalance(Migration):
+    version = points.OPENING_MIGRATION
+    name = "points_opening_balance"
+
+    async def run(self, ctx: MigrationContext):
+        async def handle(batch: List[dict]) -> int:
+            user_ids = [user["id"] for user in batch]
+            in_ledger = {
+                row["_id"]: row["points"]
+                async for row in db.points_ledger.aggregate([
+                    {"$match": {"user_id": {"$in": user_ids}, "reason": {"$ne": points.OPENING_BALANCE}}},
+                    {"$group": {"_id": "$user_id", "points": {"$sum": "$amount"}}}
+                ])
+            }
+
+            ledger, daily = [], []
+            for user in batch:
+                opening = (user.get("points") or 0) - in_ledger.get(user["id"], 0)
+                if not opening:
+                    continue
+                ledger.append(UpdateOne(
+                    {"user_id": user["id"], "key": points.OPENING_BALANCE},
+                    {"$setOnInsert": {
+                        "id": str(uuid.uuid4()),
+                        "amount": opening,
+                        "reason": points.OPENING_BALANCE,
+                        "ref": None,
+                        "day": points.OPENING_DAY,
+                        "created_at": OPENING_AT,
+                    }},
+                    upsert=True
+                ))
+                daily.append(UpdateOne(
+                    {"user_id": user["id"], "day": points.OPENING_DAY},
+                    {"$set": {"points": opening, **{f: user.get(f) for f in points.OWNER_FIELDS}}},
+                    upsert=True
+                ))
+            if ledger and not ctx.dry_run:
+                await db.points_ledger.bulk_write(ledger, ordered=False)
+                await db.points_daily.bulk_write(daily, ordered=False)
+            return len(ledger)
+
+        await ctx.each_batch(
+            "users",
+            {"points": {"$nin": [0, None]}},
+            handle,
+            step="users:opening_balance",
+            projection={"id": 1, "points": 1, **{f: 1 for f in points.OWNER_FIELDS}}
+        )
@@ -0,0 +1,68 @@
+"""
+0003 - Um documento de progresso por (user_id, chapter_id)
+Antes do upsert por capítulo, o flush dos heartbeats e a conclusão podiam inserir dois
+documentos para o mesmo capítulo. Funde cada grupo duplicado no documento mais antigo
+(concluído se algum estava, completed_at mais antigo, maior watched_percentage), remove
+os demais e troca o índice (user_id, chapter_id) pelo índice único do registro.
+Idempotente: depois da fusão não sobram grupos e o índice único já existe.
+"""
+from typing import List
+
+from pymongo import ASCENDING, DeleteMany, UpdateOne
+
+from database import db
+from services.migrations import Migration, MigrationContext
+
+KEY = [("user_id", ASCENDING), ("chapter_id", ASCENDING)]
+INDEX_NAME = "user_id_1_chapter_id_1"
+
+
+def _merged(documents: List[dict]) -> dict:
+    completed_at = [d["completed_at"] for d in documents if d.get("completed") and d.get("completed_at")]
+    return {
+        "completed": any(d.get("completed") for d in documents),
+        "completed_at": min(completed_at) if completed_at else None,
+        "watched_percentage": max(d.get("watched_percentage") or 0 for d in documents),
+    }
+
+
+class UserProgressUnique(Migration):
+    version = 3
+    name = "user_progress_unique"
+
+    async def run(self, ctx: MigrationContext):
+        async def handle(batch: List[dict]) -> int:
+            updates, deletes = [], []
+            for group in batch:
+                documents = await db.user_progress.find(
+                    {"_id": {"$in": group["ids"]}}
+                ).sort("_id", 1).to_list(None)
+                if len(documents) < 2:
+                    continue
+                keep, *rest = documents
+                updates.append(UpdateOne({"_id": keep["_id"]}, {"$set": _merged(documents)}))
+                deletes.extend(d["_id"] for d in rest)
+            if updates and not ctx.dry_run:
+                await db.user_progress.bulk_write(updates, ordered=False)
+                await db.user_progress.bulk_write([DeleteMany({"_id": {"$in": deletes}})])
+            return len(updates)
+
+        # Os grupos duplicados são materializados antes, para percorrê-los em lotes com checkpoint
+        staging = "user_progress_duplicates" + ("_dry_run" if ctx.dry_run else "")
+        await db[staging].drop()
+        await db.user_progress.aggregate([
+            {"$group": {"_id": {"user_id": "$user_id", "chapter_id": "$chapter_id"},
+                        "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}},
+            {"$out": staging}
+        ], allowDiskUse=True).to_list(None)
+        await ctx.each_batch(staging, {}, handle, step="user_progress:duplicates")
+        await db[staging].drop()
+
+        if ctx.dry_run:
+            return
+        existing = await db.user_progress.index_information()
+        for name, info in existing.items():
+            if list(info["key"]) == KEY and not info.get("unique"):
+                await db.user_progress.drop_index(name)
+        await db.user_progress.create_index(KEY, unique=True, name=INDEX_NAME)
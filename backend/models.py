@@ -3,6 +3,9 @@ from typing import Optional, List
 from datetime import datetime
 import uuid
 
+from services import timestamps
+from services.timestamps import DateTime
+
 class UserCreate(BaseModel):
     email: EmailStr
     full_name: str
@@ -171,15 +174,29 @@ class UserProgress(BaseModel):
     module_id: str
     chapter_id: str
     completed: bool = False
-    completed_at: Optional[str] = None
+    completed_at: Optional[DateTime] = None
     watched_percentage: int = 0
 
+class UserModuleProgress(BaseModel):
+    """Materialização de conclusão por usuário x módulo (services/module_progress.py)"""
+    user_id: str
+    module_id: str
+    completed_chapters: int = 0
+    total_chapters: int = 0
+    completed: bool = False
+    completed_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
 class ProgressUpdate(BaseModel):
     chapter_id: str
     module_id: str
     completed: bool = False
     watched_percentage: float = 0
 
+class ProgressHeartbeatBatch(BaseModel):
+    """Vários heartbeats do player em uma requisição (POST /progress/heartbeat)"""
+    heartbeats: List[ProgressUpdate] = Field(..., max_length=500)
+
 class Reward(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     title: str
@@ -336,7 +353,8 @@ class Conversation(BaseModel):
     status: str = "active"
     last_message: Optional[str] = None
     last_message_at: Optional[str] = None
-    unread_count: int = 0
+    unread_count: int = 0  # não lidas pela equipe
+    user_unread_count: int = 0  # não lidas pelo dono da conversa
     created_at: str = Field(default_factory=lambda: datetime.now().isoformat())
 
 class ConversationResponse(BaseModel):
@@ -366,7 +384,7 @@ class MessageCreate(BaseModel):
 class UserAccess(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
-    accessed_at: str = Field(default_factory=lambda: datetime.now().isoformat())
+    accessed_at: DateTime = Field(default_factory=timestamps.now)
     date: str = Field(default_factory=lambda: datetime.now().strftime("%Y-%m-%d"))
 
 # ==================== GAMIFICAÇÃO ====================
@@ -378,7 +396,7 @@ class Badge(BaseModel):
     icon: str  # emoji ou nome do ícone
     color: str = "#06b6d4"  # cor do badge
     points_reward: int = 0  # pontos ao conquistar
-    criteria_type: str  # 'modules_completed', 'days_streak', 'points_reached', 'manual', 'first_module', 'all_modules'
+    criteria_type: str  # 'modules_completed', 'days_streak', 'points_reached', 'manual', 'first_module', 'all_modules', 'chapters_completed', 'assessments_passed', 'certificates_earned'
     criteria_value: int = 0  # valor para atingir o critério
     active: bool = True
     created_at: str = Field(default_factory=lambda: datetime.now().isoformat())
@@ -468,4 +486,27 @@ class Certificate(BaseModel):
     certificate_path: str
     created_at: str = Field(default_factory=lambda: datetime.now().isoformat())
 
+class CertificateJobCreate(BaseModel):
+    module_id: str
+    supervisor_id: Optional[str] = None
+    category_id: Optional[str] = None
+
+class CertificateJob(BaseModel):
+    """Emissão de certificados em lote (services/certificate_jobs.py)"""
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    module_id: str
+    supervisor_id: Optional[str] = None
+    category_id: Optional[str] = None
+    status: str = "pending"  # pending, running, completed, failed
+    total: int = 0
+    issued: int = 0
+    failed: int = 0
+    errors: List[dict] = []
+    error: Optional[str] = None
+    owner: Optional[str] = None  # execução que assumiu o job (renova heartbeat_at)
+    created_by: str
+    created_at: str = Field(default_factory=lambda: datetime.now().isoformat())
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+
 import secrets
\ No newline at end of file
@@ -8,6 +8,9 @@ from datetime import datetime
 from enum import Enum
 import uuid
 
+from services import timestamps
+from services.timestamps import DateTime
+
 
 class PaymentGateway(str, Enum):
     PAGSEGURO = "pagseguro"
@@ -237,11 +240,11 @@ class Transaction(BaseModel):
     metadata: Dict[str, Any] = Field(default_factory=dict)
     webhook_notifications: List[Dict[str, Any]] = Field(default_factory=list)
     
-    # Timestamps
-    created_at: str = Field(default_factory=lambda: datetime.now().isoformat())
-    updated_at: str = Field(default_factory=lambda: datetime.now().isoformat())
-    paid_at: Optional[str] = None
-    refunded_at: Optional[str] = None
+    # Timestamps (datas BSON; aceitam as strings ISO ainda não migradas)
+    created_at: DateTime = Field(default_factory=timestamps.now)
+    updated_at: DateTime = Field(default_factory=timestamps.now)
+    paid_at: Optional[DateTime] = None
+    refunded_at: Optional[DateTime] = None
 
 
 class TransactionResponse(BaseModel):
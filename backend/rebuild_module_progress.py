@@ -0,0 +1,28 @@
+"""
+Reconstrói a coleção user_module_progress a partir de user_progress.
+Uso: python rebuild_module_progress.py [module_id]
+"""
+import asyncio
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import database
+from indexes import INDEX_REGISTRY, ensure_indexes
+from services import module_progress
+
+async def rebuild(module_id=None):
+    database.provider.connect()
+    
+    # O $merge exige o índice único (user_id, module_id)
+    await ensure_indexes(database.db, {"user_module_progress": INDEX_REGISTRY["user_module_progress"]})
+    
+    rows = await module_progress.rebuild(module_id)
+    scope = f"módulo {module_id}" if module_id else "todos os módulos"
+    print(f"✓ user_module_progress reconstruída ({scope}): {rows} linhas")
+    
+    database.provider.close()
+
+if __name__ == "__main__":
+    asyncio.run(rebuild(sys.argv[1] if len(sys.argv) > 1 else None))
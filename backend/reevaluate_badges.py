@@ -0,0 +1,26 @@
+"""
+Concede os badges automáticos a todos os usuários que já atendem ao critério.
+Uso: python reevaluate_badges.py [badge_id ...]
+"""
+import asyncio
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import database
+from services import badges
+
+async def reevaluate(badge_ids=None):
+    database.provider.connect()
+    
+    result = await badges.reevaluate(badge_ids)
+    for badge_id, item in result.items():
+        print(f"✓ {item['name']} ({badge_id}): {item['granted']} concedidos de {item['candidates']} candidatos")
+    if not result:
+        print("Nenhum badge automático ativo encontrado")
+    
+    database.provider.close()
+
+if __name__ == "__main__":
+    asyncio.run(reevaluate(sys.argv[1:] or None))
@@ -1,14 +1,11 @@
 from fastapi import APIRouter, HTTPException, Depends
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
+from services import badges, points
 from models import Assessment, AssessmentCreate, Question, QuestionCreate, UserAssessment, AssessmentSubmission
 from auth import get_current_user, require_role
 import os
 from datetime import datetime, timezone
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 router = APIRouter(prefix="/assessments", tags=["assessments"])
 
 @router.post("/")
@@ -183,14 +180,13 @@ async def submit_assessment(submission: AssessmentSubmission, current_user: dict
     if passed:
         module = await db.modules.find_one({"id": assessment["module_id"]}, {"_id": 0})
         if module and module.get("points_reward", 0) > 0:
-            await db.users.update_one(
-                {"id": current_user["sub"]},
-                {"$inc": {"points": module["points_reward"]}}
+            await points.award(
+                current_user["sub"], module["points_reward"], points.ASSESSMENT,
+                key=f"assessment:{user_assessment.id}", ref=assessment["id"]
             )
         
-        # Verificar badges
-        from routes.gamification_routes import check_and_award_badges
-        await check_and_award_badges(current_user["sub"])
+        # Verificar badges de avaliações
+        await badges.evaluate(current_user["sub"], [badges.ASSESSMENTS])
     
     return {
         "score": score,
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
 from models import (
     UserLogin, UserCreate, User, UserResponse, 
     PasswordResetRequest, PasswordResetConfirm
@@ -8,6 +8,7 @@ from auth import (
     get_password_hash, verify_password, create_access_token,
     get_current_user, require_role
 )
+from services import activity_rollups
 import os
 import secrets
 from datetime import datetime, timedelta, timezone
@@ -16,10 +17,6 @@ import resend
 import pandas as pd
 import io
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 resend.api_key = os.environ.get('RESEND_API_KEY')
 SENDER_EMAIL = os.environ.get('SENDER_EMAIL', 'onboarding@resend.dev')
 FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
@@ -50,6 +47,7 @@ async def login(credentials: UserLogin):
     from models import UserAccess
     access = UserAccess(user_id=user["id"])
     await db.user_accesses.insert_one(access.model_dump())
+    await activity_rollups.record_access(user, access.accessed_at)
     
     # Atualizar streak
     from routes.gamification_routes import update_user_streak
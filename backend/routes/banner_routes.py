@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
+from services import translation_memory
 from models import Banner, BannerCreate
 from auth import get_current_user, require_role
 import os
@@ -8,10 +9,6 @@ import uuid
 import shutil
 from pathlib import Path
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 router = APIRouter(prefix="/banners", tags=["banners"])
 
 # Diretório para upload de banners
@@ -41,6 +38,7 @@ async def create_banner(
     """Cria novo banner"""
     banner = Banner(**banner_data.model_dump())
     await db.banners.insert_one(banner.model_dump())
+    await translation_memory.schedule_warm(banner.model_dump())
     return banner
 
 @router.post("/upload")
@@ -81,6 +79,7 @@ async def update_banner(
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Banner não encontrado")
+    await translation_memory.schedule_warm(updates)
     return {"message": "Banner atualizado com sucesso"}
 
 @router.delete("/{banner_id}")
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
 from fastapi.responses import FileResponse
-from motor.motor_asyncio import AsyncIOMotorClient
-from models import Certificate
+from database import db
+from services import badges, certificate_jobs, certificate_renderer, module_progress
+from models import Certificate, CertificateJobCreate
 from auth import get_current_user, require_role
 import os
 from datetime import datetime
@@ -9,20 +10,6 @@ from pathlib import Path
 import uuid
 import shutil
 
-# PDF manipulation - usando pypdf (mais recente) ao invés de PyPDF2
-from pypdf import PdfReader, PdfWriter
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.lib.colors import Color
-from reportlab.lib.utils import ImageReader
-from io import BytesIO
-from pdf2image import convert_from_path
-from PIL import Image
-
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 router = APIRouter(prefix="/certificates", tags=["certificates"])
 
 # Diretórios
@@ -53,6 +40,12 @@ async def upload_certificate_template(
     with open(template_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
     
+    # Preparar (importar/rasterizar) a nova versão do template uma única vez
+    try:
+        await certificate_renderer.prepare(str(template_path))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Template inválido: {e}")
+    
     # Atualizar configuração do sistema
     await db.system_config.update_one(
         {"id": "system_config"},
@@ -120,7 +113,7 @@ async def test_certificate_generation(
         raise HTTPException(status_code=404, detail="Nenhum template configurado. Faça upload primeiro.")
     
     # Gerar certificado de teste
-    test_path = generate_certificate_pdf(
+    test_path = await generate_certificate_pdf(
         template_path=template_path,
         user_name="Nome do Licenciado Teste",
         module_name="Módulo de Exemplo",
@@ -139,7 +132,7 @@ async def test_certificate_generation(
 
 # ==================== GERAÇÃO DE CERTIFICADO ====================
 
-def generate_certificate_pdf(
+async def generate_certificate_pdf(
     template_path: str,
     user_name: str,
     module_name: str,
@@ -149,83 +142,23 @@ def generate_certificate_pdf(
     date_y: int = 270,
     output_filename: str = None
 ) -> str:
-    """Gera o certificado convertendo template para imagem e adicionando texto por cima"""
+    """Gera o certificado sobre o template em cache, no pool de processos do renderer"""
     
     if not output_filename:
         output_filename = f"cert_{uuid.uuid4().hex[:8]}.pdf"
     
     output_path = GENERATED_DIR / output_filename
     
-    print(f"[Certificate] Starting generation for {user_name}")
-    print(f"[Certificate] Template: {template_path}")
-    
-    # Converter o template PDF para imagem (alta resolução)
-    images = convert_from_path(template_path, dpi=150)
-    if not images:
-        raise Exception("Não foi possível converter o template")
-    
-    template_img = images[0]
-    img_width, img_height = template_img.size
-    
-    print(f"[Certificate] Image size: {img_width}x{img_height}")
-    
-    # Calcular fator de escala (DPI 150 = 150/72 = 2.083)
-    scale_factor = 150 / 72  # Converter coordenadas PDF para pixels
-    
-    # Ajustar posições Y (inverter porque imagem tem Y invertido)
-    pdf_height = img_height / scale_factor
-    name_y_img = int((pdf_height - name_y) * scale_factor)
-    module_y_img = int((pdf_height - module_y) * scale_factor)
-    date_y_img = int((pdf_height - date_y) * scale_factor)
-    
-    print(f"[Certificate] PDF height: {pdf_height}, Y positions (img): name={name_y_img}, module={module_y_img}, date={date_y_img}")
-    
-    # Criar novo PDF com ReportLab
-    packet = BytesIO()
-    
-    # Usar tamanho em pontos (72 DPI)
-    page_width = img_width / scale_factor
-    page_height = img_height / scale_factor
-    
-    can = canvas.Canvas(packet, pagesize=(page_width, page_height))
-    
-    # Converter imagem PIL para buffer
-    img_buffer = BytesIO()
-    template_img.save(img_buffer, format='PNG')
-    img_buffer.seek(0)
-    
-    # Desenhar imagem de fundo (template)
-    can.drawImage(ImageReader(img_buffer), 0, 0, width=page_width, height=page_height)
-    
-    # ===== NOME DO LICENCIADO =====
-    can.setFillColorRGB(0, 0, 0)  # Preto
-    can.setFont("Helvetica-Bold", 32)
-    can.drawCentredString(page_width / 2, name_y, user_name)
-    print(f"[Certificate] Drawing name '{user_name}' at y={name_y}")
-    
-    # ===== NOME DO MÓDULO =====
-    can.setFont("Helvetica", 20)
-    can.setFillColorRGB(0.2, 0.2, 0.2)
-    can.drawCentredString(page_width / 2, module_y, module_name)
-    print(f"[Certificate] Drawing module '{module_name}' at y={module_y}")
-    
-    # ===== DATA DE CONCLUSÃO =====
-    can.setFont("Helvetica", 16)
-    can.setFillColorRGB(0.3, 0.3, 0.3)
-    date_text = f"Concluído em {completion_date}"
-    can.drawCentredString(page_width / 2, date_y, date_text)
-    print(f"[Certificate] Drawing date '{date_text}' at y={date_y}")
-    
-    can.save()
-    
-    # Salvar o PDF
-    packet.seek(0)
-    with open(output_path, "wb") as output_file:
-        output_file.write(packet.getvalue())
-    
-    print(f"[Certificate] Saved to {output_path}")
-    
-    return str(output_path)
+    return await certificate_renderer.render(
+        template_path,
+        str(output_path),
+        user_name=user_name,
+        module_name=module_name,
+        completion_date=completion_date,
+        name_y=name_y,
+        module_y=module_y,
+        date_y=date_y
+    )
 
 # ==================== LICENCIADO: CERTIFICADOS ====================
 
@@ -278,12 +211,13 @@ async def check_certificate_eligibility(module_id: str, current_user: dict = Dep
                 return {"eligible": False, "reason": "Você precisa passar na avaliação primeiro"}
     
     # Verificar se completou todos os capítulos
-    total_chapters = await db.chapters.count_documents({"module_id": module_id})
-    completed_chapters = await db.user_progress.count_documents({
-        "user_id": user_id,
-        "module_id": module_id,
-        "completed": True
-    })
+    row = (await module_progress.get_user_modules(user_id, [module_id])).get(module_id)
+    if row:
+        total_chapters = row["total_chapters"]
+        completed_chapters = row["completed_chapters"]
+    else:
+        total_chapters = await db.chapters.count_documents({"module_id": module_id})
+        completed_chapters = 0
     
     if total_chapters > 0 and completed_chapters < total_chapters:
         return {
@@ -316,16 +250,11 @@ async def generate_certificate(module_id: str, current_user: dict = Depends(get_
     completion_date = datetime.now()
     
     # Formatar data em português
-    meses = {
-        1: "Janeiro", 2: "Fevereiro", 3: "Março", 4: "Abril",
-        5: "Maio", 6: "Junho", 7: "Julho", 8: "Agosto",
-        9: "Setembro", 10: "Outubro", 11: "Novembro", 12: "Dezembro"
-    }
-    date_formatted = f"{completion_date.day} de {meses[completion_date.month]} de {completion_date.year}"
+    date_formatted = certificate_renderer.format_completion_date(completion_date)
     
     output_filename = f"cert_{user_id[:8]}_{module_id[:8]}_{uuid.uuid4().hex[:6]}.pdf"
     
-    certificate_path = generate_certificate_pdf(
+    certificate_path = await generate_certificate_pdf(
         template_path=template_path,
         user_name=user["full_name"],
         module_name=module["title"],
@@ -348,9 +277,8 @@ async def generate_certificate(module_id: str, current_user: dict = Depends(get_
     
     await db.certificates.insert_one(certificate.model_dump())
     
-    # Verificar badges
-    from routes.gamification_routes import check_and_award_badges
-    await check_and_award_badges(user_id)
+    # Verificar badges de certificados
+    await badges.evaluate(user_id, [badges.CERTIFICATES])
     
     return {
         "message": "Certificado gerado com sucesso!",
@@ -381,6 +309,39 @@ async def download_certificate(certificate_id: str, current_user: dict = Depends
         filename=f"certificado_{certificate['module_title'].replace(' ', '_')}.pdf"
     )
 
+# ==================== ADMIN: EMISSÃO EM LOTE ====================
+
+@router.post("/jobs")
+async def create_certificate_job(
+    data: CertificateJobCreate,
+    current_user: dict = Depends(require_role(["admin"]))
+):
+    """Emite os certificados de todos os licenciados elegíveis do módulo (opcionalmente por supervisor/categoria)"""
+    module = await db.modules.find_one({"id": data.module_id}, {"_id": 0})
+    if not module:
+        raise HTTPException(status_code=404, detail="Módulo não encontrado")
+    if not module.get("has_certificate"):
+        raise HTTPException(status_code=400, detail="Este módulo não possui certificado")
+    
+    active = await certificate_jobs.get_active_job(data.module_id)
+    if active:
+        raise HTTPException(status_code=409, detail=f"Já existe uma emissão em andamento para este módulo ({active['id']})")
+    
+    return await certificate_jobs.create_job(data.model_dump(), current_user["sub"])
+
+@router.get("/jobs")
+async def list_certificate_jobs(current_user: dict = Depends(require_role(["admin"]))):
+    """Últimas emissões em lote"""
+    return await db.certificate_jobs.find({}, {"_id": 0, "errors": 0}).sort("created_at", -1).to_list(50)
+
+@router.get("/jobs/{job_id}")
+async def get_certificate_job(job_id: str, current_user: dict = Depends(require_role(["admin"]))):
+    """Status e progresso de uma emissão em lote"""
+    job = await db.certificate_jobs.find_one({"id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
 # ==================== ADMIN: LISTAR TODOS ====================
 
 @router.get("/all")
@@ -1,13 +1,10 @@
 from fastapi import APIRouter, HTTPException, Depends
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
+from services import dashboard_stats, module_progress, translation_memory
 from models import Chapter, ChapterCreate
 from auth import get_current_user, require_role
 import os
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 router = APIRouter(prefix="/chapters", tags=["chapters"])
 
 @router.get("/module/{module_id}")
@@ -47,23 +44,38 @@ async def create_chapter(chapter_data: ChapterCreate, current_user: dict = Depen
     
     chapter = Chapter(**chapter_data.model_dump())
     await db.chapters.insert_one(chapter.model_dump())
+    dashboard_stats.invalidate(dashboard_stats.SYSTEM)
+    await module_progress.on_chapters_changed(chapter.module_id)
+    await translation_memory.schedule_warm(chapter.model_dump())
     return chapter
 
 @router.put("/{chapter_id}")
 async def update_chapter(chapter_id: str, updates: dict, current_user: dict = Depends(require_role(["admin"]))):
+    previous = await db.chapters.find_one({"id": chapter_id}, {"_id": 0, "module_id": 1})
     result = await db.chapters.update_one(
         {"id": chapter_id},
         {"$set": updates}
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Capítulo não encontrado")
+    
+    # Capítulo movido de módulo: total de capítulos muda nos dois
+    if previous and updates.get("module_id") and updates["module_id"] != previous.get("module_id"):
+        await module_progress.on_chapters_changed(previous.get("module_id"))
+        await module_progress.on_chapters_changed(updates["module_id"])
+    await translation_memory.schedule_warm(updates)
     return {"message": "Capítulo atualizado com sucesso"}
 
 @router.delete("/{chapter_id}")
 async def delete_chapter(chapter_id: str, current_user: dict = Depends(require_role(["admin"]))):
+    chapter = await db.chapters.find_one({"id": chapter_id}, {"_id": 0, "module_id": 1})
     await db.user_progress.delete_many({"chapter_id": chapter_id})
     
     result = await db.chapters.delete_one({"id": chapter_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Capítulo não encontrado")
+    
+    if chapter and chapter.get("module_id"):
+        await module_progress.on_chapters_changed(chapter["module_id"])
+    dashboard_stats.invalidate()
     return {"message": "Capítulo deletado com sucesso"}
\ No newline at end of file
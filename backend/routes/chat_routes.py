@@ -1,14 +1,11 @@
 from fastapi import APIRouter, HTTPException, Depends
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
 from models import Conversation, Message, MessageCreate, ConversationResponse
 from auth import get_current_user, require_role
+from services import chat_messages, chat_routing, unread_counters
 import os
 from datetime import datetime, timezone
-from typing import List
-
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+from typing import List, Optional
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
@@ -75,10 +72,18 @@ async def get_my_conversation(current_user: dict = Depends(get_current_user)):
 @router.get("/conversations/{conversation_id}/messages")
 async def get_conversation_messages(
     conversation_id: str,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = chat_messages.DEFAULT_PAGE_SIZE,
     current_user: dict = Depends(get_current_user)
 ):
-    """Retorna todas as mensagens de uma conversa"""
-    conversation = await db.conversations.find_one({"id": conversation_id}, {"_id": 0})
+    """
+    Retorna uma página de mensagens em ordem cronológica (as mais recentes, sem cursor).
+    before/after: id de uma mensagem da conversa para carregar as anteriores/seguintes.
+    """
+    conversation = await db.conversations.find_one(
+        {"id": conversation_id}, {"_id": 0, "user_id": 1, "read_watermarks": 1}
+    )
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversa não encontrada")
     
@@ -87,37 +92,20 @@ async def get_conversation_messages(
         if conversation["user_id"] != current_user["sub"]:
             raise HTTPException(status_code=403, detail="Acesso negado")
     
-    messages = await db.messages.find(
-        {"conversation_id": conversation_id}, {"_id": 0}
-    ).sort("created_at", 1).to_list(1000)
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use apenas before ou after")
     
-    # Marcar mensagens como lidas
-    if current_user.get("role") in ["admin", "supervisor"]:
-        # Admin/supervisor marcando como lidas as mensagens do usuário
-        await db.messages.update_many(
-            {
-                "conversation_id": conversation_id,
-                "sender_role": {"$ne": current_user["role"]},
-                "read": False
-            },
-            {"$set": {"read": True}}
-        )
-        await db.conversations.update_one(
-            {"id": conversation_id},
-            {"$set": {"unread_count": 0}}
-        )
-    else:
-        # Usuário marcando como lidas as mensagens do admin
-        await db.messages.update_many(
-            {
-                "conversation_id": conversation_id,
-                "sender_role": {"$in": ["admin", "supervisor"]},
-                "read": False
-            },
-            {"$set": {"read": True}}
-        )
+    messages = await chat_messages.get_page(conversation_id, before, after, limit)
+    if messages is None:
+        raise HTTPException(status_code=404, detail="Mensagem de referência não encontrada")
     
-    return messages
+    # Abrir a conversa (página mais recente) marca tudo como lido para quem abriu
+    if not before and not after:
+        side = chat_messages.side_of(current_user.get("role"))
+        watermark = await chat_messages.mark_read(conversation_id, current_user.get("role"))
+        conversation.setdefault("read_watermarks", {})[side] = watermark
+    
+    return chat_messages.apply_read_flags(messages, conversation)
 
 @router.post("/messages")
 async def send_message(
@@ -146,28 +134,8 @@ async def send_message(
         message=message_data.message
     )
     
-    await db.messages.insert_one(message.model_dump())
-    
-    # Atualizar conversa
-    update_data = {
-        "last_message": message_data.message[:100],
-        "last_message_at": message.created_at
-    }
-    
-    # Incrementar contador de não lidas se for admin respondendo
-    if current_user.get("role") in ["admin", "supervisor"]:
-        await db.conversations.update_one(
-            {"id": message_data.conversation_id},
-            {"$set": update_data}
-        )
-    else:
-        await db.conversations.update_one(
-            {"id": message_data.conversation_id},
-            {
-                "$set": update_data,
-                "$inc": {"unread_count": 1}
-            }
-        )
+    # Grava a mensagem, atualiza a conversa e os contadores de não lidas
+    await chat_messages.save_message(message.model_dump())
     
     return message
 
@@ -186,33 +154,17 @@ async def update_conversation_status(
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Conversa não encontrada")
     
+    chat_routing.invalidate(conversation_id)
     return {"message": "Status atualizado com sucesso"}
 
 @router.get("/unread-count")
 async def get_unread_count(current_user: dict = Depends(get_current_user)):
-    """Retorna o número de mensagens não lidas"""
+    """
+    Retorna o número de não lidas (contador mantido na gravação/leitura):
+    conversas pendentes para a equipe, mensagens da equipe para os demais
+    """
     if current_user.get("role") in ["admin", "supervisor"]:
-        # Contar todas as conversas com mensagens não lidas
-        count = await db.conversations.count_documents({"unread_count": {"$gt": 0}})
-        return {"unread_count": count}
+        counters = await unread_counters.get(unread_counters.STAFF_KEY)
     else:
-        # Contar mensagens não lidas do usuário
-        count = await db.messages.count_documents({
-            "conversation_id": {"$exists": True},
-            "sender_role": {"$in": ["admin", "supervisor"]},
-            "read": False
-        })
-        
-        # Buscar conversation_id do usuário
-        conversation = await db.conversations.find_one(
-            {"user_id": current_user["sub"]}, {"_id": 0}
-        )
-        
-        if conversation:
-            count = await db.messages.count_documents({
-                "conversation_id": conversation["id"],
-                "sender_role": {"$in": ["admin", "supervisor"]},
-                "read": False
-            })
-        
-        return {"unread_count": count}
+        counters = await unread_counters.get(current_user["sub"])
+    return {"unread_count": counters[unread_counters.CHAT]}
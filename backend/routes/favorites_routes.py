@@ -1,15 +1,11 @@
 from fastapi import APIRouter, HTTPException, Depends
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
 from auth import get_current_user
 from pydantic import BaseModel, Field
 from datetime import datetime
 import os
 import uuid
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 router = APIRouter(prefix="/favorites", tags=["favorites"])
 
 
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
 from models import FileRepository, FileFolder, FileFolderCreate
 from auth import get_current_user, require_role
 import os
@@ -8,10 +8,6 @@ import shutil
 from pathlib import Path
 from typing import Optional
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 router = APIRouter(prefix="/files", tags=["files"])
 
 UPLOAD_DIR = Path("/app/uploads/repository")
@@ -1,21 +1,24 @@
 from fastapi import APIRouter, HTTPException, Depends
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
+from services import badges, challenges, event_bus, scheduler
 from models import (
-    Badge, BadgeCreate, UserBadge, UserStreak,
+    Badge, BadgeCreate, UserStreak,
     WeeklyChallenge, WeeklyChallengeCreate, UserChallengeProgress
 )
 from auth import get_current_user, require_role
 import os
 from datetime import datetime, timedelta
-
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+from typing import Optional
 
 router = APIRouter(prefix="/gamification", tags=["gamification"])
 
 # ==================== FUNÇÃO AUXILIAR PARA STREAK ====================
 
+async def _after_streak_update(user_id: str, longest_streak: int):
+    """Badges de streak e desafios de acesso diário após mudar o streak"""
+    await badges.evaluate(user_id, [badges.STREAK], {"longest_streak": longest_streak})
+    await challenges.evaluate_user(user_id, [challenges.ACCESS])
+
 async def update_user_streak(user_id: str):
     """Função auxiliar para atualizar streak (chamada no login)"""
     today = datetime.now().strftime("%Y-%m-%d")
@@ -26,6 +29,7 @@ async def update_user_streak(user_id: str):
         # Criar streak inicial
         streak_obj = UserStreak(user_id=user_id, current_streak=1, longest_streak=1, last_access_date=today)
         await db.user_streaks.insert_one(streak_obj.model_dump())
+        await _after_streak_update(user_id, 1)
         return {"current_streak": 1, "longest_streak": 1}
     
     last_date = streak.get("last_access_date", "")
@@ -59,6 +63,7 @@ async def update_user_streak(user_id: str):
                 "updated_at": datetime.now().isoformat()
             }}
         )
+        await _after_streak_update(user_id, longest)
         return {"current_streak": new_streak, "longest_streak": longest}
     else:
         # Perdeu o streak - reseta
@@ -70,6 +75,7 @@ async def update_user_streak(user_id: str):
                 "updated_at": datetime.now().isoformat()
             }}
         )
+        await _after_streak_update(user_id, streak.get("longest_streak", 1))
         return {"current_streak": 1, "longest_streak": streak.get("longest_streak", 1)}
 
 # ==================== BADGES ====================
@@ -77,20 +83,23 @@ async def update_user_streak(user_id: str):
 @router.get("/badges")
 async def get_all_badges(current_user: dict = Depends(get_current_user)):
     """Lista todos os badges ativos"""
-    badges = await db.badges.find({"active": True}, {"_id": 0}).to_list(100)
-    return badges
+    active_badges = await db.badges.find({"active": True}, {"_id": 0}).to_list(100)
+    return active_badges
 
 @router.get("/badges/all")
 async def get_all_badges_admin(current_user: dict = Depends(require_role(["admin"]))):
     """Lista todos os badges (admin)"""
-    badges = await db.badges.find({}, {"_id": 0}).to_list(100)
-    return badges
+    all_badges = await db.badges.find({}, {"_id": 0}).to_list(100)
+    return all_badges
 
 @router.post("/badges")
 async def create_badge(badge_data: BadgeCreate, current_user: dict = Depends(require_role(["admin"]))):
     """Criar novo badge (admin)"""
     badge = Badge(**badge_data.model_dump())
     await db.badges.insert_one(badge.model_dump())
+    badges.on_badges_changed()
+    # Concede em lote a quem já atende ao critério
+    await scheduler.run_soon(badges.REEVALUATE_JOB)
     return {"message": "Badge criado com sucesso", "badge": badge.model_dump()}
 
 @router.put("/badges/{badge_id}")
@@ -104,6 +113,8 @@ async def update_badge(badge_id: str, badge_data: BadgeCreate, current_user: dic
         {"id": badge_id},
         {"$set": badge_data.model_dump()}
     )
+    badges.on_badges_changed()
+    await scheduler.run_soon(badges.REEVALUATE_JOB)
     return {"message": "Badge atualizado com sucesso"}
 
 @router.delete("/badges/{badge_id}")
@@ -115,8 +126,14 @@ async def delete_badge(badge_id: str, current_user: dict = Depends(require_role(
     
     # Remover badges conquistados relacionados
     await db.user_badges.delete_many({"badge_id": badge_id})
+    badges.on_badges_changed()
     return {"message": "Badge deletado com sucesso"}
 
+@router.post("/badges/reevaluate")
+async def reevaluate_badges(badge_id: Optional[str] = None, current_user: dict = Depends(require_role(["admin"]))):
+    """Conceder os badges automáticos (todos ou um) a quem já atende ao critério (admin)"""
+    return await badges.reevaluate([badge_id] if badge_id else None)
+
 @router.get("/my-badges")
 async def get_my_badges(current_user: dict = Depends(get_current_user)):
     """Lista badges conquistados pelo usuário"""
@@ -141,7 +158,7 @@ async def get_my_badges(current_user: dict = Depends(get_current_user)):
 async def award_badge_manually(badge_id: str, user_id: str, current_user: dict = Depends(require_role(["admin"]))):
     """Conceder badge manualmente a um usuário (admin)"""
     # Verificar se o badge existe
-    badge = await db.badges.find_one({"id": badge_id})
+    badge = await db.badges.find_one({"id": badge_id}, {"_id": 0})
     if not badge:
         raise HTTPException(status_code=404, detail="Badge não encontrado")
     
@@ -150,22 +167,10 @@ async def award_badge_manually(badge_id: str, user_id: str, current_user: dict =
     if not user:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     
-    # Verificar se já tem o badge
-    existing = await db.user_badges.find_one({"user_id": user_id, "badge_id": badge_id})
-    if existing:
+    # Conceder badge (com pontos e notificação), se ainda não tem
+    if not await badges.grant(user_id, badge):
         raise HTTPException(status_code=400, detail="Usuário já possui este badge")
     
-    # Conceder badge
-    user_badge = UserBadge(user_id=user_id, badge_id=badge_id)
-    await db.user_badges.insert_one(user_badge.model_dump())
-    
-    # Dar pontos se houver
-    if badge.get("points_reward", 0) > 0:
-        await db.users.update_one(
-            {"id": user_id},
-            {"$inc": {"points": badge["points_reward"]}}
-        )
-    
     return {"message": f"Badge '{badge['name']}' concedido com sucesso"}
 
 # ==================== STREAKS ====================
@@ -195,6 +200,7 @@ async def update_streak(current_user: dict = Depends(get_current_user)):
         # Criar streak inicial
         streak_obj = UserStreak(user_id=user_id, current_streak=1, longest_streak=1, last_access_date=today)
         await db.user_streaks.insert_one(streak_obj.model_dump())
+        await _after_streak_update(user_id, 1)
         return {"current_streak": 1, "longest_streak": 1, "message": "Streak iniciado!"}
     
     last_date = streak.get("last_access_date", "")
@@ -229,6 +235,7 @@ async def update_streak(current_user: dict = Depends(get_current_user)):
                 "updated_at": datetime.now().isoformat()
             }}
         )
+        await _after_streak_update(user_id, longest)
         return {
             "current_streak": new_streak,
             "longest_streak": longest,
@@ -244,6 +251,7 @@ async def update_streak(current_user: dict = Depends(get_current_user)):
                 "updated_at": datetime.now().isoformat()
             }}
         )
+        await _after_streak_update(user_id, streak.get("longest_streak", 1))
         return {
             "current_streak": 1,
             "longest_streak": streak.get("longest_streak", 1),
@@ -257,19 +265,19 @@ async def get_active_challenges(current_user: dict = Depends(get_current_user)):
     """Lista desafios ativos"""
     today = datetime.now().strftime("%Y-%m-%d")
     
-    challenges = await db.weekly_challenges.find({
+    active_challenges = await db.weekly_challenges.find({
         "active": True,
         "start_date": {"$lte": today},
         "end_date": {"$gte": today}
     }, {"_id": 0}).to_list(100)
     
-    return challenges
+    return active_challenges
 
 @router.get("/challenges/all")
 async def get_all_challenges(current_user: dict = Depends(require_role(["admin"]))):
     """Lista todos os desafios (admin)"""
-    challenges = await db.weekly_challenges.find({}, {"_id": 0}).sort("created_at", -1).to_list(100)
-    return challenges
+    all_challenges = await db.weekly_challenges.find({}, {"_id": 0}).sort("created_at", -1).to_list(100)
+    return all_challenges
 
 @router.post("/challenges")
 async def create_challenge(challenge_data: WeeklyChallengeCreate, current_user: dict = Depends(require_role(["admin"]))):
@@ -279,6 +287,9 @@ async def create_challenge(challenge_data: WeeklyChallengeCreate, current_user:
         created_by=current_user["sub"]
     )
     await db.weekly_challenges.insert_one(challenge.model_dump())
+    challenges.on_challenges_changed()
+    # Calcula em lote o progresso de quem já cumpre parte do desafio
+    await scheduler.run_soon(challenges.EVALUATE_JOB)
     return {"message": "Desafio criado com sucesso", "challenge": challenge.model_dump()}
 
 @router.put("/challenges/{challenge_id}")
@@ -292,6 +303,8 @@ async def update_challenge(challenge_id: str, challenge_data: WeeklyChallengeCre
         {"id": challenge_id},
         {"$set": challenge_data.model_dump()}
     )
+    challenges.on_challenges_changed()
+    await scheduler.run_soon(challenges.EVALUATE_JOB)
     return {"message": "Desafio atualizado com sucesso"}
 
 @router.delete("/challenges/{challenge_id}")
@@ -303,6 +316,7 @@ async def delete_challenge(challenge_id: str, current_user: dict = Depends(requi
     
     # Remover progresso relacionado
     await db.user_challenge_progress.delete_many({"challenge_id": challenge_id})
+    challenges.on_challenges_changed()
     return {"message": "Desafio deletado com sucesso"}
 
 @router.get("/challenges/my-progress")
@@ -342,113 +356,59 @@ async def get_my_challenge_progress(current_user: dict = Depends(get_current_use
     
     return result
 
+@router.post("/challenges/evaluate")
+async def evaluate_challenges(challenge_id: Optional[str] = None, current_user: dict = Depends(require_role(["admin"]))):
+    """Recalcular o progresso de todos os usuários nos desafios ativos (todos ou um) (admin)"""
+    return await challenges.evaluate_all([challenge_id] if challenge_id else None)
+
 @router.post("/challenges/{challenge_id}/update-progress")
 async def update_challenge_progress(challenge_id: str, progress_value: int, current_user: dict = Depends(require_role(["admin"]))):
     """Atualizar progresso de todos os usuários em um desafio (admin manual)"""
     # Esta função pode ser chamada manualmente pelo admin ou automaticamente pelo sistema
     pass
 
-# ==================== VERIFICAÇÃO AUTOMÁTICA DE BADGES ====================
+# ==================== PROGRESSO DOS DESAFIOS (services/challenges) ====================
 
-async def check_and_award_badges(user_id: str):
-    """Verifica e concede badges automaticamente baseado nos critérios"""
-    user = await db.users.find_one({"id": user_id})
-    if not user:
+@event_bus.subscribe(event_bus.CHAPTER_COMPLETED, name="gamification.chapter_challenges")
+async def on_chapter_completed_challenges(payload: dict):
+    await challenges.evaluate_user(payload["user_id"], [challenges.CHAPTERS])
+
+@event_bus.subscribe(event_bus.MODULE_COMPLETED, name="gamification.module_challenges")
+async def on_module_completed_challenges(payload: dict):
+    await challenges.evaluate_user(payload["user_id"], [challenges.MODULES])
+
+@event_bus.subscribe(event_bus.POINTS_AWARDED, name="gamification.points_challenges")
+async def on_points_awarded_challenges(payload: dict):
+    await challenges.evaluate_user(payload["user_id"], [challenges.POINTS])
+
+# ==================== BADGES AUTOMÁTICOS (services/badges) ====================
+
+@event_bus.subscribe(event_bus.CHAPTER_COMPLETED, name="gamification.chapter_badges")
+async def on_chapter_completed_badges(payload: dict):
+    await badges.evaluate(payload["user_id"], [badges.CHAPTERS])
+
+@event_bus.subscribe(event_bus.MODULE_COMPLETED, name="gamification.module_badges")
+async def on_module_completed_badges(payload: dict):
+    await badges.evaluate(payload["user_id"], [badges.MODULES])
+
+@event_bus.subscribe(event_bus.POINTS_AWARDED, name="gamification.points_badges")
+async def on_points_awarded_badges(payload: dict):
+    await badges.evaluate(payload["user_id"], [badges.POINTS])
+
+@event_bus.subscribe(event_bus.BADGE_EARNED, name="gamification.badge_notification")
+async def on_badge_earned_notify(payload: dict):
+    badge = await db.badges.find_one({"id": payload["badge_id"]}, {"_id": 0, "id": 1, "name": 1})
+    if not badge:
         return
     
-    # Buscar todos os badges ativos
-    badges = await db.badges.find({"active": True}, {"_id": 0}).to_list(100)
-    
-    for badge in badges:
-        # Verificar se já tem o badge
-        has_badge = await db.user_badges.find_one({"user_id": user_id, "badge_id": badge["id"]})
-        if has_badge:
-            continue
-        
-        criteria_type = badge.get("criteria_type", "")
-        criteria_value = badge.get("criteria_value", 0)
-        should_award = False
-        
-        if criteria_type == "modules_completed":
-            # Contar módulos completos
-            modules = await db.modules.find({}, {"_id": 0}).to_list(1000)
-            completed_count = 0
-            for module in modules:
-                total_chapters = await db.chapters.count_documents({"module_id": module["id"]})
-                completed_chapters = await db.user_progress.count_documents({
-                    "user_id": user_id,
-                    "module_id": module["id"],
-                    "completed": True
-                })
-                if total_chapters > 0 and completed_chapters == total_chapters:
-                    completed_count += 1
-            
-            if completed_count >= criteria_value:
-                should_award = True
-        
-        elif criteria_type == "first_module":
-            # Verificar se completou pelo menos 1 módulo
-            modules = await db.modules.find({}, {"_id": 0}).to_list(1000)
-            for module in modules:
-                total_chapters = await db.chapters.count_documents({"module_id": module["id"]})
-                completed_chapters = await db.user_progress.count_documents({
-                    "user_id": user_id,
-                    "module_id": module["id"],
-                    "completed": True
-                })
-                if total_chapters > 0 and completed_chapters == total_chapters:
-                    should_award = True
-                    break
-        
-        elif criteria_type == "points_reached":
-            if user.get("points", 0) >= criteria_value:
-                should_award = True
-        
-        elif criteria_type == "days_streak":
-            streak = await db.user_streaks.find_one({"user_id": user_id})
-            if streak and streak.get("longest_streak", 0) >= criteria_value:
-                should_award = True
-        
-        elif criteria_type == "all_modules":
-            # Verificar se completou TODOS os módulos
-            modules = await db.modules.find({}, {"_id": 0}).to_list(1000)
-            if modules:
-                all_completed = True
-                for module in modules:
-                    total_chapters = await db.chapters.count_documents({"module_id": module["id"]})
-                    completed_chapters = await db.user_progress.count_documents({
-                        "user_id": user_id,
-                        "module_id": module["id"],
-                        "completed": True
-                    })
-                    if total_chapters == 0 or completed_chapters < total_chapters:
-                        all_completed = False
-                        break
-                
-                if all_completed:
-                    should_award = True
-        
-        # Conceder badge se atingiu o critério
-        if should_award:
-            user_badge = UserBadge(user_id=user_id, badge_id=badge["id"])
-            await db.user_badges.insert_one(user_badge.model_dump())
-            
-            # Dar pontos se houver
-            if badge.get("points_reward", 0) > 0:
-                await db.users.update_one(
-                    {"id": user_id},
-                    {"$inc": {"points": badge["points_reward"]}}
-                )
-            
-            # Criar notificação
-            from routes.notification_routes import create_notification
-            await create_notification(
-                user_id,
-                f"Novo Badge Conquistado! 🏆",
-                f"Parabéns! Você conquistou o badge '{badge['name']}'!",
-                "badge_earned",
-                badge["id"]
-            )
+    from routes.notification_routes import create_notification
+    await create_notification(
+        payload["user_id"],
+        f"Novo Badge Conquistado! 🏆",
+        f"Parabéns! Você conquistou o badge '{badge['name']}'!",
+        "badge_earned",
+        badge["id"]
+    )
 
 # ==================== GAMIFICATION STATS ====================
 
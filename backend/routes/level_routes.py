@@ -2,15 +2,12 @@ from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime, timezone
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
 from auth import require_role
+from services import levels
 import uuid
 import os
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 router = APIRouter(prefix="/levels", tags=["levels"])
 
 # ==================== MODELOS ====================
@@ -45,13 +42,13 @@ class LevelResponse(BaseModel):
 @router.get("/", response_model=List[LevelResponse])
 async def get_all_levels():
     """Listar todos os níveis (ordenados por min_points)"""
-    levels = await db.levels.find({}, {"_id": 0}).sort("min_points", 1).to_list(100)
+    all_levels = await db.levels.find({}, {"_id": 0}).sort("min_points", 1).to_list(100)
     
     # Adicionar ordem baseada na posição
-    for i, level in enumerate(levels):
+    for i, level in enumerate(all_levels):
         level["order"] = i + 1
     
-    return levels
+    return all_levels
 
 @router.get("/{level_id}", response_model=LevelResponse)
 async def get_level(level_id: str):
@@ -90,6 +87,7 @@ async def create_level(
     }
     
     await db.levels.insert_one(level)
+    await levels.on_levels_changed()
     level.pop("_id", None)
     return level
 
@@ -121,6 +119,8 @@ async def update_level(
     updates["updated_at"] = datetime.now(timezone.utc).isoformat()
     
     await db.levels.update_one({"id": level_id}, {"$set": updates})
+    if "title" in updates or "min_points" in updates:
+        await levels.on_levels_changed()
     
     updated = await db.levels.find_one({"id": level_id}, {"_id": 0})
     return updated
@@ -136,8 +136,16 @@ async def delete_level(
         raise HTTPException(status_code=404, detail="Nível não encontrado")
     
     await db.levels.delete_one({"id": level_id})
+    await levels.on_levels_changed()
     return {"message": "Nível excluído com sucesso"}
 
+@router.post("/recompute")
+async def recompute_user_levels(
+    current_user: dict = Depends(require_role(["admin"]))
+):
+    """Reatribuir agora o nível de todos os usuários conforme os níveis cadastrados"""
+    return await levels.recompute()
+
 @router.post("/seed")
 async def seed_default_levels(
     current_user: dict = Depends(require_role(["admin"]))
@@ -165,17 +173,11 @@ async def seed_default_levels(
             "updated_at": datetime.now(timezone.utc).isoformat()
         }
         await db.levels.insert_one(level)
+    await levels.on_levels_changed()
     
     return {"message": f"Criados {len(default_levels)} níveis padrão"}
 
 # Função auxiliar para calcular o nível de um usuário
 async def get_user_level(points: int) -> dict:
-    """Retorna o nível atual baseado nos pontos"""
-    levels = await db.levels.find({}, {"_id": 0}).sort("min_points", -1).to_list(100)
-    
-    for level in levels:
-        if points >= level["min_points"]:
-            return level
-    
-    # Nível padrão se nenhum for encontrado
-    return {"title": "Iniciante", "min_points": 0, "icon": "🌱", "color": "#6b7280"}
+    """Retorna o nível atual baseado nos pontos (tabela em memória, services/levels)"""
+    return await levels.level_for(points)
@@ -1,15 +1,12 @@
 from fastapi import APIRouter, HTTPException, Depends
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
+from services import dashboard_stats, module_progress, translation_memory
 from models import Module, ModuleCreate
 from auth import get_current_user, require_role
 import os
 from datetime import datetime, timezone
 from dateutil.relativedelta import relativedelta
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 router = APIRouter(prefix="/modules", tags=["modules"])
 
 @router.get("/")
@@ -52,16 +49,18 @@ async def get_all_modules(current_user: dict = Depends(get_current_user)):
         
         modules = filtered_modules
     
+    module_ids = [module["id"] for module in modules]
+    counts = await module_progress.chapter_counts(module_ids)
+    user_modules = {}
+    if current_user.get("role") != "admin":
+        user_modules = await module_progress.get_user_modules(current_user["sub"], module_ids)
+    
     for module in modules:
-        chapters_count = await db.chapters.count_documents({"module_id": module["id"]})
+        chapters_count = counts.get(module["id"], 0)
         module["chapters_count"] = chapters_count
         
         if current_user.get("role") != "admin":
-            completed_chapters = await db.user_progress.count_documents({
-                "user_id": current_user["sub"],
-                "module_id": module["id"],
-                "completed": True
-            })
+            completed_chapters = user_modules.get(module["id"], {}).get("completed_chapters", 0)
             module["progress"] = (completed_chapters / chapters_count * 100) if chapters_count > 0 else 0
     
     return modules
@@ -89,6 +88,8 @@ async def get_module(module_id: str, current_user: dict = Depends(get_current_us
 async def create_module(module_data: ModuleCreate, current_user: dict = Depends(require_role(["admin"]))):
     module = Module(**module_data.model_dump(), created_by=current_user["sub"])
     await db.modules.insert_one(module.model_dump())
+    dashboard_stats.invalidate(dashboard_stats.SYSTEM)
+    await translation_memory.schedule_warm(module.model_dump())
     return module
 
 @router.put("/{module_id}")
@@ -99,14 +100,17 @@ async def update_module(module_id: str, updates: dict, current_user: dict = Depe
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Módulo não encontrado")
+    await translation_memory.schedule_warm(updates)
     return {"message": "Módulo atualizado com sucesso"}
 
 @router.delete("/{module_id}")
 async def delete_module(module_id: str, current_user: dict = Depends(require_role(["admin"]))):
     await db.chapters.delete_many({"module_id": module_id})
     await db.user_progress.delete_many({"module_id": module_id})
+    await module_progress.on_module_deleted(module_id)
     
     result = await db.modules.delete_one({"id": module_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Módulo não encontrado")
+    dashboard_stats.invalidate()
     return {"message": "Módulo deletado com sucesso"}
\ No newline at end of file
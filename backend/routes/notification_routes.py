@@ -1,58 +1,78 @@
 from fastapi import APIRouter, HTTPException, Depends
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
 from models import Notification, NotificationCreate
 from auth import get_current_user, require_role
+from services import admin_notifications, event_bus, notification_push, unread_counters
+from typing import Optional
 import os
+import uuid
 from datetime import datetime, timezone
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 
 @router.get("/my")
-async def get_my_notifications(current_user: dict = Depends(get_current_user)):
-    notifications = await db.notifications.find(
-        {"user_id": current_user["sub"]},
-        {"_id": 0}
-    ).sort("created_at", -1).limit(50).to_list(50)
+async def get_my_notifications(since: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    """
+    Últimas 50 notificações e o contador de não lidas.
+    since: created_at da última notificação recebida; retorna só as mais novas (reconexão do socket).
+    """
+    if since:
+        notifications = await notification_push.missed_since(current_user["sub"], since)
+    else:
+        notifications = await db.notifications.find(
+            {"user_id": current_user["sub"]},
+            {"_id": 0}
+        ).sort("created_at", -1).limit(50).to_list(50)
     
-    unread_count = sum(1 for n in notifications if not n.get("read", False))
+    # Contador mantido na criação/leitura (não depende das 50 mais recentes)
+    counters = await unread_counters.get(current_user["sub"])
     
     return {
         "notifications": notifications,
-        "unread_count": unread_count
+        "unread_count": counters[unread_counters.NOTIFICATIONS]
     }
 
 @router.put("/{notification_id}/read")
 async def mark_as_read(notification_id: str, current_user: dict = Depends(get_current_user)):
-    notification = await db.notifications.find_one({"id": notification_id, "user_id": current_user["sub"]}, {"_id": 0})
+    notification = await db.notifications.find_one_and_update(
+        {"id": notification_id, "user_id": current_user["sub"]},
+        {"$set": {"read": True}},
+        projection={"_id": 0, "read": 1}
+    )
     if not notification:
         raise HTTPException(status_code=404, detail="Notificação não encontrada")
     
-    await db.notifications.update_one(
-        {"id": notification_id},
-        {"$set": {"read": True}}
-    )
+    if not notification.get("read", False):
+        unread_count = await unread_counters.incr(current_user["sub"], unread_counters.NOTIFICATIONS, -1)
+        await notification_push.push_count(current_user["sub"], unread_count)
     
     return {"message": "Notificação marcada como lida"}
 
 @router.put("/read-all")
 async def mark_all_as_read(current_user: dict = Depends(get_current_user)):
-    await db.notifications.update_many(
+    result = await db.notifications.update_many(
         {"user_id": current_user["sub"], "read": False},
         {"$set": {"read": True}}
     )
+    if result.modified_count:
+        unread_count = await unread_counters.incr(current_user["sub"], unread_counters.NOTIFICATIONS, -result.modified_count)
+        await notification_push.push_count(current_user["sub"], unread_count)
     
     return {"message": "Todas as notificações marcadas como lidas"}
 
 @router.delete("/{notification_id}")
 async def delete_notification(notification_id: str, current_user: dict = Depends(get_current_user)):
-    result = await db.notifications.delete_one({"id": notification_id, "user_id": current_user["sub"]})
-    if result.deleted_count == 0:
+    deleted = await db.notifications.find_one_and_delete(
+        {"id": notification_id, "user_id": current_user["sub"]},
+        projection={"_id": 0, "read": 1}
+    )
+    if not deleted:
         raise HTTPException(status_code=404, detail="Notificação não encontrada")
     
+    if not deleted.get("read", False):
+        unread_count = await unread_counters.incr(current_user["sub"], unread_counters.NOTIFICATIONS, -1)
+        await notification_push.push_count(current_user["sub"], unread_count)
+    
     return {"message": "Notificação deletada"}
 
 async def create_notification(user_id: str, title: str, message: str, notification_type: str, related_id: str = None):
@@ -66,11 +86,36 @@ async def create_notification(user_id: str, title: str, message: str, notificati
     )
     
     await db.notifications.insert_one(notification.model_dump())
+    unread_count = await unread_counters.incr(user_id, unread_counters.NOTIFICATIONS)
+    # Entrega imediata ao usuário conectado (substitui o polling)
+    await notification_push.push(notification.model_dump(), unread_count)
     return notification
 
-async def notify_admins(title: str, message: str, notification_type: str, related_id: str = None):
-    """Helper function to notify all admins"""
-    admins = await db.users.find({"role": "admin"}, {"_id": 0, "id": 1}).to_list(100)
-    
-    for admin in admins:
-        await create_notification(admin["id"], title, message, notification_type, related_id)
+async def notify_admins(title: str, message: str, notification_type: str, related_id: str = None,
+                        digest: Optional[dict] = None, key: Optional[str] = None):
+    """
+    Notifica todos os admins. Só grava o evento no outbox; a distribuição (um insert_many)
+    roda no event bus. digest = {"key", "title", "message"} agrupa notificações do mesmo
+    key ainda não lidas dentro da janela, com "{count}" no título/mensagem do resumo.
+    Com `key`, chamadas repetidas (ex.: handler reexecutado) notificam uma vez só.
+    """
+    await event_bus.publish(event_bus.ADMIN_NOTIFICATION, {
+        "event_key": key or str(uuid.uuid4()),
+        "title": title,
+        "message": message,
+        "type": notification_type,
+        "related_id": related_id,
+        "digest": digest
+    }, key=f"admin_notification:{key}" if key else None)
+
+
+@event_bus.subscribe(event_bus.ADMIN_NOTIFICATION, name="notifications.admin_fan_out")
+async def on_admin_notification(payload: dict):
+    await admin_notifications.fan_out(
+        payload["event_key"],
+        payload["title"],
+        payload["message"],
+        payload["type"],
+        payload.get("related_id"),
+        payload.get("digest")
+    )
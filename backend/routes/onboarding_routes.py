@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
+from services import dashboard_stats, leaderboard
 from models import SupervisorLink, LicenseeRegistration, TrainingClass, TrainingClassCreate, FieldSaleNote
 from auth import get_current_user, require_role, get_password_hash
 import os
@@ -10,10 +11,6 @@ import shutil
 from pathlib import Path
 from typing import Optional
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 router = APIRouter(prefix="/onboarding", tags=["onboarding"])
 
 DOCUMENTS_DIR = Path("/app/uploads/documents")
@@ -111,6 +108,8 @@ async def register_licensee(registration: LicenseeRegistration):
     user_dict["password_hash"] = get_password_hash(registration.password)
     
     await db.users.insert_one(user_dict)
+    dashboard_stats.invalidate()
+    await leaderboard.touch(user_dict["id"])
     
     await db.supervisor_links.update_one(
         {"token": registration.registration_token},
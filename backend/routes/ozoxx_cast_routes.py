@@ -7,17 +7,13 @@ from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime, timezone
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
 from auth import get_current_user, require_role
 import uuid
 import os
 import aiofiles
 import shutil
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 router = APIRouter(prefix="/ozoxx-cast", tags=["ozoxx-cast"])
 
 # Diretório para armazenar vídeos
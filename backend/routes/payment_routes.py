@@ -16,6 +16,7 @@ from models_payment import (
     Transaction, TransactionResponse, PaymentStatus,
     WebhookEvent, PaymentPurpose, PaymentMethod
 )
+from services import timestamps
 from services.payment_gateway import payment_gateway
 
 logger = logging.getLogger(__name__)
@@ -389,14 +390,14 @@ async def handle_mercadopago_webhook(request: Request):
                     # Atualizar transação
                     update_data = {
                         "status": new_status,
-                        "updated_at": datetime.now().isoformat(),
+                        "updated_at": timestamps.now(),
                         "gateway_payment_id": str(payment_id),
                         "payment_method_used": status_result.get("payment_method"),
                         "payment_type_used": status_result.get("payment_type")
                     }
                     
                     if new_status in [PaymentStatus.APPROVED, PaymentStatus.PAID]:
-                        update_data["paid_at"] = datetime.now().isoformat()
+                        update_data["paid_at"] = timestamps.now()
                     
                     await db.transactions.update_one(
                         {"id": transaction["id"]},
@@ -505,7 +506,7 @@ async def payment_success_callback(
     
     # Atualizar com informações do callback
     update_data = {
-        "updated_at": datetime.now().isoformat()
+        "updated_at": timestamps.now()
     }
     
     if collection_id or payment_id:
@@ -515,7 +516,7 @@ async def payment_success_callback(
         mp_status = collection_status or status
         if mp_status == "approved":
             update_data["status"] = PaymentStatus.APPROVED
-            update_data["paid_at"] = datetime.now().isoformat()
+            update_data["paid_at"] = timestamps.now()
         elif mp_status == "pending":
             update_data["status"] = PaymentStatus.PENDING
     
@@ -1,14 +1,11 @@
 from fastapi import APIRouter, HTTPException, Depends
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
+from services import translation_memory
 from models import Post, PostCreate
 from auth import get_current_user, require_role
 import os
 from datetime import datetime
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 router = APIRouter(prefix="/posts", tags=["posts"])
 
 @router.get("/")
@@ -58,6 +55,7 @@ async def create_post(
     )
     
     await db.posts.insert_one(post.model_dump())
+    await translation_memory.schedule_warm(post.model_dump())
     return post
 
 @router.put("/{post_id}")
@@ -74,6 +72,7 @@ async def update_post(
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Post não encontrado")
+    await translation_memory.schedule_warm(updates)
     return {"message": "Post atualizado com sucesso"}
 
 @router.delete("/{post_id}")
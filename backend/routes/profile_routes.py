@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
 from auth import get_current_user
 from pydantic import BaseModel
 from typing import Optional
@@ -10,10 +10,6 @@ import shutil
 from PIL import Image
 import io
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 router = APIRouter(prefix="/profile", tags=["profile"])
 
 UPLOAD_DIR = Path("/app/uploads/avatars")
@@ -1,13 +1,10 @@
 from fastapi import APIRouter, HTTPException, Depends
-from motor.motor_asyncio import AsyncIOMotorClient
-from models import UserProgress, ProgressUpdate
+from pymongo.errors import DuplicateKeyError
+from database import db
+from models import UserProgress, ProgressUpdate, ProgressHeartbeatBatch
 from auth import get_current_user
+from services import chapter_completions, event_bus, module_progress, points, progress_buffer, timestamps
 import os
-from datetime import datetime, timezone
-
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
 
 router = APIRouter(prefix="/progress", tags=["progress"])
 
@@ -34,250 +31,119 @@ async def check_and_advance_onboarding_stage(user_id: str):
     if not acolhimento_modules:
         return False
     
-    # Verificar se todos os capítulos de todos os módulos de acolhimento foram concluídos
-    all_acolhimento_completed = True
+    # Módulos sem capítulos não bloqueiam o avanço
+    chapters_per_module = await module_progress.chapter_counts([m["id"] for m in acolhimento_modules])
+    required_ids = [mid for mid, count in chapters_per_module.items() if count > 0]
     
-    for acolh_module in acolhimento_modules:
-        module_chapters = await db.chapters.find({"module_id": acolh_module["id"]}, {"_id": 0, "id": 1}).to_list(100)
-        
-        for chapter in module_chapters:
-            chapter_progress = await db.user_progress.find_one({
-                "user_id": user_id,
-                "chapter_id": chapter["id"],
-                "completed": True
-            })
-            if not chapter_progress:
-                all_acolhimento_completed = False
-                break
-        
-        if not all_acolhimento_completed:
-            break
+    completed_required = await db.user_module_progress.count_documents({
+        "user_id": user_id,
+        "module_id": {"$in": required_ids},
+        "completed": True
+    }) if required_ids else 0
+    all_acolhimento_completed = completed_required == len(required_ids)
     
     if all_acolhimento_completed:
         # Avançar para próxima etapa do onboarding (treinamento presencial)
-        await db.users.update_one(
-            {"id": user_id},
+        result = await db.users.update_one(
+            {"id": user_id, "current_stage": "acolhimento"},
             {"$set": {"current_stage": "treinamento_presencial"}}
         )
-        
-        # Criar notificação
-        from routes.notification_routes import create_notification
-        await create_notification(
-            user_id,
-            "Acolhimento Concluído! 🎓",
-            "Parabéns! Você concluiu todos os módulos de acolhimento. Agora você pode se inscrever no treinamento presencial.",
-            "onboarding_stage",
-            "treinamento_presencial"
-        )
+        if result.modified_count:
+            await event_bus.publish(event_bus.STAGE_ADVANCED, {
+                "user_id": user_id,
+                "from_stage": "acolhimento",
+                "to_stage": "treinamento_presencial"
+            })
         return True
     
     return False
 
-async def update_challenge_progress(user_id: str):
-    """Atualiza o progresso dos desafios semanais ativos"""
-    today = datetime.now().strftime("%Y-%m-%d")
-    
-    # Buscar desafios ativos
-    active_challenges = await db.weekly_challenges.find({
-        "active": True,
-        "start_date": {"$lte": today},
-        "end_date": {"$gte": today}
-    }, {"_id": 0}).to_list(100)
-    
-    for challenge in active_challenges:
-        challenge_type = challenge.get("challenge_type", "")
-        target_value = challenge.get("target_value", 0)
-        
-        # Calcular progresso baseado no tipo de desafio
-        current_progress = 0
-        
-        if challenge_type == "complete_chapters":
-            # Contar capítulos completos nesta semana
-            week_start = challenge.get("start_date")
-            completed_count = await db.user_progress.count_documents({
-                "user_id": user_id,
-                "completed": True,
-                "completed_at": {"$gte": week_start}
-            })
-            current_progress = completed_count
-            
-        elif challenge_type == "complete_modules":
-            # Contar módulos completos
-            modules = await db.modules.find({}, {"_id": 0, "id": 1}).to_list(1000)
-            completed_modules = 0
-            for module in modules:
-                total_chapters = await db.chapters.count_documents({"module_id": module["id"]})
-                if total_chapters == 0:
-                    continue
-                completed_chapters = await db.user_progress.count_documents({
-                    "user_id": user_id,
-                    "module_id": module["id"],
-                    "completed": True
-                })
-                if completed_chapters >= total_chapters:
-                    completed_modules += 1
-            current_progress = completed_modules
-            
-        elif challenge_type == "earn_points":
-            # Verificar pontos do usuário
-            user = await db.users.find_one({"id": user_id}, {"_id": 0, "points": 1})
-            current_progress = user.get("points", 0) if user else 0
-            
-        elif challenge_type == "daily_access":
-            # Contar dias de acesso na semana (baseado em streak)
-            user = await db.users.find_one({"id": user_id}, {"_id": 0, "current_streak": 1})
-            current_progress = user.get("current_streak", 0) if user else 0
-        
-        # Verificar se completou o desafio
-        is_completed = current_progress >= target_value
-        
-        # Buscar progresso existente
-        existing_progress = await db.user_challenge_progress.find_one({
-            "user_id": user_id,
-            "challenge_id": challenge["id"]
-        })
-        
-        if existing_progress:
-            # Só atualizar se não estava completo antes
-            if not existing_progress.get("completed", False):
-                update_data = {"current_progress": current_progress}
-                
-                if is_completed:
-                    update_data["completed"] = True
-                    update_data["completed_at"] = datetime.now(timezone.utc).isoformat()
-                    
-                    # Dar pontos de recompensa
-                    await db.users.update_one(
-                        {"id": user_id},
-                        {"$inc": {"points": challenge.get("points_reward", 0)}}
-                    )
-                
-                await db.user_challenge_progress.update_one(
-                    {"id": existing_progress["id"]},
-                    {"$set": update_data}
-                )
-        else:
-            # Criar novo progresso
-            from models import UserChallengeProgress
-            new_progress = UserChallengeProgress(
-                user_id=user_id,
-                challenge_id=challenge["id"],
-                current_progress=current_progress,
-                completed=is_completed,
-                completed_at=datetime.now(timezone.utc).isoformat() if is_completed else None
-            )
-            await db.user_challenge_progress.insert_one(new_progress.model_dump())
-            
-            if is_completed:
-                await db.users.update_one(
-                    {"id": user_id},
-                    {"$inc": {"points": challenge.get("points_reward", 0)}}
-                )
-
-@router.post("/update")
-async def update_progress(progress_data: ProgressUpdate, current_user: dict = Depends(get_current_user)):
-    existing = await db.user_progress.find_one({
-        "user_id": current_user["sub"],
-        "chapter_id": progress_data.chapter_id
-    }, {"_id": 0})
+async def apply_progress_update(user_id: str, progress_data: ProgressUpdate):
+    """Caminho completo (síncrono) de gravação do progresso de um capítulo"""
+    # Percentual ainda no buffer de heartbeats não pode ser sobrescrito por um valor menor
+    buffered = progress_buffer.buffer.take(user_id, progress_data.chapter_id)
+    if buffered is not None and buffered > progress_data.watched_percentage:
+        progress_data = progress_data.model_copy(update={"watched_percentage": buffered})
     
     # Validação: só pode marcar como completo se assistiu pelo menos MIN_WATCH_PERCENTAGE%
     can_complete = progress_data.watched_percentage >= MIN_WATCH_PERCENTAGE
     should_complete = progress_data.completed and can_complete
     
     if progress_data.completed and not can_complete:
+        if buffered is not None:
+            progress_buffer.buffer.add(user_id, progress_data.module_id, progress_data.chapter_id, buffered)
         raise HTTPException(
             status_code=400, 
             detail=f"Você precisa assistir pelo menos {MIN_WATCH_PERCENTAGE}% do conteúdo para marcar como completo. Progresso atual: {progress_data.watched_percentage}%"
         )
     
-    newly_completed = False  # Flag para saber se este capítulo acabou de ser completado
+    # Upsert por (user_id, chapter_id), como o flush dos heartbeats: os dois caminhos
+    # nunca criam dois documentos para o mesmo capítulo (índice único)
+    chapter = {"user_id": user_id, "chapter_id": progress_data.chapter_id}
+    progress = UserProgress(
+        user_id=user_id,
+        module_id=progress_data.module_id,
+        chapter_id=progress_data.chapter_id
+    ).model_dump()
+    update = {
+        "$max": {"watched_percentage": progress_data.watched_percentage},
+        "$setOnInsert": {k: v for k, v in progress.items() if k not in chapter and k != "watched_percentage"}
+    }
+    try:
+        await db.user_progress.update_one(chapter, update, upsert=True)
+    except DuplicateKeyError:
+        # Outro upsert inseriu o documento entre a busca e a inserção: agora ele existe
+        await db.user_progress.update_one(chapter, update)
     
-    if existing:
-        update_data = {
-            "watched_percentage": progress_data.watched_percentage
-        }
-        
-        if should_complete and not existing.get("completed", False):
-            update_data["completed"] = True
-            update_data["completed_at"] = datetime.now(timezone.utc).isoformat()
-            newly_completed = True
-            
-            # Atualizar progresso dos desafios semanais
-            await update_challenge_progress(current_user["sub"])
-        
-        await db.user_progress.update_one(
-            {"id": existing["id"]},
-            {"$set": update_data}
-        )
-    else:
-        progress = UserProgress(
-            user_id=current_user["sub"],
-            module_id=progress_data.module_id,
-            chapter_id=progress_data.chapter_id,
-            completed=should_complete,
-            watched_percentage=progress_data.watched_percentage
+    # Conclusão condicional: só uma requisição conclui o capítulo (e publica o evento)
+    newly_completed = False
+    completed_at = None
+    if should_complete:
+        completed_at = timestamps.now()
+        result = await db.user_progress.update_one(
+            {**chapter, "completed": {"$ne": True}},
+            {"$set": {"completed": True, "completed_at": completed_at}}
         )
-        
-        if should_complete:
-            progress.completed_at = datetime.now(timezone.utc).isoformat()
-            newly_completed = True
-            # Atualizar progresso dos desafios semanais
-            await update_challenge_progress(current_user["sub"])
-        
-        await db.user_progress.insert_one(progress.model_dump())
+        newly_completed = result.modified_count == 1
     
-    # Se o capítulo foi marcado como completo, verificar se completou o módulo
+    # Efeitos colaterais (módulo, desafios, onboarding, notificações) rodam no event bus;
+    # se o processo cair antes da publicação, chapter_completions.reconcile republica
     if newly_completed:
-        module_chapters = await db.chapters.find({"module_id": progress_data.module_id}, {"_id": 0}).to_list(1000)
-        all_module_completed = True
-        
-        for chapter in module_chapters:
-            if chapter["id"] == progress_data.chapter_id:
-                continue  # Já sabemos que este está completo
-            chapter_progress = await db.user_progress.find_one({
-                "user_id": current_user["sub"],
-                "chapter_id": chapter["id"],
-                "completed": True
-            })
-            if not chapter_progress:
-                all_module_completed = False
-                break
-        
-        if all_module_completed:
-            module = await db.modules.find_one({"id": progress_data.module_id}, {"_id": 0})
-            if module:
-                # Dar pontos de recompensa
-                if module.get("points_reward", 0) > 0:
-                    await db.users.update_one(
-                        {"id": current_user["sub"]},
-                        {"$inc": {"points": module["points_reward"]}}
-                    )
-                
-                # Criar notificações
-                user = await db.users.find_one({"id": current_user["sub"]}, {"_id": 0})
-                from routes.notification_routes import create_notification, notify_admins
-                
-                await create_notification(
-                    current_user["sub"],
-                    "Módulo Concluído! 🎉",
-                    f"Parabéns! Você concluiu o módulo '{module['title']}' e ganhou {module.get('points_reward', 0)} pontos!",
-                    "module_completed",
-                    module["id"]
-                )
-                
-                await notify_admins(
-                    "Licenciado completou módulo",
-                    f"{user['full_name']} concluiu o módulo '{module['title']}'",
-                    "admin_notification",
-                    module["id"]
-                )
-        
-        # SEMPRE verificar se deve avançar o estágio de onboarding após completar um capítulo
-        await check_and_advance_onboarding_stage(current_user["sub"])
+        await chapter_completions.publish({**chapter, "module_id": progress_data.module_id, "completed_at": completed_at})
     
+    return newly_completed
+
+@router.post("/update")
+async def update_progress(progress_data: ProgressUpdate, current_user: dict = Depends(get_current_user)):
+    await apply_progress_update(current_user["sub"], progress_data)
     return {"message": "Progresso atualizado com sucesso"}
 
+@router.post("/heartbeat")
+async def progress_heartbeat(batch: ProgressHeartbeatBatch, current_user: dict = Depends(get_current_user)):
+    """
+    Heartbeats do player em lote. Percentuais assistidos vão para o buffer de coalescência
+    (gravados em bulk a cada poucos segundos); só conclusões seguem o caminho completo.
+    """
+    buffered = 0
+    completed = []
+    rejected = []
+    
+    for heartbeat in batch.heartbeats:
+        if not heartbeat.completed:
+            progress_buffer.buffer.add(
+                current_user["sub"], heartbeat.module_id, heartbeat.chapter_id, heartbeat.watched_percentage
+            )
+            buffered += 1
+            continue
+        
+        try:
+            await apply_progress_update(current_user["sub"], heartbeat)
+            completed.append(heartbeat.chapter_id)
+        except HTTPException as e:
+            rejected.append({"chapter_id": heartbeat.chapter_id, "detail": e.detail})
+    
+    return {"buffered": buffered, "completed": completed, "rejected": rejected}
+
 @router.get("/my-progress")
 async def get_my_progress(current_user: dict = Depends(get_current_user)):
     progress = await db.user_progress.find({"user_id": current_user["sub"]}, {"_id": 0}).to_list(1000)
@@ -332,4 +198,77 @@ async def get_module_progress(module_id: str, current_user: dict = Depends(get_c
         "total_chapters": total_chapters,
         "completed_chapters": completed_chapters,
         "percentage": (completed_chapters / total_chapters * 100) if total_chapters > 0 else 0
-    }
\ No newline at end of file
+    }
+
+# ==================== HANDLERS DE EVENTOS ====================
+# Registrados na importação deste módulo; executados na ordem abaixo pelo event bus
+
+@event_bus.subscribe(event_bus.CHAPTER_COMPLETED, name="progress.module_completion")
+async def on_chapter_completed_refresh_module(payload: dict):
+    row = await module_progress.refresh_user_module(payload["user_id"], payload["module_id"])
+    if row["completed"]:
+        # A chave torna a publicação idempotente entre tentativas
+        await event_bus.publish(
+            event_bus.MODULE_COMPLETED,
+            {"user_id": payload["user_id"], "module_id": payload["module_id"], "completed_at": row["completed_at"]},
+            key=f"module_completed:{payload['user_id']}:{payload['module_id']}:{row['completed_at']}"
+        )
+
+@event_bus.subscribe(event_bus.CHAPTER_COMPLETED, name="progress.onboarding")
+async def on_chapter_completed_onboarding(payload: dict):
+    # SEMPRE verificar se deve avançar o estágio de onboarding após completar um capítulo
+    await check_and_advance_onboarding_stage(payload["user_id"])
+
+@event_bus.subscribe(event_bus.MODULE_COMPLETED, name="progress.module_reward")
+async def on_module_completed_reward(payload: dict):
+    module = await db.modules.find_one({"id": payload["module_id"]}, {"_id": 0, "points_reward": 1})
+    if module and module.get("points_reward", 0) > 0:
+        # Cada conclusão do módulo vale um prêmio; reprocessar o evento não soma de novo
+        await points.award(
+            payload["user_id"], module["points_reward"], points.MODULE,
+            key=f"module:{payload['module_id']}:{payload.get('completed_at')}", ref=payload["module_id"]
+        )
+
+@event_bus.subscribe(event_bus.MODULE_COMPLETED, name="progress.module_notifications")
+async def on_module_completed_notify(payload: dict):
+    module = await db.modules.find_one({"id": payload["module_id"]}, {"_id": 0})
+    if not module:
+        return
+    
+    user = await db.users.find_one({"id": payload["user_id"]}, {"_id": 0, "full_name": 1})
+    from routes.notification_routes import create_notification, notify_admins
+    
+    await create_notification(
+        payload["user_id"],
+        "Módulo Concluído! 🎉",
+        f"Parabéns! Você concluiu o módulo '{module['title']}' e ganhou {module.get('points_reward', 0)} pontos!",
+        "module_completed",
+        module["id"]
+    )
+    
+    await notify_admins(
+        "Licenciado completou módulo",
+        f"{user['full_name'] if user else 'Licenciado'} concluiu o módulo '{module['title']}'",
+        "admin_notification",
+        module["id"],
+        digest={
+            "key": f"module_completed:{module['id']}",
+            "title": "Licenciados completaram módulo",
+            "message": f"{{count}} licenciados concluíram o módulo '{module['title']}'"
+        },
+        key=f"module_completed:{payload['user_id']}:{module['id']}"
+    )
+
+@event_bus.subscribe(event_bus.STAGE_ADVANCED, name="progress.stage_notification")
+async def on_stage_advanced_notify(payload: dict):
+    if payload.get("to_stage") != "treinamento_presencial":
+        return
+    
+    from routes.notification_routes import create_notification
+    await create_notification(
+        payload["user_id"],
+        "Acolhimento Concluído! 🎓",
+        "Parabéns! Você concluiu todos os módulos de acolhimento. Agora você pode se inscrever no treinamento presencial.",
+        "onboarding_stage",
+        "treinamento_presencial"
+    )
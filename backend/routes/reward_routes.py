@@ -1,14 +1,10 @@
 from fastapi import APIRouter, HTTPException, Depends
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
 from models import Reward, RewardCreate, RewardRedemption
 from auth import get_current_user, require_role
 import os
 from datetime import datetime, timezone
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 router = APIRouter(prefix="/rewards", tags=["rewards"])
 
 @router.get("/")
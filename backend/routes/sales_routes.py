@@ -2,7 +2,7 @@
 Rotas para gerenciamento de links de pagamento (10 vendas)
 """
 from fastapi import APIRouter, HTTPException, Depends
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
 from typing import Optional
 from datetime import datetime, timedelta
 import os
@@ -13,10 +13,6 @@ from models_payment import PaymentLink, CreatePaymentLinkRequest, PaymentGateway
 
 router = APIRouter(prefix="/sales", tags=["sales"])
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 
 @router.get("/my-links")
 async def get_my_links(current_user: dict = Depends(get_current_user)):
@@ -1,24 +1,52 @@
 from fastapi import APIRouter, HTTPException, Depends
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
+from services import dashboard_stats, leaderboard, module_progress, points
 from auth import get_current_user, require_role
 import os
 from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
-
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+from typing import Optional
 
 router = APIRouter(prefix="/stats", tags=["stats"])
 
+LEADERBOARD_PROJECTION = {"_id": 0, "password_hash": 0, "reset_token": 0, "reset_token_expires": 0}
+
 @router.get("/leaderboard")
-async def get_leaderboard(current_user: dict = Depends(get_current_user)):
-    users = await db.users.find(
-        {"role": "licenciado"},
-        {"_id": 0, "password_hash": 0, "reset_token": 0, "reset_token_expires": 0}
-    ).sort("points", -1).limit(100).to_list(100)
-    
-    return users
+async def get_leaderboard(
+    period: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Ranking geral (sem period) ou dos pontos ganhos no período: week, month
+    ou custom (start/end em YYYY-MM-DD)
+    """
+    if period:
+        try:
+            start_day, end_day = points.period_range(period, start, end)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        rows = await points.window_leaderboard(start_day, end_day, limit=100)
+    else:
+        rows = await leaderboard.top(leaderboard.GLOBAL, 100)
+    return await leaderboard.hydrate(rows, LEADERBOARD_PROJECTION)
+
+@router.get("/points/history")
+async def get_points_history(limit: int = 50, current_user: dict = Depends(get_current_user)):
+    """Últimos lançamentos de pontos do usuário"""
+    return await points.history(current_user["sub"], min(max(limit, 1), 200))
+
+@router.get("/leaderboard/me")
+async def get_my_leaderboard_position(radius: int = 2, current_user: dict = Depends(get_current_user)):
+    """Posição do usuário no ranking geral e os vizinhos acima e abaixo"""
+    position = await leaderboard.position(current_user["sub"])
+    if position is None:
+        raise HTTPException(status_code=404, detail="Usuário fora do ranking")
+    rows = await leaderboard.around(current_user["sub"], radius=min(max(radius, 0), 10))
+    return {
+        **position,
+        "neighbours": await leaderboard.hydrate(rows, {"_id": 0, "id": 1, "full_name": 1, "profile_picture": 1, "level_title": 1})
+    }
 
 @router.get("/dashboard")
 async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
@@ -41,12 +69,15 @@ async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
         
         licensees = await db.users.find({"role": "licenciado"}, {"_id": 0, "password_hash": 0}).to_list(1000)
         
+        completed_by_user = {
+            row["_id"]: row["n"]
+            async for row in db.user_progress.aggregate([
+                {"$match": {"user_id": {"$in": [l["id"] for l in licensees]}, "completed": True}},
+                {"$group": {"_id": "$user_id", "n": {"$sum": 1}}}
+            ])
+        }
         for licensee in licensees:
-            completed = await db.user_progress.count_documents({
-                "user_id": licensee["id"],
-                "completed": True
-            })
-            licensee["completed_chapters"] = completed
+            licensee["completed_chapters"] = completed_by_user.get(licensee["id"], 0)
         
         return {
             "total_licensees": total_licensees,
@@ -58,23 +89,17 @@ async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
         user = await db.users.find_one({"id": current_user["sub"]}, {"_id": 0, "password_hash": 0})
         
         total_modules = await db.modules.count_documents({})
-        completed_modules_count = 0
+        completed_modules_count = await module_progress.count_completed_modules(current_user["sub"])
         
-        modules = await db.modules.find({}, {"_id": 0}).to_list(1000)
-        for module in modules:
-            total_chapters = await db.chapters.count_documents({"module_id": module["id"]})
-            completed_chapters = await db.user_progress.count_documents({
-                "user_id": current_user["sub"],
-                "module_id": module["id"],
-                "completed": True
-            })
-            if total_chapters > 0 and completed_chapters == total_chapters:
-                completed_modules_count += 1
-        
-        my_rank = await db.users.count_documents({
-            "role": "licenciado",
-            "points": {"$gt": user.get("points", 0)}
-        }) + 1
+        position = await leaderboard.position(current_user["sub"])
+        if position:
+            my_rank = position["position"]
+        else:
+            # Usuário fora do ranking de licenciados: posição que teria pelos pontos
+            my_rank = await db.users.count_documents({
+                "role": "licenciado",
+                "points": {"$gt": user.get("points", 0)}
+            }) + 1
         
         return {
             "points": user.get("points", 0),
@@ -137,48 +162,7 @@ async def get_growth_stats(current_user: dict = Depends(require_role(["admin"]))
     Retorna dados de crescimento de licenciados e módulos concluídos
     nos últimos 6 meses para o gráfico de linha do dashboard admin
     """
-    today = datetime.now()
-    months_data = []
-    
-    # Nomes dos meses em português
-    month_names = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
-    
-    # Buscar dados dos últimos 6 meses
-    for i in range(5, -1, -1):
-        # Calcular o mês
-        target_date = today - relativedelta(months=i)
-        month_start = target_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        if i > 0:
-            month_end = (month_start + relativedelta(months=1))
-        else:
-            month_end = today
-        
-        month_name = month_names[month_start.month - 1]
-        
-        # Contar licenciados criados até o final deste mês
-        licenciados_count = await db.users.count_documents({
-            "role": "licenciado",
-            "created_at": {"$lte": month_end.isoformat()}
-        })
-        
-        # Se created_at não existir, contar todos os licenciados existentes
-        if licenciados_count == 0:
-            licenciados_count = await db.users.count_documents({"role": "licenciado"})
-        
-        # Contar módulos concluídos (progresso completo) até este mês
-        modulos_count = await db.user_progress.count_documents({
-            "completed": True,
-            "completed_at": {"$lte": month_end.isoformat()}
-        })
-        
-        months_data.append({
-            "month": month_name,
-            "licenciados": licenciados_count,
-            "modulos": modulos_count
-        })
-    
-    return months_data
+    return await dashboard_stats.growth()
 
 
 @router.get("/admin/stage-distribution")
@@ -187,55 +171,6 @@ async def get_stage_distribution(current_user: dict = Depends(require_role(["adm
     Retorna distribuição de licenciados por etapa do onboarding
     para o gráfico de pizza do dashboard admin
     """
-    # Contar usuários em cada etapa
-    # Etapas: registro, documentos, pagamento, acolhimento, completo
-    
-    # Total de licenciados
-    total = await db.users.count_documents({"role": "licenciado"})
-    
-    # Contagem por etapa
-    registro = await db.users.count_documents({
-        "role": "licenciado",
-        "onboarding_stage": "registro"
-    })
-    
-    documentos = await db.users.count_documents({
-        "role": "licenciado",
-        "onboarding_stage": {"$in": ["documentos", "documentos_pf", "documentos_pj"]}
-    })
-    
-    pagamento = await db.users.count_documents({
-        "role": "licenciado",
-        "onboarding_stage": "pagamento"
-    })
-    
-    acolhimento = await db.users.count_documents({
-        "role": "licenciado",
-        "onboarding_stage": "acolhimento"
-    })
-    
-    completo = await db.users.count_documents({
-        "role": "licenciado",
-        "onboarding_stage": "completo"
-    })
-    
-    # Se não houver dados de onboarding_stage, considerar todos como "registro"
-    if registro + documentos + pagamento + acolhimento + completo == 0 and total > 0:
-        # Verificar usuários sem etapa definida
-        sem_etapa = await db.users.count_documents({
-            "role": "licenciado",
-            "onboarding_stage": {"$exists": False}
-        })
-        registro = sem_etapa
-    
-    distribution = [
-        {"name": "Registro", "value": registro, "color": "#06b6d4"},
-        {"name": "Documentos", "value": documentos, "color": "#8b5cf6"},
-        {"name": "Pagamento", "value": pagamento, "color": "#3b82f6"},
-        {"name": "Acolhimento", "value": acolhimento, "color": "#f59e0b"},
-        {"name": "Completo", "value": completo, "color": "#22c55e"}
-    ]
-    
-    return distribution
+    return await dashboard_stats.stage_distribution()
 
     return access_stats
\ No newline at end of file
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
 from fastapi.responses import FileResponse
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
 from models import SystemConfig
 from auth import get_current_user, require_role
+from indexes import verify_indexes, ensure_indexes, index_usage_stats
+from services import activity_rollups, dashboard_stats, event_bus, migrations, points, scheduler, socket_presence, unread_counters
 import os
 from datetime import datetime
 from pathlib import Path
@@ -10,10 +12,6 @@ import shutil
 from PIL import Image
 import io
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 router = APIRouter(prefix="/system", tags=["system"])
 
 # Diretório para logos
@@ -77,34 +75,82 @@ async def update_system_config(updates: dict, current_user: dict = Depends(requi
 @router.get("/stats")
 async def get_system_stats(current_user: dict = Depends(require_role(["admin"]))):
     """Retorna estatísticas do sistema"""
-    total_users = await db.users.count_documents({})
-    total_licensees = await db.users.count_documents({"role": "licenciado"})
-    total_supervisors = await db.users.count_documents({"role": "supervisor"})
-    total_admins = await db.users.count_documents({"role": "admin"})
-    total_modules = await db.modules.count_documents({})
-    total_chapters = await db.chapters.count_documents({})
-    total_assessments = await db.assessments.count_documents({})
-    total_rewards = await db.rewards.count_documents({})
-    total_badges = await db.badges.count_documents({})
-    total_challenges = await db.weekly_challenges.count_documents({})
-    
-    # Usuários ativos (acessaram nos últimos 7 dias)
-    from datetime import timedelta
-    seven_days_ago = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
-    active_users = await db.user_accesses.distinct("user_id", {"date": {"$gte": seven_days_ago}})
-    
+    return await dashboard_stats.system_stats()
+
+
+# ==================== ÍNDICES DO BANCO ====================
+
+@router.get("/indexes")
+async def get_index_report(current_user: dict = Depends(require_role(["admin"]))):
+    """Relatório de índices (faltantes, drift, extras) e estatísticas de uso"""
+    report = await verify_indexes(db)
+    usage = await index_usage_stats(db)
+
+    return {
+        "report": report,
+        "usage": usage,
+        "unused": [u for u in usage if u.get("ops") == 0 and u.get("name") != "_id_"]
+    }
+
+
+@router.post("/indexes/sync")
+async def sync_indexes(current_user: dict = Depends(require_role(["admin"]))):
+    """Cria os índices faltantes do registro (idempotente)"""
+    return await ensure_indexes(db)
+
+
+@router.get("/events")
+async def get_event_outbox(current_user: dict = Depends(require_role(["admin"]))):
+    """Situação do outbox de eventos (contagem por status e últimas falhas)"""
+    return await event_bus.outbox_stats()
+
+
+@router.post("/events/retry")
+async def retry_failed_events(current_user: dict = Depends(require_role(["admin"]))):
+    """Recoloca na fila os eventos que esgotaram as tentativas"""
+    return {"requeued": await event_bus.retry_failed()}
+
+
+@router.get("/jobs")
+async def get_scheduled_jobs(current_user: dict = Depends(require_role(["admin"]))):
+    """Tarefas periódicas: próxima execução, duração e último erro"""
+    return await scheduler.job_status()
+
+
+@router.post("/unread/reconcile")
+async def reconcile_unread_counters(current_user: dict = Depends(require_role(["admin"]))):
+    """Recalcula os contadores de não lidas (chat e notificações) e corrige a deriva"""
+    return await unread_counters.reconcile()
+
+
+@router.post("/analytics/rollups/rebuild")
+async def rebuild_activity_rollups(current_user: dict = Depends(require_role(["admin"]))):
+    """Recalcula os agregados por hora do heatmap/atividade diária a partir dos acessos e do progresso"""
+    return await activity_rollups.rebuild()
+
+
+@router.post("/points/rebuild")
+async def rebuild_points(current_user: dict = Depends(require_role(["admin"]))):
+    """Recalcula os pontos por dia e o saldo (users.points) de cada usuário a partir do livro de pontos"""
+    try:
+        return await points.rebuild()
+    except points.OpeningBalanceMissing as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/migrations")
+async def get_migrations_status(current_user: dict = Depends(require_role(["admin"]))):
+    """Migrações de dados (run_migrations.py): aplicadas, pendentes e estatísticas"""
+    from migrations import MIGRATIONS
+    return await migrations.status(MIGRATIONS)
+
+
+@router.get("/realtime")
+async def get_realtime_status(current_user: dict = Depends(require_role(["admin"]))):
+    """Conexões Socket.IO ativas por processo e usuários online"""
     return {
-        "total_users": total_users,
-        "total_licensees": total_licensees,
-        "total_supervisors": total_supervisors,
-        "total_admins": total_admins,
-        "total_modules": total_modules,
-        "total_chapters": total_chapters,
-        "total_assessments": total_assessments,
-        "total_rewards": total_rewards,
-        "total_badges": total_badges,
-        "total_challenges": total_challenges,
-        "active_users_7d": len(active_users)
+        "manager": os.environ.get('SOCKETIO_MANAGER', 'local'),
+        **await socket_presence.stats()
     }
 
 
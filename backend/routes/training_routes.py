@@ -10,16 +10,12 @@ from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List
 from datetime import datetime, timezone, timedelta
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
 from auth import get_current_user, require_role
 import uuid
 import os
 import io
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 router = APIRouter(prefix="/training", tags=["training"])
 
 # ==================== MODELOS ====================
@@ -1,8 +1,12 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import List, Optional
+import asyncio
 import os
 from dotenv import load_dotenv
+from database import db
+from auth import require_role
+from services import event_bus, translation_batch, translation_memory
 
 load_dotenv()
 
@@ -23,38 +27,7 @@ LANGUAGE_NAMES = {
     "es": "Spanish"
 }
 
-@router.post("", response_model=TranslationResponse)
-async def translate_texts(request: TranslationRequest):
-    """
-    Traduz uma lista de textos para o idioma alvo usando Claude Sonnet 4.5
-    """
-    from emergentintegrations.llm.chat import LlmChat, UserMessage
-    
-    if not request.texts or len(request.texts) == 0:
-        return TranslationResponse(translations=[], target_language=request.target_language)
-    
-    # Se o idioma de destino for o mesmo da origem, retornar os textos originais
-    if request.target_language == request.source_language:
-        return TranslationResponse(
-            translations=request.texts,
-            target_language=request.target_language
-        )
-    
-    api_key = os.environ.get("EMERGENT_LLM_KEY")
-    if not api_key:
-        raise HTTPException(status_code=500, detail="EMERGENT_LLM_KEY not configured")
-    
-    target_lang_name = LANGUAGE_NAMES.get(request.target_language, request.target_language)
-    source_lang_name = LANGUAGE_NAMES.get(request.source_language, request.source_language)
-    
-    # Preparar os textos numerados para tradução em batch
-    numbered_texts = "\n".join([f"[{i}] {text}" for i, text in enumerate(request.texts)])
-    
-    try:
-        chat = LlmChat(
-            api_key=api_key,
-            session_id=f"translate-{request.target_language}",
-            system_message=f"""You are a professional translator. Your task is to translate text from {source_lang_name} to {target_lang_name}.
+SYSTEM_PROMPT = """You are a professional translator. Your task is to translate text from {source_lang_name} to {target_lang_name}.
 
 CRITICAL RULES:
 1. Translate ONLY the content, preserving any formatting, numbers, or special characters
@@ -72,20 +45,94 @@ Example input:
 Example output for English:
 [0] Hello, how are you?
 [1] My name is João"""
-        ).with_model("anthropic", "claude-sonnet-4-5-20250929")
-        
-        user_message = UserMessage(text=f"Translate the following texts to {target_lang_name}:\n\n{numbered_texts}")
-        
-        response = await chat.send_message(user_message)
-        
-        # Parse a resposta para extrair as traduções
-        translations = parse_translations(response, len(request.texts))
+
+
+async def llm_translate(texts: List[str], source_language: str, target_language: str) -> List[str]:
+    """
+    Traduz um lote de textos com Claude Sonnet 4.5 (só chamado para textos fora da memória).
+    Erros sobem para o chamador, para que nada seja memorizado.
+    """
+    from emergentintegrations.llm.chat import LlmChat, UserMessage
+    
+    api_key = os.environ.get("EMERGENT_LLM_KEY")
+    if not api_key:
+        raise HTTPException(status_code=500, detail="EMERGENT_LLM_KEY not configured")
+    
+    target_lang_name = LANGUAGE_NAMES.get(target_language, target_language)
+    source_lang_name = LANGUAGE_NAMES.get(source_language, source_language)
+    
+    # Preparar os textos numerados para tradução em batch
+    numbered_texts = "\n".join([f"[{i}] {text}" for i, text in enumerate(texts)])
+    
+    chat = LlmChat(
+        api_key=api_key,
+        session_id=f"translate-{target_language}",
+        system_message=SYSTEM_PROMPT.format(source_lang_name=source_lang_name, target_lang_name=target_lang_name)
+    ).with_model("anthropic", "claude-sonnet-4-5-20250929")
+    
+    user_message = UserMessage(text=f"Translate the following texts to {target_lang_name}:\n\n{numbered_texts}")
+    
+    response = await chat.send_message(user_message)
+    
+    # Parse a resposta para extrair as traduções
+    return parse_translations(response, len(texts))
+
+
+async def stub_translate(texts: List[str], source_language: str, target_language: str) -> List[str]:
+    """
+    Backend local para testes (TRANSLATION_BACKEND=stub): devolve "[idioma] texto"
+    após TRANSLATION_STUB_DELAY_MS, sem chamar o LLM.
+    """
+    delay_ms = int(os.environ.get("TRANSLATION_STUB_DELAY_MS", 0))
+    if delay_ms:
+        await asyncio.sleep(delay_ms / 1000)
+    return [f"[{target_language}] {text}" for text in texts]
+
+
+def get_backend():
+    """Backend de tradução configurado em TRANSLATION_BACKEND ("llm" ou "stub")"""
+    if os.environ.get("TRANSLATION_BACKEND", "llm") == "stub":
+        return stub_translate
+    return llm_translate
+
+
+def backend_available() -> bool:
+    return os.environ.get("TRANSLATION_BACKEND", "llm") == "stub" or bool(os.environ.get("EMERGENT_LLM_KEY"))
+
+
+async def translate_batch(texts: List[str], source_language: str, target_language: str) -> List[str]:
+    """Tradutor usado pela memória: divide em blocos e chama o backend em paralelo"""
+    return await translation_batch.translate_in_chunks(texts, source_language, target_language, get_backend())
+
+
+@router.post("", response_model=TranslationResponse)
+async def translate_texts(request: TranslationRequest):
+    """
+    Traduz uma lista de textos para o idioma alvo.
+    Textos já traduzidos vêm da memória de traduções; só os novos vão ao LLM.
+    """
+    if not request.texts or len(request.texts) == 0:
+        return TranslationResponse(translations=[], target_language=request.target_language)
+    
+    # Se o idioma de destino for o mesmo da origem, retornar os textos originais
+    if request.target_language == request.source_language:
+        return TranslationResponse(
+            translations=request.texts,
+            target_language=request.target_language
+        )
+    
+    try:
+        translations = await translation_memory.translate(
+            request.texts, request.source_language, request.target_language, translate_batch
+        )
         
         return TranslationResponse(
             translations=translations,
             target_language=request.target_language
         )
-        
+    
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Translation error: {str(e)}")
         # Em caso de erro, retornar os textos originais
@@ -95,6 +142,25 @@ Example output for English:
         )
 
 
+@router.post("/warm")
+async def warm_translations(current_user: dict = Depends(require_role(["admin"]))):
+    """Pré-aquece a memória com títulos e descrições de módulos, capítulos, banners e posts"""
+    projection = {"_id": 0, "title": 1, "description": 1}
+    documents = []
+    for collection in ("modules", "chapters", "banners", "posts"):
+        documents += await db[collection].find({}, projection).to_list(None)
+    
+    await translation_memory.schedule_warm(*documents)
+    return {"message": "Pré-aquecimento agendado", "documents": len(documents)}
+
+
+@event_bus.subscribe(event_bus.CONTENT_SAVED, name="translate.warm")
+async def on_content_saved_warm(payload: dict):
+    if not backend_available():
+        return
+    await translation_memory.warm(payload["texts"], translate_batch, payload.get("source_language", "pt-BR"))
+
+
 def parse_translations(response: str, expected_count: int) -> List[str]:
     """
     Parse a resposta do LLM para extrair as traduções numeradas
@@ -1,15 +1,11 @@
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
 from auth import get_current_user
 import os
 import uuid
 import shutil
 from pathlib import Path
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 router = APIRouter(prefix="/upload", tags=["upload"])
 
 UPLOAD_DIR = Path("/app/uploads")
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
 from models import UserCreate, User, UserResponse
 from auth import get_current_user, require_role, get_password_hash, verify_password
+from services import activity_rollups, dashboard_stats, leaderboard, points
 import os
 import pandas as pd
 import io
@@ -10,10 +11,6 @@ from datetime import datetime, timedelta, timezone
 import asyncio
 import resend
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 resend.api_key = os.environ.get('RESEND_API_KEY')
 SENDER_EMAIL = os.environ.get('SENDER_EMAIL', 'onboarding@resend.dev')
 FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
@@ -65,6 +62,8 @@ async def create_user(user_data: UserCreate, current_user: dict = Depends(requir
     user_dict["password_hash"] = get_password_hash(password)
     
     await db.users.insert_one(user_dict)
+    dashboard_stats.invalidate()
+    await leaderboard.touch(user_dict["id"])
     
     user_dict.pop("password_hash", None)
     return user_dict
@@ -80,6 +79,9 @@ async def update_user(user_id: str, updates: dict, current_user: dict = Depends(
     elif "password" in updates:
         del updates["password"]
     
+    # Pontos não são gravados direto: o ajuste vira um lançamento no livro de pontos
+    new_points = updates.pop("points", None)
+    
     result = await db.users.update_one(
         {"id": user_id},
         {"$set": updates}
@@ -88,6 +90,21 @@ async def update_user(user_id: str, updates: dict, current_user: dict = Depends(
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     
+    if new_points is not None:
+        await points.set_balance(user_id, int(new_points), ref=current_user["sub"])
+    
+    if "supervisor_id" in updates or "role" in updates:
+        user = await db.users.find_one({"id": user_id}, {"_id": 0, "role": 1, "supervisor_id": 1})
+        await activity_rollups.update_owner(user_id, user.get("supervisor_id"), user.get("role"))
+        dashboard_stats.invalidate()
+    
+    if any(field in updates for field in points.OWNER_FIELDS):
+        user = await db.users.find_one({"id": user_id}, {"_id": 0, "role": 1, "supervisor_id": 1, "category_id": 1})
+        await points.update_owner(user_id, user.get("role"), user.get("supervisor_id"), user.get("category_id"))
+    
+    if any(field in updates for field in leaderboard.RANK_FIELDS):
+        await leaderboard.touch(user_id)
+    
     return {"message": "Usuário atualizado com sucesso"}
 
 @router.delete("/{user_id}")
@@ -95,6 +112,8 @@ async def delete_user(user_id: str, current_user: dict = Depends(require_role(["
     result = await db.users.delete_one({"id": user_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
+    dashboard_stats.invalidate()
+    leaderboard.forget(user_id)
     return {"message": "Usuário deletado com sucesso"}
 
 @router.put("/{user_id}/password")
@@ -186,11 +205,15 @@ async def import_users(file: UploadFile = File(...), current_user: dict = Depend
                 user_dict["password_hash"] = get_password_hash(secrets.token_urlsafe(12))
             
             await db.users.insert_one(user_dict)
+            await leaderboard.touch(user_dict["id"])
             imported += 1
             
         except Exception as e:
             errors.append(f"{row.get('email', 'Unknown')}: {str(e)}")
     
+    if imported:
+        dashboard_stats.invalidate()
+    
     return {
         "message": f"{imported} usuários importados com sucesso",
         "imported": imported,
@@ -237,6 +260,7 @@ async def import_users_csv(file: UploadFile = File(...), current_user: dict = De
             user_dict["reset_token_expires"] = reset_token_expires
             
             await db.users.insert_one(user_dict)
+            await leaderboard.touch(user_dict["id"])
             
             # Buscar nome da plataforma
             platform_name = await get_platform_name()
@@ -271,6 +295,9 @@ async def import_users_csv(file: UploadFile = File(...), current_user: dict = De
         except Exception as e:
             errors.append(f"{row.get('email', 'Unknown')}: {str(e)}")
     
+    if imported:
+        dashboard_stats.invalidate()
+    
     return {
         "message": f"{imported} usuários importados com sucesso",
         "imported": imported,
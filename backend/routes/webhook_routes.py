@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends, Header
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
+from services import dashboard_stats, leaderboard
 from pydantic import BaseModel, EmailStr
 from typing import Optional
 from datetime import datetime
@@ -9,10 +10,6 @@ import secrets
 import httpx
 import resend
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 router = APIRouter(prefix="/webhook", tags=["webhook"])
 
 # Configuração do Resend
@@ -253,6 +250,8 @@ async def webhook_create_licensee(
     }
     
     await db.users.insert_one(user)
+    dashboard_stats.invalidate()
+    await leaderboard.touch(user["id"])
     
     # Registrar log do webhook
     await db.webhook_logs.insert_one({
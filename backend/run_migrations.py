@@ -0,0 +1,43 @@
+"""
+Aplica as migrações de dados pendentes (migrations/) em ordem.
+Uso: python run_migrations.py [--dry-run] [--to VERSAO] [--status]
+"""
+import argparse
+import asyncio
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import database
+from indexes import INDEX_REGISTRY, ensure_indexes
+from migrations import MIGRATIONS
+from services import migrations
+
+async def main(args):
+    database.provider.connect()
+    
+    if args.status:
+        for state in await migrations.status(MIGRATIONS):
+            print(f"{state['version']:04d} {state['name']}: {state['status'] or 'pendente'}")
+        database.provider.close()
+        return
+    
+    await ensure_indexes(database.db, {"schema_migrations": INDEX_REGISTRY["schema_migrations"]})
+    
+    results = await migrations.run(MIGRATIONS, dry_run=args.dry_run, target=args.to)
+    if not results:
+        print("✓ Nenhuma migração pendente")
+    for result in results:
+        prefix = "[dry-run] " if result["dry_run"] else "✓ "
+        print(f"{prefix}{result['version']:04d} {result['name']}")
+        for step, stats in result["stats"].items():
+            print(f"    {step}: {stats['updated']} convertidos, {stats['skipped']} ignorados ({stats['scanned']} lidos)")
+    
+    database.provider.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aplica as migrações de dados pendentes")
+    parser.add_argument("--dry-run", action="store_true", help="só conta o que seria alterado")
+    parser.add_argument("--to", type=int, default=None, help="para na versão informada")
+    parser.add_argument("--status", action="store_true", help="lista as migrações e seu estado")
+    asyncio.run(main(parser.parse_args()))
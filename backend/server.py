@@ -4,6 +4,7 @@ from starlette.middleware.cors import CORSMiddleware
 from starlette.middleware import Middleware
 from dotenv import load_dotenv
 from pathlib import Path
+from contextlib import asynccontextmanager
 import os
 import logging
 import socketio
@@ -17,8 +18,46 @@ from routes import assessment_routes, onboarding_routes, payment_routes, notific
 from routes import banner_routes, post_routes, gamification_routes, system_routes, certificate_routes
 from routes import analytics_routes, profile_routes, favorites_routes, webhook_routes, appointment_routes
 from routes import level_routes, training_routes, sales_routes, ozoxx_cast_routes, translate_routes
+import database
+import indexes
+from services import certificate_jobs, certificate_renderer, event_bus, leaderboard, progress_buffer, scheduler, socket_presence
 
-app = FastAPI(title="UniOzoxx LMS API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Um único pool de conexões MongoDB por processo
+    database.provider.connect()
+    if os.environ.get('MONGO_ENSURE_INDEXES', 'true').lower() == 'true':
+        try:
+            await indexes.ensure_indexes(database.db)
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Erro ao verificar índices: {e}")
+    # Workers do outbox de eventos (efeitos colaterais fora das requisições)
+    event_bus.bus.start()
+    # Gravação em lote dos heartbeats de progresso
+    progress_buffer.buffer.start()
+    # Emissões de certificados em lote interrompidas por reinício
+    try:
+        await certificate_jobs.resume_jobs()
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Erro ao retomar emissões de certificados: {e}")
+    # Presença das conexões Socket.IO deste processo
+    socket_presence.heartbeat.start()
+    # Ranking em memória deste processo (carga inicial e sincronização entre processos)
+    leaderboard.board.start()
+    # Tarefas periódicas (uma execução por intervalo entre todos os processos)
+    scheduler.scheduler.start()
+    yield
+    await scheduler.scheduler.stop()
+    await leaderboard.board.stop()
+    await socket_presence.heartbeat.stop()
+    await progress_buffer.buffer.stop()
+    await event_bus.bus.stop()
+    certificate_renderer.shutdown()
+    database.provider.close()
+
+
+app = FastAPI(title="UniOzoxx LMS API", lifespan=lifespan)
 
 UPLOAD_DIR = Path("/app/uploads")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
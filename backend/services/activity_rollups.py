@@ -0,0 +1,199 @@
+"""
+Agregados de atividade por hora (coleção activity_rollups)
+Um documento por usuário x dia x hora com accesses (logins) e completions (capítulos
+concluídos), mais supervisor_id/role do usuário para filtrar sem consultar users.
+Mantidos com $inc no login e na conclusão de capítulo; o heatmap e a atividade diária
+dos supervisores leem só esta coleção, com uma consulta por faixa de dias. Conclusões
+chegam pelo event bus (entrega pelo menos uma vez): o id do evento fica em "events" do
+documento e uma nova entrega do mesmo evento não soma de novo.
+
+Dia e hora são os do fuso do servidor, para timestamps em data BSON ou string ISO
+(services/timestamps). rebuild() recalcula tudo a partir de user_accesses e
+user_progress (carga inicial e correção).
+"""
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+from services import scheduler, timestamps
+
+logger = logging.getLogger(__name__)
+
+ACCESSES = "accesses"
+COMPLETIONS = "completions"
+
+WEEKDAY_NAMES = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"]
+
+
+def _bucket(timestamp: timestamps.Timestamp) -> Optional[dict]:
+    """Dia (YYYY-MM-DD), hora e dia da semana (0=segunda) de um timestamp"""
+    moment = timestamps.local(timestamp)
+    if moment is None:
+        return None
+    return {"day": moment.strftime("%Y-%m-%d"), "hour": moment.hour, "weekday": moment.weekday()}
+
+
+async def _incr(user: dict, timestamp: timestamps.Timestamp, field: str, event_id: Optional[str] = None):
+    bucket = _bucket(timestamp)
+    if bucket is None:
+        return
+    query = {"user_id": user["id"], "day": bucket["day"], "hour": bucket["hour"]}
+    update = {
+        "$inc": {field: 1},
+        "$set": {"supervisor_id": user.get("supervisor_id"), "role": user.get("role")},
+        "$setOnInsert": {"weekday": bucket["weekday"]}
+    }
+    if event_id:
+        query["events"] = {"$ne": event_id}
+        update["$push"] = {"events": event_id}
+    try:
+        await db.activity_rollups.update_one(query, update, upsert=True)
+    except DuplicateKeyError:
+        # O documento já existe: ou outra escrita o criou agora, ou já contou este evento
+        await db.activity_rollups.update_one(query, update)
+
+
+async def record_access(user: dict, accessed_at: timestamps.Timestamp):
+    """Conta um acesso (login) do usuário; `user` precisa de id, role e supervisor_id"""
+    await _incr(user, accessed_at, ACCESSES)
+
+
+async def record_completion(user_id: str, completed_at: timestamps.Timestamp, event_id: Optional[str] = None):
+    """Conta um capítulo concluído pelo usuário (uma vez por event_id, se informado)"""
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "id": 1, "role": 1, "supervisor_id": 1})
+    if user:
+        await _incr(user, completed_at, COMPLETIONS, event_id)
+
+
+async def update_owner(user_id: str, supervisor_id: Optional[str], role: str):
+    """Reflete a troca de supervisor/perfil do usuário nos agregados já gravados"""
+    await db.activity_rollups.update_many(
+        {"user_id": user_id},
+        {"$set": {"supervisor_id": supervisor_id, "role": role}}
+    )
+
+
+# ==================== CONSULTAS ====================
+
+def _scope(current_user: dict, start_day: str) -> dict:
+    """Licenciados visíveis para o usuário (admin vê todos) a partir de start_day"""
+    query = {"role": "licenciado", "day": {"$gte": start_day}}
+    if current_user.get("role") != "admin":
+        query["supervisor_id"] = current_user["sub"]
+    return query
+
+
+def _start_day(days: int) -> str:
+    return (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+async def get_heatmap(current_user: dict, days: int) -> List[dict]:
+    """Acessos por dia da semana x hora nos últimos `days` dias"""
+    counts = {
+        (row["_id"]["weekday"], row["_id"]["hour"]): row["count"]
+        async for row in db.activity_rollups.aggregate([
+            {"$match": {**_scope(current_user, _start_day(days)), ACCESSES: {"$gt": 0}}},
+            {"$group": {"_id": {"weekday": "$weekday", "hour": "$hour"}, "count": {"$sum": f"${ACCESSES}"}}}
+        ])
+    }
+    return [
+        {"day": day, "day_name": WEEKDAY_NAMES[day], "hour": hour, "count": counts.get((day, hour), 0)}
+        for day in range(7)
+        for hour in range(24)
+    ]
+
+
+async def get_daily_activity(current_user: dict, days: int) -> List[dict]:
+    """Usuários ativos e capítulos concluídos por dia (ordem cronológica, dias sem atividade com zero)"""
+    start_day = _start_day(days - 1)
+    rows = await db.activity_rollups.aggregate([
+        {"$match": _scope(current_user, start_day)},
+        {"$group": {
+            "_id": {"day": "$day", "user_id": "$user_id"},
+            "accesses": {"$sum": {"$ifNull": [f"${ACCESSES}", 0]}},
+            "completions": {"$sum": {"$ifNull": [f"${COMPLETIONS}", 0]}}
+        }},
+        {"$group": {
+            "_id": "$_id.day",
+            "active_users": {"$sum": {"$cond": [{"$gt": ["$accesses", 0]}, 1, 0]}},
+            "chapters_completed": {"$sum": "$completions"}
+        }}
+    ]).to_list(None)
+    by_day = {row["_id"]: row for row in rows}
+
+    result = []
+    for i in range(days - 1, -1, -1):
+        day = (datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d")
+        row = by_day.get(day, {})
+        result.append({
+            "date": day,
+            "active_users": row.get("active_users", 0),
+            "chapters_completed": row.get("chapters_completed", 0)
+        })
+    return result
+
+
+# ==================== RECÁLCULO ====================
+
+async def _count_buckets(cursor, timestamp_field: str, field: str, totals: dict):
+    """Soma os eventos de um cursor de origem por usuário x dia x hora"""
+    async for row in cursor:
+        bucket = _bucket(row.get(timestamp_field))
+        if bucket is None:
+            continue
+        counts = totals.setdefault((row["user_id"], bucket["day"], bucket["hour"]), {"weekday": bucket["weekday"]})
+        counts[field] = counts.get(field, 0) + 1
+
+
+async def rebuild() -> dict:
+    """Recalcula os agregados a partir dos acessos e do progresso gravados"""
+    totals = {}
+    await _count_buckets(
+        db.user_accesses.find({}, {"_id": 0, "user_id": 1, "accessed_at": 1}),
+        "accessed_at", ACCESSES, totals
+    )
+    await _count_buckets(
+        db.user_progress.find({"completed": True}, {"_id": 0, "user_id": 1, "completed_at": 1}),
+        "completed_at", COMPLETIONS, totals
+    )
+
+    user_ids = list({user_id for user_id, _, _ in totals})
+    owners = {
+        user["id"]: user
+        async for user in db.users.find({"id": {"$in": user_ids}}, {"_id": 0, "id": 1, "role": 1, "supervisor_id": 1})
+    }
+
+    operations = []
+    for (user_id, day, hour), counts in totals.items():
+        owner = owners.get(user_id, {})
+        operations.append(UpdateOne(
+            {"user_id": user_id, "day": day, "hour": hour},
+            {"$set": {
+                ACCESSES: counts.get(ACCESSES, 0),
+                COMPLETIONS: counts.get(COMPLETIONS, 0),
+                "weekday": counts["weekday"],
+                "supervisor_id": owner.get("supervisor_id"),
+                "role": owner.get("role"),
+            }},
+            upsert=True
+        ))
+
+    for i in range(0, len(operations), 1000):
+        await db.activity_rollups.bulk_write(operations[i:i + 1000], ordered=False)
+    return {"buckets": len(operations), "users": len(user_ids)}
+
+
+@scheduler.every(int(os.environ.get('ACTIVITY_ROLLUP_BACKFILL_INTERVAL_SECONDS', 24 * 3600)),
+                 name="activity_rollups.backfill", run_at_start=True)
+async def backfill_if_empty():
+    """Carga inicial: preenche os agregados na primeira subida com a coleção vazia"""
+    if await db.activity_rollups.find_one({}, {"_id": 1}):
+        return {"skipped": True}
+    result = await rebuild()
+    logger.info("Agregados de atividade preenchidos: %s", result)
+    return result
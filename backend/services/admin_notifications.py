@@ -0,0 +1,146 @@
+"""
+Distribuição das notificações de administradores (fan-out) com resumo opcional
+Executada pelo event bus (evento admin_notification), fora da requisição:
+- sem resumo: um insert_many com uma notificação por admin;
+- com resumo (digest): se o admin ainda tem não lida a notificação do mesmo digest_key
+  dentro da janela, ela é atualizada ("12 licenciados concluíram o módulo X") em vez de
+  criar outra; só os demais recebem uma nova.
+
+Os ids das notificações são derivados do evento, então uma nova tentativa do handler
+não duplica notificações nem reaplica o mesmo evento a um resumo.
+
+Variáveis de ambiente:
+- ADMIN_DIGEST_WINDOW_SECONDS (padrão 3600)
+"""
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from database import db
+from models import Notification
+from services import notification_push, unread_counters
+
+COUNT_PLACEHOLDER = "{count}"
+# Eventos lembrados por resumo, para ignorar reentregas do mesmo evento
+DIGEST_EVENTS_KEPT = 50
+
+
+def digest_window() -> timedelta:
+    return timedelta(seconds=int(os.environ.get('ADMIN_DIGEST_WINDOW_SECONDS', 3600)))
+
+
+def _notification_id(event_key: str, admin_id: str) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"admin_notification:{event_key}:{admin_id}"))
+
+
+def _render(template: str) -> list:
+    """Template com {count} como expressão $concat sobre digest_count"""
+    before, found, after = template.partition(COUNT_PLACEHOLDER)
+    if not found:
+        return [template]
+    return [before, {"$toString": "$digest_count"}, after]
+
+
+async def _admin_ids() -> List[str]:
+    admins = await db.users.find({"role": "admin"}, {"_id": 0, "id": 1}).to_list(None)
+    return [admin["id"] for admin in admins]
+
+
+async def _update_digests(admin_ids: List[str], event_key: str, digest: dict, now: datetime) -> List[str]:
+    """Soma o evento aos resumos abertos; retorna os admins atendidos por um resumo"""
+    query = {
+        "user_id": {"$in": admin_ids},
+        "digest_key": digest["key"],
+        "read": False,
+        "digest_until": {"$gt": now.isoformat()},
+    }
+    open_digests = await db.notifications.find(
+        query, {"_id": 0, "id": 1, "user_id": 1, "digest_events": 1}
+    ).to_list(None)
+    if not open_digests:
+        return []
+
+    pending = [n["id"] for n in open_digests if event_key not in (n.get("digest_events") or [])]
+    if pending:
+        await db.notifications.update_many(
+            {"id": {"$in": pending}},
+            [
+                {"$set": {"digest_count": {"$add": [{"$ifNull": ["$digest_count", 1]}, 1]}}},
+                {"$set": {
+                    "title": {"$concat": _render(digest["title"])},
+                    "message": {"$concat": _render(digest["message"])},
+                    "updated_at": now.isoformat(),
+                    "digest_events": {"$slice": [
+                        {"$concatArrays": [{"$ifNull": ["$digest_events", []]}, [event_key]]},
+                        -DIGEST_EVENTS_KEPT
+                    ]}
+                }}
+            ]
+        )
+        updated = await db.notifications.find({"id": {"$in": pending}}, {"_id": 0}).to_list(None)
+        for notification in updated:
+            # Resumo já estava não lido: o contador não muda
+            await notification_push.push(notification, None, unread_delta=0)
+
+    return [n["user_id"] for n in open_digests]
+
+
+async def fan_out(event_key: str, title: str, message: str, notification_type: str,
+                  related_id: Optional[str] = None, digest: Optional[dict] = None) -> int:
+    """Entrega a notificação a todos os admins; retorna quantas notificações novas foram criadas"""
+    admin_ids = await _admin_ids()
+    if not admin_ids:
+        return 0
+
+    now = datetime.now()
+    covered = await _update_digests(admin_ids, event_key, digest, now) if digest else []
+
+    notifications = []
+    for admin_id in admin_ids:
+        if admin_id in covered:
+            continue
+        notification = Notification(
+            id=_notification_id(event_key, admin_id),
+            user_id=admin_id,
+            title=title,
+            message=message,
+            type=notification_type,
+            related_id=related_id,
+            created_at=now.isoformat()
+        ).model_dump()
+        if digest:
+            notification.update({
+                "digest_key": digest["key"],
+                "digest_count": 1,
+                "digest_until": (now + digest_window()).isoformat(),
+                "digest_events": [event_key],
+            })
+        notifications.append(notification)
+
+    if not notifications:
+        return 0
+
+    # Reentrega do evento: só insere o que ainda não existe
+    existing = {
+        n["id"] for n in await db.notifications.find(
+            {"id": {"$in": [n["id"] for n in notifications]}}, {"_id": 0, "id": 1}
+        ).to_list(None)
+    }
+    notifications = [n for n in notifications if n["id"] not in existing]
+    if not notifications:
+        return 0
+
+    await db.notifications.insert_many(notifications, ordered=False)
+    for notification in notifications:
+        notification.pop("_id", None)
+
+    recipients = [n["user_id"] for n in notifications]
+    await unread_counters.incr_many(recipients, unread_counters.NOTIFICATIONS)
+    counts = await unread_counters.get_many(recipients)
+    for notification in notifications:
+        await notification_push.push(
+            notification, counts.get(notification["user_id"], {}).get(unread_counters.NOTIFICATIONS)
+        )
+
+    return len(notifications)
@@ -0,0 +1,327 @@
+"""
+Relatórios de analytics para supervisores calculados no servidor
+Cada relatório é resolvido com uma ou duas agregações ($lookup/$group/$facet),
+independente do número de licenciados ou módulos.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from database import db
+
+
+def licensee_match(current_user: dict) -> dict:
+    """Filtro dos licenciados visíveis para o usuário (admin vê todos)"""
+    if current_user.get("role") == "admin":
+        return {"role": "licenciado"}
+    return {"supervisor_id": current_user["sub"], "role": "licenciado"}
+
+
+async def get_module_catalog() -> List[dict]:
+    """Módulos (ordenados) com total de capítulos e avaliação - 1 round-trip"""
+    pipeline = [
+        {"$sort": {"order": 1}},
+        {"$lookup": {
+            "from": "chapters",
+            "localField": "id",
+            "foreignField": "module_id",
+            "pipeline": [{"$count": "n"}],
+            "as": "chapter_count"
+        }},
+        {"$lookup": {
+            "from": "assessments",
+            "localField": "id",
+            "foreignField": "module_id",
+            "pipeline": [{"$limit": 1}, {"$project": {"_id": 0, "id": 1}}],
+            "as": "assessment"
+        }},
+        {"$project": {
+            "_id": 0,
+            "id": 1,
+            "title": 1,
+            "order": 1,
+            "has_certificate": 1,
+            "has_assessment": 1,
+            "total_chapters": {"$ifNull": [{"$first": "$chapter_count.n"}, 0]},
+            "assessment_id": {"$first": "$assessment.id"}
+        }}
+    ]
+    return await db.modules.aggregate(pipeline).to_list(None)
+
+
+async def get_overview(current_user: dict) -> dict:
+    """Visão geral do supervisor - 2 round-trips"""
+    seven_days_ago = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
+
+    pipeline = [
+        {"$match": licensee_match(current_user)},
+        {"$project": {"_id": 0, "id": 1}},
+        {"$facet": {
+            "licensees": [{"$count": "n"}],
+            "progress": [
+                {"$lookup": {
+                    "from": "user_progress",
+                    "localField": "id",
+                    "foreignField": "user_id",
+                    "pipeline": [{"$match": {"completed": True}}, {"$count": "n"}],
+                    "as": "p"
+                }},
+                {"$project": {"n": {"$ifNull": [{"$first": "$p.n"}, 0]}}},
+                {"$group": {
+                    "_id": None,
+                    "total_completions": {"$sum": "$n"},
+                    "active_licensees": {"$sum": {"$cond": [{"$gt": ["$n", 0]}, 1, 0]}}
+                }}
+            ],
+            "assessments": [
+                {"$lookup": {
+                    "from": "user_assessments",
+                    "localField": "id",
+                    "foreignField": "user_id",
+                    "pipeline": [{"$project": {"_id": 0, "passed": 1, "score": 1}}],
+                    "as": "a"
+                }},
+                {"$unwind": "$a"},
+                {"$group": {
+                    "_id": None,
+                    "total": {"$sum": 1},
+                    "passed": {"$sum": {"$cond": ["$a.passed", 1, 0]}},
+                    "score_sum": {"$sum": {"$ifNull": ["$a.score", 0]}}
+                }}
+            ],
+            "certificates": [
+                {"$lookup": {
+                    "from": "certificates",
+                    "localField": "id",
+                    "foreignField": "user_id",
+                    "pipeline": [{"$count": "n"}],
+                    "as": "c"
+                }},
+                {"$group": {"_id": None, "n": {"$sum": {"$ifNull": [{"$first": "$c.n"}, 0]}}}}
+            ],
+            "recent_accesses": [
+                {"$lookup": {
+                    "from": "user_access",
+                    "localField": "id",
+                    "foreignField": "user_id",
+                    "pipeline": [{"$match": {"date": {"$gte": seven_days_ago}}}, {"$count": "n"}],
+                    "as": "r"
+                }},
+                {"$group": {"_id": None, "n": {"$sum": {"$ifNull": [{"$first": "$r.n"}, 0]}}}}
+            ]
+        }}
+    ]
+
+    facets = (await db.users.aggregate(pipeline).to_list(1))[0]
+    total_modules = await db.modules.count_documents({})
+
+    def first(name: str) -> dict:
+        return facets[name][0] if facets[name] else {}
+
+    progress = first("progress")
+    assessments = first("assessments")
+    total_assessments = assessments.get("total", 0)
+
+    return {
+        "total_licensees": first("licensees").get("n", 0),
+        "active_licensees": progress.get("active_licensees", 0),
+        "total_modules": total_modules,
+        "total_completions": progress.get("total_completions", 0),
+        "certificates_issued": first("certificates").get("n", 0),
+        "assessments": {
+            "total": total_assessments,
+            "passed": assessments.get("passed", 0),
+            "average_score": round(assessments.get("score_sum", 0) / max(total_assessments, 1), 1)
+        },
+        "recent_accesses_7d": first("recent_accesses").get("n", 0)
+    }
+
+
+async def get_licensees_progress(current_user: dict) -> List[dict]:
+    """Progresso detalhado de cada licenciado - 2 round-trips"""
+    catalog = await get_module_catalog()
+    chapters_per_module: Dict[str, int] = {m["id"]: m["total_chapters"] for m in catalog}
+
+    pipeline = [
+        {"$match": licensee_match(current_user)},
+        {"$lookup": {
+            "from": "user_progress",
+            "localField": "id",
+            "foreignField": "user_id",
+            "pipeline": [
+                {"$match": {"completed": True}},
+                {"$group": {"_id": "$module_id", "count": {"$sum": 1}}}
+            ],
+            "as": "module_progress"
+        }},
+        {"$lookup": {
+            "from": "user_access",
+            "localField": "id",
+            "foreignField": "user_id",
+            "pipeline": [
+                {"$sort": {"accessed_at": -1}},
+                {"$limit": 1},
+                {"$project": {"_id": 0, "accessed_at": 1}}
+            ],
+            "as": "last_access"
+        }},
+        {"$lookup": {
+            "from": "user_streaks",
+            "localField": "id",
+            "foreignField": "user_id",
+            "pipeline": [{"$limit": 1}, {"$project": {"_id": 0, "current_streak": 1}}],
+            "as": "streak"
+        }},
+        {"$lookup": {
+            "from": "certificates",
+            "localField": "id",
+            "foreignField": "user_id",
+            "pipeline": [{"$count": "n"}],
+            "as": "certs"
+        }},
+        {"$project": {
+            "_id": 0,
+            "id": 1,
+            "full_name": {"$ifNull": ["$full_name", ""]},
+            "email": {"$ifNull": ["$email", ""]},
+            "points": {"$ifNull": ["$points", 0]},
+            "level_title": {"$ifNull": ["$level_title", "Iniciante"]},
+            "module_progress": 1,
+            "certificates": {"$ifNull": [{"$first": "$certs.n"}, 0]},
+            "current_streak": {"$ifNull": [{"$first": "$streak.current_streak"}, 0]},
+            "last_access": {"$ifNull": [{"$first": "$last_access.accessed_at"}, None]},
+            "profile_picture": {"$ifNull": ["$profile_picture", None]}
+        }},
+        {"$sort": {"points": -1}}
+    ]
+
+    result = []
+    async for row in db.users.aggregate(pipeline):
+        module_progress = row.pop("module_progress")
+        completed_modules = sum(
+            1 for mp in module_progress
+            if chapters_per_module.get(mp["_id"], 0) > 0 and mp["count"] >= chapters_per_module[mp["_id"]]
+        )
+        result.append({
+            "id": row["id"],
+            "full_name": row["full_name"],
+            "email": row["email"],
+            "points": row["points"],
+            "level_title": row["level_title"],
+            "completed_modules": completed_modules,
+            "total_modules": len(catalog),
+            "completed_chapters": sum(mp["count"] for mp in module_progress),
+            "certificates": row["certificates"],
+            "current_streak": row["current_streak"],
+            "last_access": row["last_access"],
+            "profile_picture": row["profile_picture"]
+        })
+
+    return result
+
+
+async def get_module_engagement(current_user: dict) -> List[dict]:
+    """Engajamento por módulo - 2 round-trips"""
+    catalog = await get_module_catalog()
+
+    pipeline = [
+        {"$match": licensee_match(current_user)},
+        {"$project": {"_id": 0, "id": 1}},
+        {"$facet": {
+            "licensees": [{"$count": "n"}],
+            # Quantos licenciados têm exatamente N capítulos completos em cada módulo
+            "progress": [
+                {"$lookup": {
+                    "from": "user_progress",
+                    "localField": "id",
+                    "foreignField": "user_id",
+                    "pipeline": [
+                        {"$match": {"completed": True}},
+                        {"$group": {"_id": "$module_id", "n": {"$sum": 1}}}
+                    ],
+                    "as": "p"
+                }},
+                {"$unwind": "$p"},
+                {"$group": {"_id": {"module_id": "$p._id", "n": "$p.n"}, "users": {"$sum": 1}}}
+            ],
+            "assessments": [
+                {"$lookup": {
+                    "from": "user_assessments",
+                    "localField": "id",
+                    "foreignField": "user_id",
+                    "pipeline": [{"$project": {"_id": 0, "assessment_id": 1, "passed": 1, "score": 1}}],
+                    "as": "a"
+                }},
+                {"$unwind": "$a"},
+                {"$group": {
+                    "_id": "$a.assessment_id",
+                    "total": {"$sum": 1},
+                    "passed": {"$sum": {"$cond": ["$a.passed", 1, 0]}},
+                    "score_sum": {"$sum": {"$ifNull": ["$a.score", 0]}}
+                }}
+            ],
+            "certificates": [
+                {"$lookup": {
+                    "from": "certificates",
+                    "localField": "id",
+                    "foreignField": "user_id",
+                    "pipeline": [{"$project": {"_id": 0, "module_id": 1}}],
+                    "as": "c"
+                }},
+                {"$unwind": "$c"},
+                {"$group": {"_id": "$c.module_id", "n": {"$sum": 1}}}
+            ]
+        }}
+    ]
+
+    facets = (await db.users.aggregate(pipeline).to_list(1))[0]
+    total_licensees = facets["licensees"][0]["n"] if facets["licensees"] else 0
+
+    if total_licensees == 0:
+        return []
+
+    started: Dict[str, int] = {}
+    completion_buckets: Dict[str, List[tuple]] = {}
+    for bucket in facets["progress"]:
+        module_id = bucket["_id"].get("module_id")
+        started[module_id] = started.get(module_id, 0) + bucket["users"]
+        completion_buckets.setdefault(module_id, []).append((bucket["_id"]["n"], bucket["users"]))
+
+    assessments_by_id = {a["_id"]: a for a in facets["assessments"]}
+    certificates_by_module = {c["_id"]: c["n"] for c in facets["certificates"]}
+
+    result = []
+    for module in catalog:
+        module_id = module["id"]
+        total_chapters = module["total_chapters"]
+
+        if total_chapters == 0:
+            continue
+
+        users_started = started.get(module_id, 0)
+        users_completed = sum(
+            users for n, users in completion_buckets.get(module_id, []) if n >= total_chapters
+        )
+
+        assessment_stats = {"total": 0, "passed": 0, "avg_score": 0}
+        assessment = assessments_by_id.get(module.get("assessment_id")) if module.get("assessment_id") else None
+        if assessment:
+            assessment_stats["total"] = assessment["total"]
+            assessment_stats["passed"] = assessment["passed"]
+            assessment_stats["avg_score"] = round(assessment["score_sum"] / assessment["total"], 1)
+
+        result.append({
+            "id": module_id,
+            "title": module.get("title", ""),
+            "order": module.get("order", 0),
+            "total_chapters": total_chapters,
+            "users_started": users_started,
+            "users_completed": users_completed,
+            "completion_rate": round((users_completed / total_licensees) * 100, 1),
+            "start_rate": round((users_started / total_licensees) * 100, 1),
+            "assessment": assessment_stats,
+            "certificates_issued": certificates_by_module.get(module_id, 0),
+            "has_certificate": module.get("has_certificate", False),
+            "has_assessment": module.get("has_assessment", False)
+        })
+
+    return result
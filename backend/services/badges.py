@@ -0,0 +1,314 @@
+"""
+Regras de badges automáticos avaliadas por evento
+Cada criteria_type é uma regra com o sinal que a afeta (módulos, capítulos, pontos,
+streak, avaliações, certificados) e a métrica do usuário que compara com criteria_value.
+Um evento avalia só os badges ativos ligados ao seu sinal que o usuário ainda não tem:
+- catálogo de badges por sinal em memória (relido a cada BADGES_REFRESH_SECONDS e na hora
+  no processo que editou os badges)
+- conjunto de badges já conquistados por usuário em cache (LRU), atualizado ao conceder
+- cada métrica é consultada no máximo uma vez por avaliação, e só se houver badge pendente
+
+reevaluate() concede em lote, com uma consulta por badge, a todos que já atendem ao
+critério (badges novos ou alterados): tarefa agendada, POST /gamification/badges/reevaluate
+e o script reevaluate_badges.py.
+
+Variáveis de ambiente:
+- BADGES_REFRESH_SECONDS (padrão 60)
+- BADGES_REEVALUATE_INTERVAL_SECONDS (padrão 86400)
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from database import db
+from models import UserBadge
+from services import event_bus, module_progress, points, scheduler
+
+logger = logging.getLogger(__name__)
+
+REFRESH_SECONDS = int(os.environ.get('BADGES_REFRESH_SECONDS', 60))
+EARNED_CACHE_SIZE = 5000
+REEVALUATE_JOB = "badges.reevaluate"
+
+# Sinais que disparam a avaliação
+MODULES = "modules"
+CHAPTERS = "chapters"
+POINTS = "points"
+STREAK = "streak"
+ASSESSMENTS = "assessments"
+CERTIFICATES = "certificates"
+
+
+# ==================== MÉTRICAS ====================
+
+class Metrics:
+    """Métricas de um usuário, consultadas sob demanda e uma vez por avaliação"""
+
+    def __init__(self, user_id: str, known: Optional[dict] = None):
+        self.user_id = user_id
+        self._values = dict(known or {})
+
+    async def get(self, name: str) -> int:
+        if name not in self._values:
+            self._values[name] = await METRICS[name](self.user_id)
+        return self._values[name]
+
+
+async def _modules_completed(user_id: str) -> int:
+    return await module_progress.count_completed_modules(user_id)
+
+
+async def _all_modules(user_id: str) -> int:
+    """1 se concluiu todos os módulos"""
+    module_ids = await _module_ids_with_chapters()
+    if not module_ids:
+        return 0
+    user_modules = await module_progress.get_user_modules(user_id, module_ids)
+    return int(all(user_modules.get(mid, {}).get("completed") for mid in module_ids))
+
+
+async def _module_ids_with_chapters() -> List[str]:
+    """Ids de todos os módulos, ou [] se não há módulos ou algum está sem capítulos"""
+    module_ids = [m["id"] async for m in db.modules.find({}, {"_id": 0, "id": 1})]
+    if not module_ids:
+        return []
+    counts = await module_progress.chapter_counts(module_ids)
+    if not all(counts.get(mid, 0) > 0 for mid in module_ids):
+        return []
+    return module_ids
+
+
+async def _points(user_id: str) -> int:
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "points": 1})
+    return (user or {}).get("points") or 0
+
+
+async def _longest_streak(user_id: str) -> int:
+    streak = await db.user_streaks.find_one({"user_id": user_id}, {"_id": 0, "longest_streak": 1})
+    return (streak or {}).get("longest_streak", 0)
+
+
+async def _chapters_completed(user_id: str) -> int:
+    return await db.user_progress.count_documents({"user_id": user_id, "completed": True})
+
+
+async def _assessments_passed(user_id: str) -> int:
+    return len(await db.user_assessments.distinct("assessment_id", {"user_id": user_id, "passed": True}))
+
+
+async def _certificates(user_id: str) -> int:
+    return await db.certificates.count_documents({"user_id": user_id})
+
+
+METRICS: Dict[str, Callable[[str], Awaitable[int]]] = {
+    "modules_completed": _modules_completed,
+    "all_modules": _all_modules,
+    "points": _points,
+    "longest_streak": _longest_streak,
+    "chapters_completed": _chapters_completed,
+    "assessments_passed": _assessments_passed,
+    "certificates": _certificates,
+}
+
+
+# ==================== REGRAS ====================
+
+class Rule:
+    """criteria_type -> sinal que a afeta, métrica e valor mínimo"""
+
+    def __init__(self, signal: str, metric: str, fixed_value: Optional[int] = None):
+        self.signal = signal
+        self.metric = metric
+        self.fixed_value = fixed_value
+
+    def threshold(self, badge: dict) -> int:
+        if self.fixed_value is not None:
+            return self.fixed_value
+        return badge.get("criteria_value", 0)
+
+    async def satisfied(self, badge: dict, metrics: Metrics) -> bool:
+        return await metrics.get(self.metric) >= self.threshold(badge)
+
+
+RULES: Dict[str, Rule] = {
+    "modules_completed": Rule(MODULES, "modules_completed"),
+    "first_module": Rule(MODULES, "modules_completed", fixed_value=1),
+    "all_modules": Rule(MODULES, "all_modules", fixed_value=1),
+    "points_reached": Rule(POINTS, "points"),
+    "days_streak": Rule(STREAK, "longest_streak"),
+    "chapters_completed": Rule(CHAPTERS, "chapters_completed"),
+    "assessments_passed": Rule(ASSESSMENTS, "assessments_passed"),
+    "certificates_earned": Rule(CERTIFICATES, "certificates"),
+}
+
+
+class BadgeCatalog:
+    """Badges ativos com regra automática, agrupados por sinal"""
+
+    def __init__(self):
+        self.by_signal: Dict[str, List[dict]] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    async def load(self):
+        by_signal: Dict[str, List[dict]] = {}
+        async for badge in db.badges.find({"active": True, "criteria_type": {"$in": list(RULES)}}, {"_id": 0}):
+            by_signal.setdefault(RULES[badge["criteria_type"]].signal, []).append(badge)
+        self.by_signal = by_signal
+        self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    async def for_signals(self, signals: Iterable[str]) -> List[dict]:
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > REFRESH_SECONDS:
+            async with self._lock:
+                if self._loaded_at is None or time.monotonic() - self._loaded_at > REFRESH_SECONDS:
+                    await self.load()
+        return [badge for signal in set(signals) for badge in self.by_signal.get(signal, [])]
+
+
+class EarnedCache:
+    """Ids dos badges conquistados por usuário (LRU)"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._items: "OrderedDict[str, Set[str]]" = OrderedDict()
+
+    async def get(self, user_id: str) -> Set[str]:
+        if user_id in self._items:
+            self._items.move_to_end(user_id)
+            return self._items[user_id]
+        earned = set(await db.user_badges.distinct("badge_id", {"user_id": user_id}))
+        self._items[user_id] = earned
+        if len(self._items) > self.size:
+            self._items.popitem(last=False)
+        return earned
+
+    def add(self, user_id: str, badge_id: str):
+        if user_id in self._items:
+            self._items[user_id].add(badge_id)
+
+    def clear(self):
+        self._items.clear()
+
+
+catalog = BadgeCatalog()
+earned_cache = EarnedCache(EARNED_CACHE_SIZE)
+
+
+# ==================== CONCESSÃO ====================
+
+async def grant(user_id: str, badge: dict) -> bool:
+    """Concede o badge (se o usuário ainda não o tem), os pontos e a notificação"""
+    user_badge = UserBadge(user_id=user_id, badge_id=badge["id"])
+    result = await db.user_badges.update_one(
+        {"user_id": user_id, "badge_id": badge["id"]},
+        {"$setOnInsert": user_badge.model_dump()},
+        upsert=True
+    )
+    earned_cache.add(user_id, badge["id"])
+    if result.upserted_id is None:
+        return False
+
+    if badge.get("points_reward", 0) > 0:
+        await points.award(user_id, badge["points_reward"], points.BADGE, key=f"badge:{badge['id']}", ref=badge["id"])
+    await event_bus.publish(
+        event_bus.BADGE_EARNED,
+        {"user_id": user_id, "badge_id": badge["id"]},
+        key=f"badge_earned:{user_id}:{badge['id']}"
+    )
+    return True
+
+
+async def evaluate(user_id: str, signals: Iterable[str], known: Optional[dict] = None) -> List[str]:
+    """
+    Avalia os badges ligados aos sinais e concede os atingidos; retorna os ids concedidos.
+    `known` antecipa métricas já conhecidas pelo chamador (ex.: {"longest_streak": 5}).
+    """
+    badges = await catalog.for_signals(signals)
+    if not badges:
+        return []
+    earned = await earned_cache.get(user_id)
+    metrics = Metrics(user_id, known)
+    granted = []
+    for badge in badges:
+        if badge["id"] in earned:
+            continue
+        if await RULES[badge["criteria_type"]].satisfied(badge, metrics) and await grant(user_id, badge):
+            granted.append(badge["id"])
+    return granted
+
+
+def on_badges_changed():
+    """Após criar/editar/excluir badges: relê o catálogo e descarta o cache deste processo"""
+    catalog.invalidate()
+    earned_cache.clear()
+
+
+# ==================== REAVALIAÇÃO EM LOTE ====================
+
+async def _count_at_least(collection: str, match: dict, threshold: int, distinct: Optional[str] = None) -> List[str]:
+    """user_ids com pelo menos `threshold` documentos de `match` (distintos por `distinct`)"""
+    pipeline = [{"$match": match}]
+    if distinct:
+        pipeline.append({"$group": {"_id": {"user_id": "$user_id", "value": f"${distinct}"}}})
+        pipeline.append({"$group": {"_id": "$_id.user_id", "n": {"$sum": 1}}})
+    else:
+        pipeline.append({"$group": {"_id": "$user_id", "n": {"$sum": 1}}})
+    pipeline.append({"$match": {"n": {"$gte": max(threshold, 1)}}})
+    return [row["_id"] async for row in db[collection].aggregate(pipeline, allowDiskUse=True)]
+
+
+async def _all_modules_candidates(_: int) -> List[str]:
+    module_ids = await _module_ids_with_chapters()
+    if not module_ids:
+        return []
+    return await _count_at_least(
+        "user_module_progress", {"module_id": {"$in": module_ids}, "completed": True}, len(module_ids)
+    )
+
+
+async def _field_at_least(collection: str, field: str, key: str, threshold: int) -> List[str]:
+    return [doc[key] async for doc in db[collection].find({field: {"$gte": threshold}}, {"_id": 0, key: 1})]
+
+
+CANDIDATES: Dict[str, Callable[[int], Awaitable[List[str]]]] = {
+    "modules_completed": lambda v: _count_at_least("user_module_progress", {"completed": True}, v),
+    "all_modules": _all_modules_candidates,
+    "points": lambda v: _field_at_least("users", "points", "id", v),
+    "longest_streak": lambda v: _field_at_least("user_streaks", "longest_streak", "user_id", v),
+    "chapters_completed": lambda v: _count_at_least("user_progress", {"completed": True}, v),
+    "assessments_passed": lambda v: _count_at_least("user_assessments", {"passed": True}, v, distinct="assessment_id"),
+    "certificates": lambda v: _count_at_least("certificates", {}, v),
+}
+
+
+async def reevaluate(badge_ids: Optional[List[str]] = None) -> dict:
+    """Concede os badges automáticos (todos ou os informados) a quem já atende ao critério"""
+    query = {"active": True, "criteria_type": {"$in": list(RULES)}}
+    if badge_ids:
+        query["id"] = {"$in": badge_ids}
+
+    result = {}
+    async for badge in db.badges.find(query, {"_id": 0}):
+        rule = RULES[badge["criteria_type"]]
+        candidates = set(await CANDIDATES[rule.metric](rule.threshold(badge)))
+        candidates -= set(await db.user_badges.distinct("user_id", {"badge_id": badge["id"]}))
+        granted = 0
+        for user_id in candidates:
+            granted += await grant(user_id, badge)
+        result[badge["id"]] = {"name": badge.get("name"), "candidates": len(candidates), "granted": granted}
+    return result
+
+
+@scheduler.every(int(os.environ.get('BADGES_REEVALUATE_INTERVAL_SECONDS', 24 * 3600)), name=REEVALUATE_JOB)
+async def scheduled_reevaluate():
+    result = await reevaluate()
+    granted = sum(item["granted"] for item in result.values())
+    if granted:
+        logger.info("Badges concedidos na reavaliação: %s", granted)
+    return {"badges": len(result), "granted": granted}
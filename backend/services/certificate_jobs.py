@@ -0,0 +1,282 @@
+"""
+Emissão de certificados em lote para uma turma (coleção certificate_jobs)
+Elegibilidade calculada com uma única agregação sobre users, renderização em paralelo
+no pool de processos do certificate_renderer e gravação com insert_many por bloco.
+O progresso fica no próprio documento do job (total, issued, failed, errors).
+
+Como a elegibilidade exclui quem já tem certificado, reexecutar um job é seguro:
+jobs interrompidos por reinício são retomados pela tarefa agendada resume_stale_jobs
+(qualquer processo) assim que deixam de receber heartbeat_at (STALE_AFTER_SECONDS);
+o lifespan (resume_jobs) relança na subida os pendentes e os já abandonados.
+Quem assume o job grava um `owner` e renova heartbeat_at em segundo plano
+(HEARTBEAT_SECONDS); antes de gravar cada bloco confere que ainda é o dono, então um
+job reassumido por outro processo não emite certificados em dobro.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Set
+
+from pymongo import ReturnDocument
+
+from database import db
+from models import Certificate, CertificateJob
+from services import badges, certificate_renderer, scheduler
+
+logger = logging.getLogger(__name__)
+
+GENERATED_DIR = Path("/app/uploads/certificates/generated")
+
+# Certificados renderizados/gravados por bloco
+CHUNK_SIZE = 200
+MAX_ERRORS_KEPT = 50
+
+# Job "running" sem atualização há mais tempo que isso é considerado abandonado
+STALE_AFTER_SECONDS = 300
+HEARTBEAT_SECONDS = 60
+
+ACTIVE_STATUSES = ["pending", "running"]
+
+RESUME_JOB = "certificate_jobs.resume"
+RESUME_INTERVAL_SECONDS = 60
+
+_tasks: Set[asyncio.Task] = set()
+
+
+async def find_eligible(module: dict, supervisor_id: Optional[str] = None,
+                        category_id: Optional[str] = None) -> List[dict]:
+    """
+    Licenciados elegíveis ao certificado do módulo (mesmas regras de check_certificate_eligibility):
+    sem certificado emitido, aprovados na avaliação (se houver) e com todos os capítulos concluídos.
+    """
+    module_id = module["id"]
+    total_chapters = await db.chapters.count_documents({"module_id": module_id})
+    assessment = None
+    if module.get("has_assessment"):
+        assessment = await db.assessments.find_one({"module_id": module_id}, {"_id": 0, "id": 1})
+
+    match = {"role": "licenciado"}
+    if supervisor_id:
+        match["supervisor_id"] = supervisor_id
+    if category_id:
+        match["category_id"] = category_id
+
+    pipeline = [
+        {"$match": match},
+        {"$lookup": {
+            "from": "certificates",
+            "localField": "id",
+            "foreignField": "user_id",
+            "pipeline": [{"$match": {"module_id": module_id}}, {"$limit": 1}, {"$project": {"_id": 1}}],
+            "as": "existing"
+        }},
+        {"$match": {"existing": {"$size": 0}}},
+    ]
+
+    if assessment:
+        pipeline += [
+            {"$lookup": {
+                "from": "user_assessments",
+                "localField": "id",
+                "foreignField": "user_id",
+                "pipeline": [
+                    {"$match": {"assessment_id": assessment["id"], "passed": True}},
+                    {"$limit": 1},
+                    {"$project": {"_id": 1}}
+                ],
+                "as": "passed"
+            }},
+            {"$match": {"passed.0": {"$exists": True}}},
+        ]
+
+    if total_chapters > 0:
+        pipeline += [
+            {"$lookup": {
+                "from": "user_module_progress",
+                "localField": "id",
+                "foreignField": "user_id",
+                "pipeline": [{"$match": {"module_id": module_id, "completed": True}}, {"$project": {"_id": 1}}],
+                "as": "progress"
+            }},
+            {"$match": {"progress.0": {"$exists": True}}},
+        ]
+
+    pipeline.append({"$project": {"_id": 0, "id": 1, "full_name": 1}})
+    return await db.users.aggregate(pipeline).to_list(None)
+
+
+async def create_job(data: dict, created_by: str) -> dict:
+    job = CertificateJob(**data, created_by=created_by)
+    await db.certificate_jobs.insert_one(job.model_dump())
+    launch(job.id)
+    return job.model_dump()
+
+
+async def get_active_job(module_id: str) -> Optional[dict]:
+    return await db.certificate_jobs.find_one(
+        {"module_id": module_id, "status": {"$in": ACTIVE_STATUSES}}, {"_id": 0}
+    )
+
+
+def launch(job_id: str):
+    """Executa o job em segundo plano (referência mantida até o fim)"""
+    task = asyncio.create_task(run_job(job_id))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def resume_jobs() -> int:
+    """Relança jobs que estavam pendentes/em execução quando o processo parou"""
+    jobs = await db.certificate_jobs.find({"status": {"$in": ACTIVE_STATUSES}}, {"_id": 0, "id": 1}).to_list(100)
+    for job in jobs:
+        launch(job["id"])
+    return len(jobs)
+
+
+def _stale_query() -> dict:
+    """Jobs sem processo: pendentes não assumidos ou em execução sem heartbeat recente"""
+    stale = (datetime.now() - timedelta(seconds=STALE_AFTER_SECONDS)).isoformat()
+    return {"$or": [
+        {"status": "pending", "created_at": {"$lt": stale}},
+        {"status": "running", "heartbeat_at": {"$lt": stale}},
+    ]}
+
+
+@scheduler.every(RESUME_INTERVAL_SECONDS, name=RESUME_JOB)
+async def resume_stale_jobs() -> int:
+    """Relança os jobs abandonados (ex.: processo reiniciado antes de STALE_AFTER_SECONDS)"""
+    jobs = await db.certificate_jobs.find(_stale_query(), {"_id": 0, "id": 1}).to_list(100)
+    for job in jobs:
+        launch(job["id"])
+    return len(jobs)
+
+
+class LostOwnership(Exception):
+    """Outro processo reassumiu o job"""
+
+
+async def _finish(job_id: str, owner: str, status: str, error: Optional[str] = None):
+    await db.certificate_jobs.update_one(
+        {"id": job_id, "owner": owner},
+        {"$set": {"status": status, "error": error, "finished_at": datetime.now().isoformat()}}
+    )
+
+
+async def _claim(job_id: str) -> Optional[dict]:
+    """Assume o job se estiver pendente ou se o processo que o executava parou de dar sinal"""
+    now = datetime.now()
+    stale = (now - timedelta(seconds=STALE_AFTER_SECONDS)).isoformat()
+    return await db.certificate_jobs.find_one_and_update(
+        {"id": job_id, "$or": [
+            {"status": "pending"},
+            {"status": "running", "heartbeat_at": {"$lt": stale}},
+        ]},
+        {"$set": {"status": "running", "heartbeat_at": now.isoformat(), "owner": uuid.uuid4().hex}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def _heartbeat(job_id: str, owner: str) -> bool:
+    """Renova heartbeat_at; False se o job deixou de ser deste dono"""
+    result = await db.certificate_jobs.update_one(
+        {"id": job_id, "owner": owner, "status": "running"},
+        {"$set": {"heartbeat_at": datetime.now().isoformat()}}
+    )
+    return result.matched_count == 1
+
+
+async def _keep_alive(job_id: str, owner: str):
+    while await _heartbeat(job_id, owner):
+        await asyncio.sleep(HEARTBEAT_SECONDS)
+
+
+async def run_job(job_id: str):
+    job = await _claim(job_id)
+    if not job:
+        return
+    owner = job["owner"]
+    keep_alive = asyncio.create_task(_keep_alive(job_id, owner))
+
+    try:
+        module = await db.modules.find_one({"id": job["module_id"]}, {"_id": 0})
+        if not module:
+            return await _finish(job_id, owner, "failed", "Módulo não encontrado")
+        if not module.get("has_certificate"):
+            return await _finish(job_id, owner, "failed", "Este módulo não possui certificado")
+
+        config = await db.system_config.find_one({"id": "system_config"}, {"_id": 0}) or {}
+        template_path = config.get("certificate_template_path")
+        if not template_path or not Path(template_path).exists():
+            return await _finish(job_id, owner, "failed", "Template de certificado não configurado")
+
+        eligible = await find_eligible(module, job.get("supervisor_id"), job.get("category_id"))
+        await db.certificate_jobs.update_one(
+            {"id": job_id, "owner": owner},
+            {"$set": {"total": job.get("issued", 0) + len(eligible), "started_at": datetime.now().isoformat()}}
+        )
+
+        completion_date = datetime.now()
+        fields = {
+            "module_name": module["title"],
+            "completion_date": certificate_renderer.format_completion_date(completion_date),
+            "name_y": config.get("certificate_name_y_position", 400),
+            "module_y": config.get("certificate_module_y_position", 360),
+            "date_y": config.get("certificate_date_y_position", 320),
+        }
+
+        for start in range(0, len(eligible), CHUNK_SIZE):
+            chunk = eligible[start:start + CHUNK_SIZE]
+            paths = [
+                str(GENERATED_DIR / f"cert_{user['id'][:8]}_{module['id'][:8]}_{uuid.uuid4().hex[:6]}.pdf")
+                for user in chunk
+            ]
+
+            # O pool limita o paralelismo ao número de workers do renderer
+            results = await asyncio.gather(*[
+                certificate_renderer.render(template_path, path, user_name=user.get("full_name", ""), **fields)
+                for user, path in zip(chunk, paths)
+            ], return_exceptions=True)
+
+            certificates, errors = [], []
+            for user, result in zip(chunk, results):
+                if isinstance(result, Exception):
+                    errors.append({"user_id": user["id"], "error": str(result)})
+                    continue
+                certificates.append(Certificate(
+                    user_id=user["id"],
+                    module_id=module["id"],
+                    user_name=user.get("full_name", ""),
+                    module_title=module["title"],
+                    completion_date=completion_date.isoformat(),
+                    certificate_path=result
+                ).model_dump())
+
+            if not await _heartbeat(job_id, owner):
+                raise LostOwnership()
+            if certificates:
+                await db.certificates.insert_many(certificates, ordered=False)
+                # Badges de certificados (certificates_earned), como na emissão individual
+                for certificate in certificates:
+                    await badges.evaluate(certificate["user_id"], [badges.CERTIFICATES])
+
+            update = {
+                "$inc": {"issued": len(certificates), "failed": len(errors)},
+                "$set": {"heartbeat_at": datetime.now().isoformat()}
+            }
+            if errors:
+                update["$push"] = {"errors": {"$each": errors, "$slice": -MAX_ERRORS_KEPT}}
+            await db.certificate_jobs.update_one({"id": job_id, "owner": owner}, update)
+
+        await _finish(job_id, owner, "completed")
+        logger.info("Job de certificados %s concluído: %s emitidos", job_id, len(eligible))
+
+    except LostOwnership:
+        logger.warning("Job de certificados %s reassumido por outro processo; execução interrompida", job_id)
+    except Exception as e:
+        logger.error("Job de certificados %s falhou: %s", job_id, e)
+        await _finish(job_id, owner, "failed", str(e))
+    finally:
+        keep_alive.cancel()
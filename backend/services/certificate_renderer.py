@@ -0,0 +1,216 @@
+"""
+Renderização de certificados fora do event loop
+O template é preparado uma vez por versão (hash SHA-256 do arquivo): a primeira página
+do PDF é importada como vetor (ou, se o pypdf não conseguir lê-la, rasterizada uma única vez)
+e guardada em memória e em disco (TEMPLATE_CACHE_DIR/<hash>.pdf).
+Cada certificado é só uma camada de texto do ReportLab mesclada com pypdf sobre a página
+em cache, executada em um ProcessPoolExecutor.
+
+Variáveis de ambiente:
+- CERTIFICATE_RENDER_WORKERS (padrão 2)
+"""
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.errors import PdfReadError
+from reportlab.pdfgen import canvas
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_CACHE_DIR = Path("/app/uploads/certificates/template_cache")
+
+# DPI usado apenas no fallback de rasterização
+RASTER_DPI = 150
+
+# Templates preparados neste processo: hash -> (bytes da página, largura, altura)
+_templates: Dict[str, Tuple[bytes, float, float]] = {}
+
+# Hash por (caminho, mtime, tamanho), para não reler o template a cada certificado
+_hashes: Dict[Tuple[str, float, int], str] = {}
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+MESES = {
+    1: "Janeiro", 2: "Fevereiro", 3: "Março", 4: "Abril",
+    5: "Maio", 6: "Junho", 7: "Julho", 8: "Agosto",
+    9: "Setembro", 10: "Outubro", 11: "Novembro", 12: "Dezembro"
+}
+
+
+def format_completion_date(date) -> str:
+    """Data por extenso em português, ex.: 12 de Janeiro de 2026"""
+    return f"{date.day} de {MESES[date.month]} de {date.year}"
+
+
+def template_hash(template_path: str) -> str:
+    """SHA-256 do template, recalculado só quando o arquivo muda"""
+    stat = os.stat(template_path)
+    key = (template_path, stat.st_mtime, stat.st_size)
+    digest = _hashes.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(template_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        _hashes[key] = digest
+    return digest
+
+
+def _import_first_page(template_path: str) -> bytes:
+    """Primeira página do template como PDF de uma página (vetorial), com rotação normalizada"""
+    reader = PdfReader(template_path)
+    if not reader.pages:
+        raise PdfReadError("Template sem páginas")
+
+    writer = PdfWriter()
+    page = writer.add_page(reader.pages[0])
+    page.transfer_rotation_to_content()
+    page.compress_content_streams()
+
+    out = BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def _rasterize_first_page(template_path: str) -> bytes:
+    """Fallback: rasteriza a primeira página (uma vez por versão) e a embute em um PDF"""
+    from pdf2image import convert_from_path
+    from reportlab.lib.utils import ImageReader
+
+    images = convert_from_path(template_path, dpi=RASTER_DPI, first_page=1, last_page=1)
+    if not images:
+        raise Exception("Não foi possível converter o template")
+
+    image = images[0]
+    scale = RASTER_DPI / 72
+    width, height = image.size[0] / scale, image.size[1] / scale
+
+    out = BytesIO()
+    can = canvas.Canvas(out, pagesize=(width, height))
+    can.drawImage(ImageReader(image), 0, 0, width=width, height=height)
+    can.save()
+    return out.getvalue()
+
+
+def _load_template(template_path: str, digest: str) -> Tuple[bytes, float, float]:
+    """Template preparado: memória -> disco -> importação/rasterização"""
+    cached = _templates.get(digest)
+    if cached:
+        return cached
+
+    cache_file = TEMPLATE_CACHE_DIR / f"{digest}.pdf"
+    if cache_file.exists():
+        data = cache_file.read_bytes()
+    else:
+        try:
+            data = _import_first_page(template_path)
+        except (PdfReadError, ValueError, KeyError) as e:
+            logger.warning("Template %s não pôde ser importado como vetor (%s), rasterizando", template_path, e)
+            data = _rasterize_first_page(template_path)
+
+        TEMPLATE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        tmp_file.write_bytes(data)
+        os.replace(tmp_file, cache_file)
+
+    box = PdfReader(BytesIO(data)).pages[0].mediabox
+    cached = (data, float(box.width), float(box.height))
+    _templates[digest] = cached
+    return cached
+
+
+def render_certificate(
+    template_path: str,
+    digest: str,
+    output_path: str,
+    user_name: str,
+    module_name: str,
+    completion_date: str,
+    name_y: int = 350,
+    module_y: int = 310,
+    date_y: int = 270
+) -> str:
+    """Gera o certificado (síncrono; executado nos processos do pool)"""
+    data, page_width, page_height = _load_template(template_path, digest)
+
+    # ===== CAMADA DE TEXTO =====
+    packet = BytesIO()
+    can = canvas.Canvas(packet, pagesize=(page_width, page_height))
+
+    can.setFillColorRGB(0, 0, 0)
+    can.setFont("Helvetica-Bold", 32)
+    can.drawCentredString(page_width / 2, name_y, user_name)
+
+    can.setFont("Helvetica", 20)
+    can.setFillColorRGB(0.2, 0.2, 0.2)
+    can.drawCentredString(page_width / 2, module_y, module_name)
+
+    can.setFont("Helvetica", 16)
+    can.setFillColorRGB(0.3, 0.3, 0.3)
+    can.drawCentredString(page_width / 2, date_y, f"Concluído em {completion_date}")
+
+    can.save()
+    packet.seek(0)
+
+    # ===== MESCLA COM O TEMPLATE =====
+    writer = PdfWriter()
+    page = writer.add_page(PdfReader(BytesIO(data)).pages[0])
+    box = page.mediabox
+    page.merge_translated_page(PdfReader(packet).pages[0], float(box.left), float(box.bottom))
+
+    with open(output_path, "wb") as output_file:
+        writer.write(output_file)
+
+    return output_path
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        workers = int(os.environ.get('CERTIFICATE_RENDER_WORKERS', 2))
+        # spawn: os workers não herdam o client MongoDB nem as threads do processo principal
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def render(template_path: str, output_path: str, **fields) -> str:
+    """Renderiza no pool de processos sem bloquear o event loop"""
+    loop = asyncio.get_running_loop()
+    digest = await loop.run_in_executor(None, template_hash, template_path)
+    return await loop.run_in_executor(
+        get_pool(),
+        _render_kwargs,
+        template_path, digest, output_path, fields
+    )
+
+
+async def prepare(template_path: str) -> Tuple[float, float]:
+    """Prepara a versão atual do template no cache de disco; retorna o tamanho da página"""
+    loop = asyncio.get_running_loop()
+    digest = await loop.run_in_executor(None, template_hash, template_path)
+    return await loop.run_in_executor(get_pool(), _prepare, template_path, digest)
+
+
+def _prepare(template_path: str, digest: str) -> Tuple[float, float]:
+    _, width, height = _load_template(template_path, digest)
+    return width, height
+
+
+def _render_kwargs(template_path: str, digest: str, output_path: str, fields: dict) -> str:
+    return render_certificate(template_path, digest, output_path, **fields)
@@ -0,0 +1,304 @@
+"""
+Progresso dos desafios semanais (weekly_challenges -> user_challenge_progress)
+- evaluate_user(): caminho incremental, chamado pelos eventos do usuário (capítulo ou
+  módulo concluído, pontos, streak); avalia só os desafios ativos dos tipos afetados, com
+  os desafios ativos em memória (relidos a cada CHALLENGES_REFRESH_SECONDS) e uma leitura
+  do progresso do usuário
+- evaluate_all(): tarefa agendada que calcula o progresso de todos os usuários em todos os
+  desafios ativos com uma agregação por tipo de desafio, grava user_challenge_progress com
+  bulk_write e lança as recompensas em lote (points.award_many); alcança quem não agiu
+  desde a última mudança e desafios criados ou editados depois
+
+Desafios já concluídos pelo usuário não são mais alterados; a recompensa tem chave
+"challenge:<id>" no livro de pontos, então os dois caminhos nunca pagam duas vezes.
+
+Variáveis de ambiente:
+- CHALLENGES_REFRESH_SECONDS (padrão 60)
+- CHALLENGES_EVALUATE_INTERVAL_SECONDS (padrão 900)
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from database import db
+from models import UserChallengeProgress
+from services import module_progress, points, scheduler, timestamps
+
+logger = logging.getLogger(__name__)
+
+REFRESH_SECONDS = int(os.environ.get('CHALLENGES_REFRESH_SECONDS', 60))
+EVALUATE_JOB = "challenges.evaluate"
+BATCH_SIZE = 1000
+
+# Tipos de desafio (challenge_type)
+CHAPTERS = "complete_chapters"
+MODULES = "complete_modules"
+POINTS = "earn_points"
+ACCESS = "daily_access"
+
+PROGRESS_PROJECTION = {"_id": 0, "id": 1, "user_id": 1, "challenge_id": 1, "current_progress": 1, "completed": 1}
+
+
+def _today() -> str:
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def _is_active(challenge: dict, today: str) -> bool:
+    return challenge["start_date"] <= today <= challenge["end_date"]
+
+
+class ActiveChallenges:
+    """Desafios ativos que ainda não terminaram, com validade de REFRESH_SECONDS"""
+
+    def __init__(self):
+        self.challenges: List[dict] = []
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    async def load(self):
+        self.challenges = await db.weekly_challenges.find(
+            {"active": True, "end_date": {"$gte": _today()}}, {"_id": 0}
+        ).to_list(None)
+        self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    async def of_types(self, types: Iterable[str]) -> List[dict]:
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > REFRESH_SECONDS:
+            async with self._lock:
+                if self._loaded_at is None or time.monotonic() - self._loaded_at > REFRESH_SECONDS:
+                    await self.load()
+        today, types = _today(), set(types)
+        return [c for c in self.challenges if c.get("challenge_type") in types and _is_active(c, today)]
+
+
+active = ActiveChallenges()
+
+
+def on_challenges_changed():
+    """Após criar/editar/excluir desafios: relê a lista deste processo"""
+    active.invalidate()
+
+
+# ==================== PROGRESSO ====================
+
+def _progress_write(challenge: dict, user_id: str, value: int,
+                    existing: Optional[dict]) -> Tuple[Optional[UpdateOne], bool]:
+    """Escrita do progresso (None se nada mudou) e se o desafio foi concluído agora"""
+    if existing and existing.get("completed"):
+        return None, False
+    completed = value >= challenge.get("target_value", 0)
+    if not completed and (value <= 0 if existing is None else existing.get("current_progress") == value):
+        return None, False
+
+    update = {"current_progress": value}
+    if completed:
+        update["completed"] = True
+        update["completed_at"] = datetime.now(timezone.utc).isoformat()
+    if existing:
+        return UpdateOne({"id": existing["id"], "completed": {"$ne": True}}, {"$set": update}), completed
+    progress = UserChallengeProgress(user_id=user_id, challenge_id=challenge["id"], **update)
+    return UpdateOne(
+        {"user_id": user_id, "challenge_id": challenge["id"]},
+        {"$setOnInsert": progress.model_dump()},
+        upsert=True
+    ), completed
+
+
+def _reward(challenge: dict, user_id: str) -> dict:
+    return {
+        "user_id": user_id,
+        "amount": challenge.get("points_reward", 0),
+        "reason": points.CHALLENGE,
+        "key": f"challenge:{challenge['id']}",
+        "ref": challenge["id"],
+    }
+
+
+# ==================== CAMINHO INCREMENTAL ====================
+
+async def _user_chapters(user_id: str, challenge: dict) -> int:
+    # Capítulos concluídos desde o início do desafio
+    return await db.user_progress.count_documents({
+        "user_id": user_id,
+        "completed": True,
+        **timestamps.range_query("completed_at", start=challenge["start_date"])
+    })
+
+
+async def _user_modules(user_id: str, challenge: dict) -> int:
+    return await module_progress.count_completed_modules(user_id)
+
+
+async def _user_points(user_id: str, challenge: dict) -> int:
+    return await points.points_between(user_id, challenge["start_date"], challenge["end_date"])
+
+
+async def _user_access(user_id: str, challenge: dict) -> int:
+    streak = await db.user_streaks.find_one({"user_id": user_id}, {"_id": 0, "current_streak": 1})
+    return (streak or {}).get("current_streak", 0)
+
+
+USER_METRICS: Dict[str, Callable[[str, dict], Awaitable[int]]] = {
+    CHAPTERS: _user_chapters,
+    MODULES: _user_modules,
+    POINTS: _user_points,
+    ACCESS: _user_access,
+}
+
+
+async def evaluate_user(user_id: str, types: Iterable[str]) -> List[str]:
+    """Atualiza o progresso do usuário nos desafios ativos dos tipos; retorna os concluídos agora"""
+    challenges = await active.of_types(types)
+    if not challenges:
+        return []
+    existing = {
+        doc["challenge_id"]: doc
+        async for doc in db.user_challenge_progress.find(
+            {"user_id": user_id, "challenge_id": {"$in": [c["id"] for c in challenges]}}, PROGRESS_PROJECTION
+        )
+    }
+
+    values = {}
+    operations, completed = [], []
+    for challenge in challenges:
+        if existing.get(challenge["id"], {}).get("completed"):
+            continue
+        # Desafios do mesmo tipo e período compartilham a consulta
+        metric_key = (challenge["challenge_type"], challenge["start_date"], challenge["end_date"])
+        if metric_key not in values:
+            values[metric_key] = await USER_METRICS[challenge["challenge_type"]](user_id, challenge)
+        operation, done = _progress_write(challenge, user_id, values[metric_key], existing.get(challenge["id"]))
+        if operation:
+            operations.append(operation)
+        if done:
+            completed.append(challenge)
+
+    if operations:
+        await db.user_challenge_progress.bulk_write(operations, ordered=False)
+    for challenge in completed:
+        reward = _reward(challenge, user_id)
+        await points.award(reward["user_id"], reward["amount"], reward["reason"], key=reward["key"], ref=reward["ref"])
+    return [challenge["id"] for challenge in completed]
+
+
+# ==================== AVALIAÇÃO EM LOTE ====================
+
+async def _facet(collection: str, match: dict, facets: Dict[str, list]) -> Dict[str, Dict[str, int]]:
+    """Uma agregação com um $facet por desafio; cada faceta devolve {_id: user_id, value}"""
+    rows = await db[collection].aggregate(
+        [{"$match": match}, {"$facet": facets}], allowDiskUse=True
+    ).to_list(1)
+    row = rows[0] if rows else {}
+    return {name: {item["_id"]: item["value"] for item in row.get(name, [])} for name in facets}
+
+
+async def _all_chapters(challenges: List[dict]) -> Dict[str, Dict[str, int]]:
+    start = min(c["start_date"] for c in challenges)
+    return await _facet("user_progress", {"completed": True, **timestamps.range_query("completed_at", start=start)}, {
+        c["id"]: [
+            {"$match": timestamps.range_query("completed_at", start=c["start_date"])},
+            {"$group": {"_id": "$user_id", "value": {"$sum": 1}}}
+        ]
+        for c in challenges
+    })
+
+
+async def _all_modules(challenges: List[dict]) -> Dict[str, Dict[str, int]]:
+    # Não depende do período: uma contagem serve para todos os desafios do tipo
+    counts = {
+        row["_id"]: row["value"]
+        async for row in db.user_module_progress.aggregate([
+            {"$match": {"completed": True}},
+            {"$group": {"_id": "$user_id", "value": {"$sum": 1}}}
+        ], allowDiskUse=True)
+    }
+    return {c["id"]: counts for c in challenges}
+
+
+async def _all_points(challenges: List[dict]) -> Dict[str, Dict[str, int]]:
+    start = min(c["start_date"] for c in challenges)
+    end = max(c["end_date"] for c in challenges)
+    return await _facet("points_daily", {"day": {"$gte": start, "$lte": end}}, {
+        c["id"]: [
+            {"$match": {"day": {"$gte": c["start_date"], "$lte": c["end_date"]}}},
+            {"$group": {"_id": "$user_id", "value": {"$sum": "$points"}}}
+        ]
+        for c in challenges
+    })
+
+
+async def _all_access(challenges: List[dict]) -> Dict[str, Dict[str, int]]:
+    streaks = {
+        doc["user_id"]: doc["current_streak"]
+        async for doc in db.user_streaks.find({"current_streak": {"$gt": 0}}, {"_id": 0, "user_id": 1, "current_streak": 1})
+    }
+    return {c["id"]: streaks for c in challenges}
+
+
+BATCH_METRICS: Dict[str, Callable[[List[dict]], Awaitable[Dict[str, Dict[str, int]]]]] = {
+    CHAPTERS: _all_chapters,
+    MODULES: _all_modules,
+    POINTS: _all_points,
+    ACCESS: _all_access,
+}
+
+
+async def _apply(challenge: dict, values: Dict[str, int]) -> Tuple[int, List[str]]:
+    """Grava o progresso de todos os usuários no desafio; retorna (escritas, concluintes)"""
+    existing = {
+        doc["user_id"]: doc
+        async for doc in db.user_challenge_progress.find({"challenge_id": challenge["id"]}, PROGRESS_PROJECTION)
+    }
+    operations, completed = [], []
+    # Quem já tinha progresso e saiu das métricas (ex.: streak zerado) volta a 0
+    for user_id in set(values) | set(existing):
+        operation, done = _progress_write(challenge, user_id, values.get(user_id, 0), existing.get(user_id))
+        if operation:
+            operations.append(operation)
+        if done:
+            completed.append(user_id)
+
+    for i in range(0, len(operations), BATCH_SIZE):
+        await db.user_challenge_progress.bulk_write(operations[i:i + BATCH_SIZE], ordered=False)
+    return len(operations), completed
+
+
+async def evaluate_all(challenge_ids: Optional[List[str]] = None) -> dict:
+    """Recalcula o progresso de todos os usuários nos desafios ativos (todos ou os informados)"""
+    today = _today()
+    query = {"active": True, "start_date": {"$lte": today}, "end_date": {"$gte": today}}
+    if challenge_ids:
+        query["id"] = {"$in": challenge_ids}
+
+    by_type: Dict[str, List[dict]] = {}
+    async for challenge in db.weekly_challenges.find(query, {"_id": 0}):
+        if challenge.get("challenge_type") in BATCH_METRICS:
+            by_type.setdefault(challenge["challenge_type"], []).append(challenge)
+
+    result, rewards = {}, []
+    for challenge_type, challenges in by_type.items():
+        values = await BATCH_METRICS[challenge_type](challenges)
+        for challenge in challenges:
+            written, completed = await _apply(challenge, values.get(challenge["id"], {}))
+            rewards.extend(_reward(challenge, user_id) for user_id in completed)
+            result[challenge["id"]] = {"title": challenge.get("title"), "updated": written, "completed": len(completed)}
+
+    awarded = 0
+    for i in range(0, len(rewards), BATCH_SIZE):
+        awarded += await points.award_many(rewards[i:i + BATCH_SIZE])
+    return {"challenges": result, "rewards": awarded}
+
+
+@scheduler.every(int(os.environ.get('CHALLENGES_EVALUATE_INTERVAL_SECONDS', 900)), name=EVALUATE_JOB)
+async def scheduled_evaluate():
+    result = await evaluate_all()
+    if result["rewards"]:
+        logger.info("Desafios concluídos na avaliação em lote: %s", result["rewards"])
+    return {"challenges": len(result["challenges"]), "rewards": result["rewards"]}
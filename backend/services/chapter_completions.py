@@ -0,0 +1,82 @@
+"""
+Publicação de CHAPTER_COMPLETED a partir de user_progress
+A conclusão é gravada em user_progress e o evento entra no outbox logo depois, em
+escritas separadas. Se o processo cair entre as duas, reconcile() (tarefa agendada)
+republica as conclusões recentes que não têm evento no outbox. A chave do evento
+identifica a conclusão (usuário, capítulo e completed_at), então as duas publicações
+nunca geram dois eventos.
+
+Variáveis de ambiente:
+- CHAPTER_COMPLETIONS_RECONCILE_INTERVAL_SECONDS (padrão 300)
+- CHAPTER_COMPLETIONS_RECONCILE_WINDOW_HOURS (padrão 24; abaixo dos 7 dias em que o
+  outbox guarda eventos processados)
+"""
+import logging
+import os
+from datetime import timedelta
+from typing import List, Optional
+
+from database import db
+from services import event_bus, scheduler, timestamps
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_JOB = "chapter_completions.reconcile"
+WINDOW_HOURS = int(os.environ.get('CHAPTER_COMPLETIONS_RECONCILE_WINDOW_HOURS', 24))
+BATCH_SIZE = 500
+
+PROJECTION = {"_id": 0, "user_id": 1, "module_id": 1, "chapter_id": 1, "completed_at": 1}
+
+
+def key(progress: dict) -> str:
+    """Chave do evento da conclusão; completed_at em milissegundos, a precisão do MongoDB"""
+    completed_at = timestamps.parse(progress["completed_at"])
+    stamp = completed_at.isoformat(timespec="milliseconds") if completed_at else progress["completed_at"]
+    return f"chapter_completed:{progress['user_id']}:{progress['chapter_id']}:{stamp}"
+
+
+async def publish(progress: dict) -> Optional[str]:
+    """Publica CHAPTER_COMPLETED da conclusão gravada; None se o evento já existe"""
+    return await event_bus.publish(event_bus.CHAPTER_COMPLETED, {
+        "user_id": progress["user_id"],
+        "module_id": progress["module_id"],
+        "chapter_id": progress["chapter_id"],
+        "completed_at": progress["completed_at"]
+    }, key=key(progress))
+
+
+async def _publish_missing(batch: List[dict]) -> int:
+    keys = {key(progress): progress for progress in batch}
+    existing = {
+        event["key"]
+        async for event in db.event_outbox.find({"key": {"$in": list(keys)}}, {"_id": 0, "key": 1})
+    }
+    published = 0
+    for event_key, progress in keys.items():
+        if event_key not in existing and await publish(progress):
+            published += 1
+    return published
+
+
+async def reconcile(hours: int = WINDOW_HOURS) -> int:
+    """Republica as conclusões das últimas `hours` horas sem evento no outbox"""
+    since = timestamps.now() - timedelta(hours=hours)
+    published, batch = 0, []
+    async for progress in db.user_progress.find(
+        {"completed": True, **timestamps.range_query("completed_at", start=since)}, PROJECTION
+    ):
+        batch.append(progress)
+        if len(batch) >= BATCH_SIZE:
+            published += await _publish_missing(batch)
+            batch = []
+    if batch:
+        published += await _publish_missing(batch)
+
+    if published:
+        logger.warning("Conclusões de capítulo sem evento republicadas: %s", published)
+    return published
+
+
+@scheduler.every(int(os.environ.get('CHAPTER_COMPLETIONS_RECONCILE_INTERVAL_SECONDS', 300)), name=RECONCILE_JOB)
+async def scheduled_reconcile():
+    return {"published": await reconcile()}
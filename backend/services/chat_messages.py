@@ -0,0 +1,144 @@
+"""
+Histórico do chat paginado por cursor e estado de leitura por marca d'água
+As páginas usam o índice messages(conversation_id, created_at, id): before/after recebem o id
+de uma mensagem e a página continua a partir dela, sem skip.
+A leitura fica na conversa, em read_watermarks.{user|staff}: o created_at da última mensagem
+lida por cada lado. "read" das mensagens é calculado na resposta a partir da marca do outro lado
+(conversas antigas, sem marca, continuam usando o campo read gravado na mensagem).
+Gravação de mensagens e leitura também mantêm os contadores de não lidas (unread_counters).
+"""
+from typing import List, Optional
+
+from pymongo import ReturnDocument
+
+from database import db
+from services import unread_counters
+from services.chat_routing import STAFF_ROLES
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+USER_SIDE = "user"
+STAFF_SIDE = "staff"
+
+
+def side_of(role: str) -> str:
+    return STAFF_SIDE if role in STAFF_ROLES else USER_SIDE
+
+
+def _other_side(side: str) -> str:
+    return USER_SIDE if side == STAFF_SIDE else STAFF_SIDE
+
+
+async def _anchor(conversation_id: str, message_id: str) -> Optional[dict]:
+    return await db.messages.find_one(
+        {"conversation_id": conversation_id, "id": message_id},
+        {"_id": 0, "id": 1, "created_at": 1}
+    )
+
+
+async def get_page(conversation_id: str, before: Optional[str] = None, after: Optional[str] = None,
+                   limit: int = DEFAULT_PAGE_SIZE) -> Optional[List[dict]]:
+    """
+    Página de mensagens em ordem cronológica.
+    Sem cursor: as `limit` mais recentes; before: as anteriores à mensagem; after: as seguintes.
+    Retorna None se a mensagem do cursor não pertence à conversa.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = {"conversation_id": conversation_id}
+    newest_first = after is None
+
+    cursor_id = after or before
+    if cursor_id:
+        anchor = await _anchor(conversation_id, cursor_id)
+        if not anchor:
+            return None
+        op = "$gt" if after else "$lt"
+        query["$or"] = [
+            {"created_at": {op: anchor["created_at"]}},
+            {"created_at": anchor["created_at"], "id": {op: anchor["id"]}},
+        ]
+
+    direction = -1 if newest_first else 1
+    messages = await db.messages.find(query, {"_id": 0}).sort(
+        [("created_at", direction), ("id", direction)]
+    ).limit(limit).to_list(limit)
+
+    if newest_first:
+        messages.reverse()
+    return messages
+
+
+def apply_read_flags(messages: List[dict], conversation: dict) -> List[dict]:
+    """Preenche "read" de cada mensagem com a marca d'água de quem a recebeu"""
+    watermarks = conversation.get("read_watermarks") or {}
+    for message in messages:
+        reader = _other_side(side_of(message.get("sender_role", "")))
+        watermark = watermarks.get(reader)
+        if watermark is not None:
+            message["read"] = message["created_at"] <= watermark
+    return messages
+
+
+async def save_message(message: dict) -> Optional[dict]:
+    """
+    Grava a mensagem e atualiza a conversa (última mensagem + não lidas do destinatário)
+    e os contadores. Retorna a conversa antes da atualização (None se não existe).
+    """
+    await db.messages.insert_one(message)
+    # insert_one adiciona _id ao dicionário
+    message.pop("_id", None)
+
+    from_staff = side_of(message["sender_role"]) == STAFF_SIDE
+    counter = "user_unread_count" if from_staff else "unread_count"
+    before = await db.conversations.find_one_and_update(
+        {"id": message["conversation_id"]},
+        {
+            "$set": {"last_message": message["message"][:100], "last_message_at": message["created_at"]},
+            "$inc": {counter: 1}
+        },
+        projection={"_id": 0, "user_id": 1, "unread_count": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    if not before:
+        return None
+
+    if from_staff:
+        await unread_counters.incr(before["user_id"], unread_counters.CHAT)
+    elif not before.get("unread_count"):
+        # Conversa passou a ter mensagens não lidas pela equipe
+        await unread_counters.incr(unread_counters.STAFF_KEY, unread_counters.CHAT)
+    return before
+
+
+async def mark_read(conversation_id: str, role: str) -> Optional[str]:
+    """
+    Avança a marca d'água do lado de `role` até a última mensagem da conversa
+    (nunca retrocede) em uma única escrita, zera as não lidas desse lado e desconta
+    os contadores. Retorna a marca resultante.
+    """
+    side = side_of(role)
+    field = f"read_watermarks.{side}"
+    counter = "unread_count" if side == STAFF_SIDE else "user_unread_count"
+
+    before = await db.conversations.find_one_and_update(
+        {"id": conversation_id},
+        [{"$set": {
+            field: {"$max": [{"$ifNull": [f"${field}", ""]}, {"$ifNull": ["$last_message_at", ""]}]},
+            counter: 0
+        }}],
+        projection={"_id": 0, "user_id": 1, "last_message_at": 1, "read_watermarks": 1, counter: 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    if not before:
+        return None
+
+    unread = before.get(counter) or 0
+    if unread > 0:
+        if side == STAFF_SIDE:
+            await unread_counters.incr(unread_counters.STAFF_KEY, unread_counters.CHAT, -1)
+        else:
+            await unread_counters.incr(before["user_id"], unread_counters.CHAT, -unread)
+
+    previous = (before.get("read_watermarks") or {}).get(side) or ""
+    return max(previous, before.get("last_message_at") or "")
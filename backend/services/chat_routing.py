@@ -0,0 +1,92 @@
+"""
+Cache de roteamento das conversas do chat (conversation_id -> dono e status)
+Os eventos do socket só precisam saber de quem é a conversa para escolher a sala de destino
+(user_{id} ou admins); o dono nunca muda, então a entrada só é descartada quando o status da
+conversa muda neste processo ou, nos demais processos, após CHAT_ROUTE_TTL_SECONDS.
+
+Variáveis de ambiente:
+- CHAT_ROUTE_CACHE_SIZE (padrão 5000 conversas)
+- CHAT_ROUTE_TTL_SECONDS (padrão 300)
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from database import db
+
+ADMIN_ROOM = 'admins'
+STAFF_ROLES = ("admin", "supervisor")
+
+
+def user_room(user_id: str) -> str:
+    return f"user_{user_id}"
+
+
+class ConversationRouteCache:
+    """LRU com validade: conversation_id -> {"user_id", "status"}"""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._items: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+
+    def get(self, conversation_id: str) -> Optional[dict]:
+        item = self._items.get(conversation_id)
+        if item is None:
+            return None
+        stored_at, route = item
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._items[conversation_id]
+            return None
+        self._items.move_to_end(conversation_id)
+        return route
+
+    def put(self, conversation_id: str, route: dict):
+        self._items[conversation_id] = (time.monotonic(), route)
+        self._items.move_to_end(conversation_id)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def invalidate(self, conversation_id: str):
+        self._items.pop(conversation_id, None)
+
+    def clear(self):
+        self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+cache = ConversationRouteCache(
+    int(os.environ.get('CHAT_ROUTE_CACHE_SIZE', 5000)),
+    float(os.environ.get('CHAT_ROUTE_TTL_SECONDS', 300))
+)
+
+
+async def get_route(conversation_id: str) -> Optional[dict]:
+    """Dono e status da conversa (cache; uma consulta por projeção em caso de falta)"""
+    route = cache.get(conversation_id)
+    if route is None:
+        route = await db.conversations.find_one(
+            {"id": conversation_id}, {"_id": 0, "user_id": 1, "status": 1}
+        )
+        if route is None:
+            return None
+        cache.put(conversation_id, route)
+    return route
+
+
+def can_access(route: dict, user_id: str, role: str) -> bool:
+    return role in STAFF_ROLES or route["user_id"] == user_id
+
+
+def target_room(route: dict, sender_role: str) -> str:
+    """Sala que recebe o evento: o dono da conversa quando a equipe envia, senão os admins"""
+    if sender_role in STAFF_ROLES:
+        return user_room(route["user_id"])
+    return ADMIN_ROOM
+
+
+def invalidate(conversation_id: str):
+    cache.invalidate(conversation_id)
@@ -0,0 +1,184 @@
+"""
+Estatísticas do dashboard admin em uma agregação por widget, com cache em memória
+- growth(): licenciados e capítulos concluídos acumulados por mês ($unionWith + $group)
+- stage_distribution(): licenciados por etapa do onboarding (um $group)
+- system_stats(): usuários por perfil ($group), ativos em 7 dias e totais das demais
+  coleções por estimated_document_count (metadado, não varre a coleção), em paralelo
+
+Cada resultado fica em cache por DASHBOARD_STATS_TTL_SECONDS. invalidate() limpa o cache
+deste processo (chamado nas escritas de usuários, módulos e capítulos); nos demais
+processos o valor expira pelo TTL.
+
+Variáveis de ambiente:
+- DASHBOARD_STATS_TTL_SECONDS (padrão 30)
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from dateutil.relativedelta import relativedelta
+
+from database import db
+
+GROWTH = "growth"
+STAGES = "stage_distribution"
+SYSTEM = "system"
+
+MONTH_NAMES = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
+
+STAGE_GROUPS = [
+    ("Registro", ["registro"], "#06b6d4"),
+    ("Documentos", ["documentos", "documentos_pf", "documentos_pj"], "#8b5cf6"),
+    ("Pagamento", ["pagamento"], "#3b82f6"),
+    ("Acolhimento", ["acolhimento"], "#f59e0b"),
+    ("Completo", ["completo"], "#22c55e"),
+]
+
+
+class StatsCache:
+    """Resultados por widget com validade; uma só computação concorrente por widget"""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._items: Dict[str, Tuple[float, object]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def get_or_compute(self, name: str, compute: Callable[[], Awaitable[object]]):
+        item = self._items.get(name)
+        if item and time.monotonic() - item[0] <= self.ttl_seconds:
+            return item[1]
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            item = self._items.get(name)
+            if item and time.monotonic() - item[0] <= self.ttl_seconds:
+                return item[1]
+            value = await compute()
+            self._items[name] = (time.monotonic(), value)
+            return value
+
+    def invalidate(self, *names: str):
+        if not names:
+            self._items.clear()
+        for name in names:
+            self._items.pop(name, None)
+
+
+cache = StatsCache(float(os.environ.get('DASHBOARD_STATS_TTL_SECONDS', 30)))
+
+
+def invalidate(*names: str):
+    """Descarta os widgets informados (todos, sem argumentos)"""
+    cache.invalidate(*names)
+
+
+# ==================== CRESCIMENTO ====================
+
+def _month_of(field: str) -> dict:
+    """YYYY-MM de um timestamp em data BSON ou string ISO ("" se ausente)"""
+    return {"$switch": {
+        "branches": [
+            {"case": {"$eq": [{"$type": field}, "date"]},
+             "then": {"$dateToString": {"format": "%Y-%m", "date": field}}},
+            {"case": {"$eq": [{"$type": field}, "string"]},
+             "then": {"$substrBytes": [field, 0, 7]}},
+        ],
+        "default": ""
+    }}
+
+
+async def _compute_growth() -> List[dict]:
+    rows = await db.users.aggregate([
+        {"$match": {"role": "licenciado"}},
+        {"$project": {"_id": 0, "kind": "licenciados", "month": _month_of("$created_at")}},
+        {"$unionWith": {"coll": "user_progress", "pipeline": [
+            {"$match": {"completed": True}},
+            {"$project": {"_id": 0, "kind": "modulos", "month": _month_of("$completed_at")}}
+        ]}},
+        {"$group": {"_id": {"kind": "$kind", "month": "$month"}, "n": {"$sum": 1}}}
+    ]).to_list(None)
+
+    today = datetime.now()
+    months = [(today - relativedelta(months=i)).strftime("%Y-%m") for i in range(5, -1, -1)]
+
+    result = []
+    for month in months:
+        # Acumulado até o fim do mês; registros sem data contam desde o início
+        totals = {"licenciados": 0, "modulos": 0}
+        for row in rows:
+            if row["_id"]["month"] <= month:
+                totals[row["_id"]["kind"]] += row["n"]
+        result.append({"month": MONTH_NAMES[int(month[5:7]) - 1], **totals})
+    return result
+
+
+async def growth() -> List[dict]:
+    return await cache.get_or_compute(GROWTH, _compute_growth)
+
+
+# ==================== ETAPAS ====================
+
+async def _compute_stage_distribution() -> List[dict]:
+    counts = {
+        row["_id"]: row["n"]
+        async for row in db.users.aggregate([
+            {"$match": {"role": "licenciado"}},
+            {"$group": {"_id": "$onboarding_stage", "n": {"$sum": 1}}}
+        ])
+    }
+
+    distribution = [
+        {"name": name, "value": sum(counts.get(stage, 0) for stage in stages), "color": color}
+        for name, stages, color in STAGE_GROUPS
+    ]
+    # Sem dados de onboarding_stage, os licenciados sem etapa contam como "Registro"
+    if not any(item["value"] for item in distribution):
+        distribution[0]["value"] = counts.get(None, 0)
+    return distribution
+
+
+async def stage_distribution() -> List[dict]:
+    return await cache.get_or_compute(STAGES, _compute_stage_distribution)
+
+
+# ==================== SISTEMA ====================
+
+ESTIMATED_TOTALS = {
+    "total_modules": "modules",
+    "total_chapters": "chapters",
+    "total_assessments": "assessments",
+    "total_rewards": "rewards",
+    "total_badges": "badges",
+    "total_challenges": "weekly_challenges",
+}
+
+
+async def _compute_system_stats() -> dict:
+    seven_days_ago = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
+
+    roles, active, *estimated = await asyncio.gather(
+        db.users.aggregate([
+            {"$group": {"_id": "$role", "n": {"$sum": 1}}}
+        ]).to_list(None),
+        db.user_accesses.aggregate([
+            {"$match": {"date": {"$gte": seven_days_ago}}},
+            {"$group": {"_id": "$user_id"}},
+            {"$count": "n"}
+        ]).to_list(1),
+        *(db[collection].estimated_document_count() for collection in ESTIMATED_TOTALS.values())
+    )
+
+    by_role = {row["_id"]: row["n"] for row in roles}
+    return {
+        "total_users": sum(by_role.values()),
+        "total_licensees": by_role.get("licenciado", 0),
+        "total_supervisors": by_role.get("supervisor", 0),
+        "total_admins": by_role.get("admin", 0),
+        **dict(zip(ESTIMATED_TOTALS, estimated)),
+        "active_users_7d": active[0]["n"] if active else 0
+    }
+
+
+async def system_stats() -> dict:
+    return await cache.get_or_compute(SYSTEM, _compute_system_stats)
@@ -0,0 +1,214 @@
+"""
+Barramento de eventos de domínio com outbox persistido no MongoDB (coleção event_outbox)
+
+publish() grava o evento no outbox e acorda os workers; os handlers rodam fora da
+requisição, em um pool de tarefas asyncio iniciado pelo lifespan da aplicação.
+Cada handler é registrado com um nome e marcado em "handled" ao terminar, então uma
+nova tentativa só reexecuta os handlers que falharam. A entrega é pelo menos uma vez
+(o handler pode ter gravado antes de falhar): o payload recebido traz "event_id", para
+que efeitos não idempotentes (ex.: $inc) sejam deduplicados pelo id do evento.
+Eventos presos em "processing" (processo reiniciado no meio) voltam à fila quando o lease expira.
+
+Variáveis de ambiente:
+- EVENT_BUS_WORKERS (padrão 4)
+- EVENT_BUS_MAX_ATTEMPTS (padrão 8)
+"""
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# ==================== EVENTOS ====================
+
+CHAPTER_COMPLETED = "chapter_completed"   # {user_id, module_id, chapter_id, completed_at}
+MODULE_COMPLETED = "module_completed"     # {user_id, module_id, completed_at}
+STAGE_ADVANCED = "stage_advanced"         # {user_id, from_stage, to_stage}
+BADGE_EARNED = "badge_earned"             # {user_id, badge_id}
+POINTS_AWARDED = "points_awarded"         # {user_id, amount, reason}
+CONTENT_SAVED = "content_saved"           # {texts, source_language}
+ADMIN_NOTIFICATION = "admin_notification" # {event_key, title, message, type, related_id, digest}
+
+# Status no outbox
+PENDING = "pending"
+PROCESSING = "processing"
+DONE = "done"
+FAILED = "failed"
+
+LEASE_SECONDS = 60
+POLL_INTERVAL_SECONDS = 2
+MAX_BACKOFF_SECONDS = 300
+
+Handler = Callable[[dict], Awaitable[None]]
+_handlers: Dict[str, List[Tuple[str, Handler]]] = {}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def subscribe(event_type: str, name: Optional[str] = None):
+    """Decorator que registra um handler; handlers do mesmo evento rodam na ordem de registro"""
+    def decorator(func: Handler) -> Handler:
+        handler_name = name or f"{func.__module__}.{func.__name__}"
+        _handlers.setdefault(event_type, []).append((handler_name, func))
+        return func
+    return decorator
+
+
+async def publish(event_type: str, payload: dict, key: Optional[str] = None) -> Optional[str]:
+    """
+    Grava o evento no outbox e retorna seu id.
+    Com `key`, eventos repetidos (mesma chave) são descartados e retornam None.
+    """
+    now = _now()
+    event = {
+        "id": str(uuid.uuid4()),
+        "type": event_type,
+        "payload": payload,
+        "status": PENDING,
+        "attempts": 0,
+        "handled": [],
+        "available_at": now,
+        "created_at": now,
+    }
+    if key:
+        event["key"] = key
+
+    try:
+        await db.event_outbox.insert_one(event)
+    except DuplicateKeyError:
+        return None
+
+    bus.wake()
+    return event["id"]
+
+
+class EventBus:
+    """Pool de workers que consome o outbox"""
+
+    def __init__(self):
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self.max_attempts = int(os.environ.get('EVENT_BUS_MAX_ATTEMPTS', 8))
+
+    @property
+    def workers(self) -> int:
+        return len(self._tasks)
+
+    def start(self, workers: Optional[int] = None):
+        if self._tasks:
+            return
+        workers = workers or int(os.environ.get('EVENT_BUS_WORKERS', 4))
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(workers)]
+        logger.info("Event bus iniciado com %s workers", workers)
+
+    async def stop(self):
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _claim(self) -> Optional[dict]:
+        now = _now()
+        return await db.event_outbox.find_one_and_update(
+            {"$or": [
+                {"status": PENDING, "available_at": {"$lte": now}},
+                {"status": PROCESSING, "locked_until": {"$lte": now}},
+            ]},
+            {
+                "$set": {"status": PROCESSING, "locked_until": now + timedelta(seconds=LEASE_SECONDS)},
+                "$inc": {"attempts": 1}
+            },
+            sort=[("available_at", 1)],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _worker(self, number: int):
+        while not self._stopping:
+            try:
+                event = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Event bus: erro ao buscar eventos: %s", e)
+                event = None
+
+            if event is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self.dispatch(event)
+
+    async def dispatch(self, event: dict):
+        """Executa os handlers pendentes do evento e atualiza seu status no outbox"""
+        handled = set(event.get("handled", []))
+
+        try:
+            for name, handler in _handlers.get(event["type"], []):
+                if name in handled:
+                    continue
+                await handler({**event["payload"], "event_id": event["id"]})
+                await db.event_outbox.update_one({"id": event["id"]}, {"$addToSet": {"handled": name}})
+        except Exception as e:
+            attempts = event.get("attempts", 1)
+            if attempts >= self.max_attempts:
+                update = {"status": FAILED, "last_error": str(e)}
+                logger.error("Evento %s (%s) falhou após %s tentativas: %s", event["id"], event["type"], attempts, e)
+            else:
+                delay = min(2 ** attempts, MAX_BACKOFF_SECONDS)
+                update = {"status": PENDING, "available_at": _now() + timedelta(seconds=delay), "last_error": str(e)}
+                logger.warning("Evento %s (%s) falhou, nova tentativa em %ss: %s", event["id"], event["type"], delay, e)
+            await db.event_outbox.update_one({"id": event["id"]}, {"$set": update, "$unset": {"locked_until": ""}})
+            return
+
+        await db.event_outbox.update_one(
+            {"id": event["id"]},
+            {"$set": {"status": DONE, "processed_at": _now()}, "$unset": {"locked_until": ""}}
+        )
+
+
+bus = EventBus()
+
+
+async def outbox_stats() -> dict:
+    """Contagem de eventos por status e os últimos que falharam"""
+    counts = {
+        row["_id"]: row["n"]
+        async for row in db.event_outbox.aggregate([{"$group": {"_id": "$status", "n": {"$sum": 1}}}])
+    }
+    failed = await db.event_outbox.find(
+        {"status": FAILED}, {"_id": 0}
+    ).sort("created_at", -1).limit(20).to_list(20)
+    return {"counts": counts, "failed": failed, "workers": bus.workers}
+
+
+async def retry_failed() -> int:
+    """Devolve à fila os eventos que esgotaram as tentativas"""
+    result = await db.event_outbox.update_many(
+        {"status": FAILED},
+        {"$set": {"status": PENDING, "attempts": 0, "available_at": _now()}}
+    )
+    bus.wake()
+    return result.modified_count
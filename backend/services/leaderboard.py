@@ -0,0 +1,331 @@
+"""
+Ranking de licenciados em memória com consultas por busca binária
+Cada processo mantém, por escopo (geral, por supervisor e por categoria), um array ordenado
+de chaves (-pontos, user_id): posição, top-N e vizinhos saem em O(log n) sem consultar
+o banco; inserir/remover uma chave desloca o array (memmove), barato nos volumes do LMS.
+
+A posição segue a regra do ranking antigo: 1 + licenciados com mais pontos (empates
+dividem a posição).
+
+Sincronização entre processos, com o MongoDB como backend compartilhado:
+- award_points() aplica o $inc e grava rank_updated_at no usuário; touch() faz o mesmo
+  para cadastro e troca de perfil/supervisor/categoria
+- cada processo relê a cada LEADERBOARD_SYNC_SECONDS só os usuários com rank_updated_at
+  recente (índice em rank_updated_at) e recarrega tudo a cada LEADERBOARD_RELOAD_SECONDS,
+  o que também descarta usuários removidos por outros processos
+
+Variáveis de ambiente:
+- LEADERBOARD_SYNC_SECONDS (padrão 5)
+- LEADERBOARD_RELOAD_SECONDS (padrão 600)
+"""
+import asyncio
+import logging
+import os
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument, UpdateOne
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+SYNC_SECONDS = int(os.environ.get('LEADERBOARD_SYNC_SECONDS', 5))
+RELOAD_SECONDS = int(os.environ.get('LEADERBOARD_RELOAD_SECONDS', 600))
+# Folga na releitura incremental para relógios levemente diferentes entre servidores
+SYNC_OVERLAP_SECONDS = 30
+
+GLOBAL = "global"
+RANK_FIELDS = ("points", "role", "supervisor_id", "category_id")
+PROJECTION = {"_id": 0, "id": 1, **{field: 1 for field in RANK_FIELDS}}
+
+Key = Tuple[int, str]
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def supervisor_scope(supervisor_id: str) -> str:
+    return f"supervisor:{supervisor_id}"
+
+
+def category_scope(category_id: str) -> str:
+    return f"category:{category_id}"
+
+
+def scope_filter(scope: str) -> dict:
+    """Filtro de documentos com supervisor_id/category_id do dono para o escopo"""
+    kind, _, value = scope.partition(":")
+    if kind == "supervisor":
+        return {"supervisor_id": value}
+    if kind == "category":
+        return {"category_id": value}
+    return {}
+
+
+def _scopes(user: dict) -> List[str]:
+    scopes = [GLOBAL]
+    if user.get("supervisor_id"):
+        scopes.append(supervisor_scope(user["supervisor_id"]))
+    if user.get("category_id"):
+        scopes.append(category_scope(user["category_id"]))
+    return scopes
+
+
+class RankIndex:
+    """Array ordenado de (-pontos, user_id): maior pontuação primeiro, desempate por id"""
+
+    def __init__(self, keys: Optional[List[Key]] = None):
+        self._keys: List[Key] = keys or []
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key: Key):
+        insort(self._keys, key)
+
+    def remove(self, key: Key):
+        i = self.index_of(key)
+        if i is not None:
+            del self._keys[i]
+
+    def index_of(self, key: Key) -> Optional[int]:
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            return i
+        return None
+
+    def position(self, points: int) -> int:
+        """1 + quantidade de chaves com mais pontos"""
+        return bisect_left(self._keys, (-points, "")) + 1
+
+    def slice(self, start: int, stop: int) -> List[Key]:
+        return self._keys[max(start, 0):stop]
+
+
+class Leaderboard:
+    """Índices de ranking deste processo, carregados na subida e mantidos em sincronia"""
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[int, List[str]]] = {}
+        self._indexes: Dict[str, RankIndex] = {}
+        self._synced_at: Optional[datetime] = None
+        self._reloaded_at = 0.0
+        self._load_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    # ---------- manutenção ----------
+
+    def apply(self, user: dict):
+        """Reposiciona o usuário a partir do documento (id + RANK_FIELDS)"""
+        self.discard(user["id"])
+        if user.get("role") != "licenciado":
+            return
+        points = user.get("points") or 0
+        scopes = _scopes(user)
+        for scope in scopes:
+            self._indexes.setdefault(scope, RankIndex()).add((-points, user["id"]))
+        self._entries[user["id"]] = (points, scopes)
+
+    def discard(self, user_id: str):
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return
+        points, scopes = entry
+        for scope in scopes:
+            index = self._indexes.get(scope)
+            if index is None:
+                continue
+            index.remove((-points, user_id))
+            if not len(index):
+                del self._indexes[scope]
+
+    async def load(self):
+        """Monta todos os índices de uma vez e só então troca pelos atuais"""
+        started = _now()
+        entries = {}
+        keys = defaultdict(list)
+        async for user in db.users.find({"role": "licenciado"}, PROJECTION):
+            points = user.get("points") or 0
+            scopes = _scopes(user)
+            entries[user["id"]] = (points, scopes)
+            for scope in scopes:
+                keys[scope].append((-points, user["id"]))
+
+        self._entries = entries
+        self._indexes = {scope: RankIndex(sorted(scope_keys)) for scope, scope_keys in keys.items()}
+        self._synced_at = started
+        self._reloaded_at = time.monotonic()
+
+    async def sync(self):
+        """Aplica as alterações gravadas por qualquer processo desde a última leitura"""
+        started = _now()
+        since = self._synced_at - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+        async for user in db.users.find({"rank_updated_at": {"$gte": since}}, PROJECTION):
+            self.apply(user)
+        self._synced_at = started
+
+    async def ready(self):
+        if self._synced_at is None:
+            async with self._load_lock:
+                if self._synced_at is None:
+                    await self.load()
+
+    # ---------- consultas ----------
+
+    def _row(self, index: RankIndex, key: Key) -> dict:
+        points, user_id = -key[0], key[1]
+        return {"user_id": user_id, "points": points, "position": index.position(points)}
+
+    def top(self, scope: str, limit: int, offset: int = 0) -> List[dict]:
+        index = self._indexes.get(scope, RankIndex())
+        return [self._row(index, key) for key in index.slice(offset, offset + limit)]
+
+    def position(self, user_id: str, scope: str = GLOBAL) -> Optional[dict]:
+        entry = self._entries.get(user_id)
+        if entry is None or scope not in entry[1]:
+            return None
+        index = self._indexes[scope]
+        return {"user_id": user_id, "points": entry[0], "position": index.position(entry[0]), "total": len(index)}
+
+    def around(self, user_id: str, scope: str = GLOBAL, radius: int = 2) -> List[dict]:
+        entry = self._entries.get(user_id)
+        if entry is None or scope not in entry[1]:
+            return []
+        index = self._indexes[scope]
+        i = index.index_of((-entry[0], user_id))
+        return [self._row(index, key) for key in index.slice(i - radius, i + radius + 1)]
+
+    # ---------- sincronização em segundo plano ----------
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                if self._synced_at is None or time.monotonic() - self._reloaded_at >= RELOAD_SECONDS:
+                    async with self._load_lock:
+                        await self.load()
+                else:
+                    await self.sync()
+            except Exception as e:
+                logger.error("Ranking: erro ao sincronizar: %s", e)
+            await asyncio.sleep(SYNC_SECONDS)
+
+
+board = Leaderboard()
+
+
+# ==================== ESCRITAS ====================
+
+async def award_points(user_id: str, amount: int, entry_id: Optional[str] = None) -> Optional[dict]:
+    """
+    Soma `amount` aos pontos do usuário e atualiza o ranking; retorna o usuário
+    (id + RANK_FIELDS + level_title) já com o novo total. Prêmios passam por services/points.award.
+    Com `entry_id` (lançamento do livro) a soma é aplicada uma única vez: o id fica em
+    users.points_pending até o lançamento ser concluído.
+    """
+    query = {"id": user_id}
+    update = {"$inc": {"points": amount}, "$set": {"rank_updated_at": _now()}}
+    if entry_id:
+        query["points_pending"] = {"$ne": entry_id}
+        update["$push"] = {"points_pending": entry_id}
+    user = await db.users.find_one_and_update(
+        query,
+        update,
+        projection={**PROJECTION, "level_title": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if user is None and entry_id:
+        # Soma já aplicada por uma tentativa anterior (ou usuário inexistente)
+        user = await db.users.find_one({"id": user_id}, {**PROJECTION, "level_title": 1})
+    if user is not None:
+        board.apply(user)
+    return user
+
+
+async def award_points_many(entries: List[dict]) -> Dict[str, dict]:
+    """award_points() em lote para lançamentos {id, user_id, amount}; retorna os usuários por id"""
+    if not entries:
+        return {}
+    now = _now()
+    await db.users.bulk_write([
+        UpdateOne(
+            {"id": entry["user_id"], "points_pending": {"$ne": entry["id"]}},
+            {"$inc": {"points": entry["amount"]}, "$set": {"rank_updated_at": now},
+             "$push": {"points_pending": entry["id"]}}
+        )
+        for entry in entries
+    ], ordered=False)
+    users = {
+        user["id"]: user
+        async for user in db.users.find(
+            {"id": {"$in": list({entry["user_id"] for entry in entries})}}, {**PROJECTION, "level_title": 1}
+        )
+    }
+    for user in users.values():
+        board.apply(user)
+    return users
+
+
+async def touch(user_id: str):
+    """Publica para os demais processos e aplica aqui a posição atual do usuário"""
+    user = await db.users.find_one_and_update(
+        {"id": user_id},
+        {"$set": {"rank_updated_at": _now()}},
+        projection=PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    if user is None:
+        board.discard(user_id)
+    else:
+        board.apply(user)
+
+
+def forget(user_id: str):
+    """Remove o usuário excluído deste processo (os demais o descartam na recarga)"""
+    board.discard(user_id)
+
+
+# ==================== CONSULTAS ====================
+
+async def top(scope: str = GLOBAL, limit: int = 100, offset: int = 0) -> List[dict]:
+    """[{user_id, points, position}] dos primeiros `limit` do escopo"""
+    await board.ready()
+    return board.top(scope, limit, offset)
+
+
+async def position(user_id: str, scope: str = GLOBAL) -> Optional[dict]:
+    """{user_id, points, position, total} do usuário no escopo (None se fora dele)"""
+    await board.ready()
+    return board.position(user_id, scope)
+
+
+async def around(user_id: str, scope: str = GLOBAL, radius: int = 2) -> List[dict]:
+    """O usuário e até `radius` vizinhos acima e abaixo no escopo"""
+    await board.ready()
+    return board.around(user_id, scope, radius)
+
+
+async def hydrate(rows: List[dict], projection: dict) -> List[dict]:
+    """Junta aos itens do ranking os dados dos usuários (uma consulta), na ordem do ranking"""
+    users = {
+        user["id"]: user
+        async for user in db.users.find({"id": {"$in": [row["user_id"] for row in rows]}}, projection)
+    }
+    return [
+        {**users[row["user_id"]], "points": row["points"], "position": row["position"]}
+        for row in rows if row["user_id"] in users
+    ]
@@ -0,0 +1,131 @@
+"""
+Níveis por pontuação (coleção levels) e users.level_title
+Cada processo mantém a tabela de níveis em memória (ordenada por min_points, busca
+binária), relida a cada LEVELS_REFRESH_SECONDS e na hora no processo que editou os níveis.
+
+- apply(): chamado a cada mudança de pontos (services/points); só grava level_title
+  quando o nível muda, e só se os pontos ainda forem os usados no cálculo
+- recompute(): reatribui o nível de todos os usuários com um bulk_write de um update_many
+  por faixa de pontos; roda como tarefa agendada (rede de segurança) e é antecipada
+  quando os níveis são editados, para depois que todos os processos releram a tabela
+
+Variáveis de ambiente:
+- LEVELS_REFRESH_SECONDS (padrão 30)
+- LEVELS_RECOMPUTE_INTERVAL_SECONDS (padrão 86400)
+"""
+import asyncio
+import logging
+import os
+import time
+from bisect import bisect_right
+from typing import List, Optional
+
+from pymongo import UpdateMany
+
+from database import db
+from services import scheduler
+
+logger = logging.getLogger(__name__)
+
+REFRESH_SECONDS = int(os.environ.get('LEVELS_REFRESH_SECONDS', 30))
+RECOMPUTE_JOB = "levels.recompute"
+
+# Nível padrão se nenhum for encontrado
+DEFAULT_LEVEL = {"title": "Iniciante", "min_points": 0, "icon": "🌱", "color": "#6b7280"}
+
+
+class LevelTable:
+    """Níveis ordenados por min_points, com validade de REFRESH_SECONDS"""
+
+    def __init__(self):
+        self.levels: List[dict] = []
+        self._thresholds: List[int] = []
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    async def load(self):
+        levels = await db.levels.find({}, {"_id": 0}).sort("min_points", 1).to_list(None)
+        self.levels = levels
+        self._thresholds = [level["min_points"] for level in levels]
+        self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    async def current(self) -> "LevelTable":
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > REFRESH_SECONDS:
+            async with self._lock:
+                if self._loaded_at is None or time.monotonic() - self._loaded_at > REFRESH_SECONDS:
+                    await self.load()
+        return self
+
+    def level_for(self, points: int) -> dict:
+        """Maior nível com min_points <= points"""
+        i = bisect_right(self._thresholds, points or 0)
+        return self.levels[i - 1] if i else DEFAULT_LEVEL
+
+
+table = LevelTable()
+
+
+async def level_for(points: int) -> dict:
+    return (await table.current()).level_for(points)
+
+
+async def apply(user: dict) -> str:
+    """Atualiza level_title do usuário (id, points, level_title) se o nível mudou"""
+    points = user.get("points") or 0
+    title = (await level_for(points))["title"]
+    if user.get("level_title") != title:
+        await db.users.update_one(
+            {"id": user["id"], "points": user.get("points")},
+            {"$set": {"level_title": title}}
+        )
+    return title
+
+
+async def recompute() -> dict:
+    """Reatribui level_title de todos os usuários a partir da tabela atual do banco"""
+    await table.load()
+    bands = [(None, table.levels[0]["min_points"] if table.levels else None, DEFAULT_LEVEL["title"])]
+    for i, level in enumerate(table.levels):
+        upper = table.levels[i + 1]["min_points"] if i + 1 < len(table.levels) else None
+        bands.append((level["min_points"], upper, level["title"]))
+
+    operations = [
+        # Usuários sem pontos gravados contam como 0
+        UpdateMany(
+            {"points": None, "level_title": {"$ne": table.level_for(0)["title"]}},
+            {"$set": {"level_title": table.level_for(0)["title"]}}
+        )
+    ]
+    for lower, upper, title in bands:
+        points_range = {}
+        if lower is not None:
+            points_range["$gte"] = lower
+        if upper is not None:
+            points_range["$lt"] = upper
+        if not points_range:
+            points_range["$ne"] = None
+        operations.append(UpdateMany(
+            {"points": points_range, "level_title": {"$ne": title}},
+            {"$set": {"level_title": title}}
+        ))
+
+    result = await db.users.bulk_write(operations, ordered=False)
+    return {"levels": len(table.levels), "users_updated": result.modified_count}
+
+
+async def on_levels_changed():
+    """Após editar os níveis: relê aqui e agenda o recálculo para quando todos tiverem relido"""
+    table.invalidate()
+    await scheduler.run_soon(RECOMPUTE_JOB, REFRESH_SECONDS)
+
+
+@scheduler.every(int(os.environ.get('LEVELS_RECOMPUTE_INTERVAL_SECONDS', 24 * 3600)),
+                 name=RECOMPUTE_JOB, run_at_start=True)
+async def scheduled_recompute():
+    result = await recompute()
+    if result["users_updated"]:
+        logger.info("Níveis recalculados: %s", result)
+    return result
@@ -0,0 +1,199 @@
+"""
+Executor de migrações de dados versionadas (coleção schema_migrations)
+As migrações ficam em migrations/ (uma classe Migration por versão, em ordem) e rodam
+pelo script run_migrations.py. Cada versão tem um documento com status
+(running/applied/failed), estatísticas e checkpoints:
+- idempotentes: cada migração só seleciona documentos ainda no formato antigo
+- em lotes: percorre a coleção por _id e grava cada lote com um bulk_write
+- retomáveis: o último _id de cada etapa é salvo após cada lote; uma nova execução
+  continua dali (o lease em locked_until impede duas execuções simultâneas)
+- dry-run: percorre e conta o que seria alterado sem gravar nada
+
+Variáveis de ambiente:
+- MIGRATION_BATCH_SIZE (padrão 1000)
+"""
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+RUNNING = "running"
+APPLIED = "applied"
+FAILED = "failed"
+
+LEASE_SECONDS = 300
+
+Transform = Callable[[dict], Optional[dict]]
+BatchHandler = Callable[[List[dict]], Awaitable[int]]
+
+
+class MigrationLocked(Exception):
+    """Outra execução está aplicando a migração"""
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class Migration:
+    """Base das migrações: version (ordem), name e run(ctx)"""
+    version: int = 0
+    name: str = ""
+
+    async def run(self, ctx: "MigrationContext"):
+        raise NotImplementedError
+
+
+class MigrationContext:
+    """Estado de uma execução: checkpoints, estatísticas e modo dry-run"""
+
+    def __init__(self, migration: Migration, state: dict, dry_run: bool, batch_size: int):
+        self.migration = migration
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        # Dry-run sempre percorre tudo o que está pendente
+        self.checkpoints: Dict[str, object] = {} if dry_run else dict(state.get("checkpoints") or {})
+        self.stats: Dict[str, Dict[str, int]] = {} if dry_run else dict(state.get("stats") or {})
+
+    async def _save(self, step: str):
+        await db.schema_migrations.update_one(
+            {"version": self.migration.version},
+            {"$set": {
+                f"checkpoints.{step}": self.checkpoints[step],
+                f"stats.{step}": self.stats[step],
+                "locked_until": _now() + timedelta(seconds=LEASE_SECONDS)
+            }}
+        )
+
+    async def each_batch(self, collection: str, query: dict, handle: BatchHandler,
+                         step: str, projection: Optional[dict] = None) -> Dict[str, int]:
+        """
+        Chama handle(lote) -> documentos alterados para os documentos de `query`, em lotes
+        ordenados por _id, salvando o checkpoint após cada lote. `step` identifica a etapa
+        no documento da migração (sem pontos). Em dry-run, handle só deve contar.
+        """
+        stats = self.stats.setdefault(step, {"scanned": 0, "updated": 0, "skipped": 0})
+        while True:
+            batch_query = dict(query)
+            if self.checkpoints.get(step) is not None:
+                batch_query["_id"] = {"$gt": self.checkpoints[step]}
+            batch = await db[collection].find(batch_query, projection).sort("_id", 1).limit(
+                self.batch_size
+            ).to_list(self.batch_size)
+            if not batch:
+                break
+
+            updated = await handle(batch)
+            stats["scanned"] += len(batch)
+            stats["updated"] += updated
+            stats["skipped"] += len(batch) - updated
+            self.checkpoints[step] = batch[-1]["_id"]
+            if not self.dry_run:
+                await self._save(step)
+            if len(batch) < self.batch_size:
+                break
+        return stats
+
+    async def update_each(self, collection: str, query: dict, transform: Transform,
+                          step: str, projection: Optional[dict] = None) -> Dict[str, int]:
+        """Aplica transform(doc) -> campos do $set (ou None para ignorar) aos documentos de `query`"""
+        async def handle(batch: List[dict]) -> int:
+            operations = []
+            for document in batch:
+                changes = transform(document)
+                if changes:
+                    operations.append(UpdateOne({"_id": document["_id"]}, {"$set": changes}))
+            if operations and not self.dry_run:
+                await db[collection].bulk_write(operations, ordered=False)
+            return len(operations)
+
+        return await self.each_batch(collection, query, handle, step, projection)
+
+
+async def _claim(migration: Migration) -> dict:
+    """Marca a migração como em execução; MigrationLocked se outra execução a detém"""
+    try:
+        await db.schema_migrations.update_one(
+            {"version": migration.version},
+            {"$setOnInsert": {"version": migration.version, "status": None, "checkpoints": {}, "stats": {}},
+             "$set": {"name": migration.name}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        pass
+
+    now = _now()
+    state = await db.schema_migrations.find_one_and_update(
+        {"version": migration.version, "status": {"$ne": APPLIED}, "$or": [
+            {"status": {"$ne": RUNNING}},
+            {"locked_until": {"$lt": now}},
+        ]},
+        {"$set": {
+            "status": RUNNING,
+            "started_at": now,
+            "locked_until": now + timedelta(seconds=LEASE_SECONDS),
+            "error": None
+        }},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if state is None:
+        raise MigrationLocked(f"Migração {migration.version} ({migration.name}) em execução por outro processo")
+    return state
+
+
+async def run(migrations: List[Migration], dry_run: bool = False, target: Optional[int] = None,
+              batch_size: Optional[int] = None) -> List[dict]:
+    """Aplica, em ordem, as migrações pendentes até `target`; retorna o resultado de cada uma"""
+    batch_size = batch_size or int(os.environ.get('MIGRATION_BATCH_SIZE', 1000))
+    applied = {
+        state["version"]
+        async for state in db.schema_migrations.find({"status": APPLIED}, {"_id": 0, "version": 1})
+    }
+
+    results = []
+    for migration in sorted(migrations, key=lambda m: m.version):
+        if target is not None and migration.version > target:
+            break
+        if migration.version in applied:
+            continue
+
+        state = {} if dry_run else await _claim(migration)
+        ctx = MigrationContext(migration, state, dry_run, batch_size)
+        logger.info("Migração %s (%s)%s", migration.version, migration.name, " [dry-run]" if dry_run else "")
+        try:
+            await migration.run(ctx)
+        except Exception as e:
+            if not dry_run:
+                await db.schema_migrations.update_one(
+                    {"version": migration.version},
+                    {"$set": {"status": FAILED, "error": str(e), "locked_until": None}}
+                )
+            raise
+
+        if not dry_run:
+            await db.schema_migrations.update_one(
+                {"version": migration.version},
+                {"$set": {"status": APPLIED, "finished_at": _now(), "locked_until": None}}
+            )
+        results.append({"version": migration.version, "name": migration.name, "dry_run": dry_run, "stats": ctx.stats})
+    return results
+
+
+async def status(migrations: List[Migration]) -> List[dict]:
+    """Estado de cada migração conhecida (pendentes aparecem com status None)"""
+    states = {
+        state["version"]: state
+        async for state in db.schema_migrations.find({}, {"_id": 0, "checkpoints": 0})
+    }
+    return [
+        {"version": m.version, "name": m.name, "status": None, **states.get(m.version, {})}
+        for m in sorted(migrations, key=lambda m: m.version)
+    ]
@@ -0,0 +1,171 @@
+"""
+Materialização da conclusão de módulos por usuário (coleção user_module_progress)
+Uma linha por usuário x módulo com capítulos concluídos, total de capítulos e completed_at.
+
+Mantida incrementalmente por:
+- progress_routes.update_progress (capítulo concluído) -> refresh_user_module
+- criação/remoção de capítulos -> on_chapters_changed
+- remoção de módulo -> on_module_deleted
+e reconstruída do zero por rebuild() (script rebuild_module_progress.py).
+"""
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+from database import db
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+async def refresh_user_module(user_id: str, module_id: str) -> dict:
+    """
+    Recalcula a linha do usuário no módulo (2 contagens indexadas + 1 upsert).
+    Retorna a linha com o campo extra "newly_completed".
+    """
+    total = await db.chapters.count_documents({"module_id": module_id})
+    completed = await db.user_progress.count_documents({
+        "user_id": user_id,
+        "module_id": module_id,
+        "completed": True
+    })
+    is_completed = total > 0 and completed >= total
+    now = _now()
+
+    before = await db.user_module_progress.find_one_and_update(
+        {"user_id": user_id, "module_id": module_id},
+        [{"$set": {
+            "user_id": user_id,
+            "module_id": module_id,
+            "completed_chapters": completed,
+            "total_chapters": total,
+            "completed": is_completed,
+            "completed_at": {"$cond": [is_completed, {"$ifNull": ["$completed_at", now]}, None]},
+            "updated_at": now
+        }}],
+        upsert=True,
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE
+    )
+
+    was_completed = bool(before and before.get("completed"))
+    completed_at = None
+    if is_completed:
+        completed_at = before.get("completed_at") if was_completed else now
+
+    return {
+        "user_id": user_id,
+        "module_id": module_id,
+        "completed_chapters": completed,
+        "total_chapters": total,
+        "completed": is_completed,
+        "completed_at": completed_at,
+        "newly_completed": is_completed and not was_completed
+    }
+
+
+async def get_user_modules(user_id: str, module_ids: Optional[List[str]] = None) -> Dict[str, dict]:
+    """Linhas do usuário indexadas por module_id (1 consulta)"""
+    query = {"user_id": user_id}
+    if module_ids is not None:
+        query["module_id"] = {"$in": module_ids}
+    rows = await db.user_module_progress.find(query, {"_id": 0}).to_list(None)
+    return {row["module_id"]: row for row in rows}
+
+
+async def count_completed_modules(user_id: str) -> int:
+    return await db.user_module_progress.count_documents({"user_id": user_id, "completed": True})
+
+
+async def is_module_completed(user_id: str, module_id: str) -> bool:
+    row = await db.user_module_progress.find_one(
+        {"user_id": user_id, "module_id": module_id},
+        {"_id": 0, "completed": 1}
+    )
+    return bool(row and row.get("completed"))
+
+
+async def chapter_counts(module_ids: Optional[List[str]] = None) -> Dict[str, int]:
+    """Total de capítulos por módulo em uma única agregação"""
+    pipeline = []
+    if module_ids is not None:
+        pipeline.append({"$match": {"module_id": {"$in": module_ids}}})
+    pipeline.append({"$group": {"_id": "$module_id", "n": {"$sum": 1}}})
+    return {row["_id"]: row["n"] async for row in db.chapters.aggregate(pipeline)}
+
+
+async def on_chapters_changed(module_id: str):
+    """
+    Capítulo criado/removido: recalcula as linhas do módulo
+    (capítulos removidos já tiveram seu progresso apagado pelo chamador).
+    """
+    await rebuild(module_id)
+
+
+async def on_module_deleted(module_id: str):
+    await db.user_module_progress.delete_many({"module_id": module_id})
+
+
+async def rebuild(module_id: Optional[str] = None) -> int:
+    """
+    Reconstrói a materialização a partir de user_progress com uma agregação ($merge).
+    Requer o índice único user_module_progress(user_id, module_id) do registro de índices.
+    As linhas são substituídas no lugar (leitores nunca veem o escopo vazio); só depois
+    saem as que esta execução não gravou (updated_at anterior ao início), ou seja, usuários
+    sem capítulo concluído no escopo (equivale a 0 concluídos). Se o $merge falhar, as
+    linhas anteriores continuam lá.
+    Retorna o número de linhas do escopo reconstruído.
+    """
+    scope = {"module_id": module_id} if module_id else {}
+    match = {"completed": True, **scope}
+
+    now = _now()
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "module_id": "$module_id"},
+            "completed_chapters": {"$sum": 1},
+            "last_completed_at": {"$max": "$completed_at"}
+        }},
+        {"$lookup": {
+            "from": "chapters",
+            "localField": "_id.module_id",
+            "foreignField": "module_id",
+            "pipeline": [{"$count": "n"}],
+            "as": "chapters"
+        }},
+        {"$project": {
+            "_id": 0,
+            "user_id": "$_id.user_id",
+            "module_id": "$_id.module_id",
+            "completed_chapters": 1,
+            "total_chapters": {"$ifNull": [{"$first": "$chapters.n"}, 0]},
+            "last_completed_at": 1
+        }},
+        {"$set": {
+            "completed": {"$and": [
+                {"$gt": ["$total_chapters", 0]},
+                {"$gte": ["$completed_chapters", "$total_chapters"]}
+            ]},
+        }},
+        {"$set": {
+            "completed_at": {"$cond": ["$completed", "$last_completed_at", None]},
+            "updated_at": now
+        }},
+        {"$unset": "last_completed_at"},
+        {"$merge": {
+            "into": "user_module_progress",
+            "on": ["user_id", "module_id"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }}
+    ]
+
+    await db.user_progress.aggregate(pipeline).to_list(None)
+
+    # Linhas gravadas por refresh_user_module durante a execução têm updated_at posterior
+    await db.user_module_progress.delete_many({**scope, "updated_at": {"$not": {"$gte": now}}})
+
+    return await db.user_module_progress.count_documents(scope)
@@ -0,0 +1,55 @@
+"""
+Envio em tempo real das notificações pelo Socket.IO (sala user_{id})
+O evento "notification" leva a notificação criada, o delta de não lidas e o contador atual;
+com o client manager compartilhado (SOCKETIO_MANAGER) chega ao socket em qualquer processo.
+Clientes que reconectam recuperam o que perderam com GET /notifications/my?since=<created_at>
+(inclui os resumos atualizados depois disso).
+"""
+import logging
+from typing import List, Optional
+
+from database import db
+from services.chat_routing import user_room
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_EVENT = "notification"
+COUNT_EVENT = "notification_count"
+CATCH_UP_LIMIT = 50
+
+
+async def push(notification: dict, unread_count: Optional[int], unread_delta: Optional[int] = None):
+    """
+    Emite a notificação para o usuário; falhas de entrega não afetam a gravação.
+    Notificações atualizadas (resumos) vão com unread_delta=0 e substituem a anterior pelo id.
+    """
+    # Import tardio: socket_handler importa os serviços do chat
+    from socket_handler import sio
+
+    if unread_delta is None:
+        unread_delta = 0 if notification.get("read") else 1
+    payload = {"notification": notification, "unread_delta": unread_delta}
+    if unread_count is not None:
+        payload["unread_count"] = unread_count
+    try:
+        await sio.emit(NOTIFICATION_EVENT, payload, room=user_room(notification["user_id"]))
+    except Exception as e:
+        logger.error("Erro ao enviar notificação %s pelo socket: %s", notification.get("id"), e)
+
+
+async def push_count(user_id: str, unread_count: int):
+    """Atualiza o contador nos demais dispositivos após leitura/remoção"""
+    from socket_handler import sio
+
+    try:
+        await sio.emit(COUNT_EVENT, {"unread_count": unread_count}, room=user_room(user_id))
+    except Exception as e:
+        logger.error("Erro ao enviar contador de notificações pelo socket: %s", e)
+
+
+async def missed_since(user_id: str, since: str, limit: int = CATCH_UP_LIMIT) -> List[dict]:
+    """Notificações criadas ou atualizadas (resumos) depois de `since` (mais recentes primeiro)"""
+    return await db.notifications.find(
+        {"user_id": user_id, "$or": [{"created_at": {"$gt": since}}, {"updated_at": {"$gt": since}}]},
+        {"_id": 0}
+    ).sort("created_at", -1).limit(limit).to_list(limit)
@@ -3,31 +3,23 @@ Serviço de gateway de pagamento
 Gerencia configurações e transações com MercadoPago Checkout Pro
 """
 from typing import Dict, Any, Optional
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
+from database import db as shared_db
 from datetime import datetime
 
 from models_payment import (
     PaymentGateway, PaymentEnvironment, PaymentSettings, GatewayCredentials,
     Transaction, PaymentStatus
 )
+from services import timestamps
 
 
 class PaymentGatewayService:
     """Serviço principal de gateway de pagamento"""
     
-    def __init__(self):
-        self.mongo_url = os.environ.get('MONGO_URL')
-        self.db_name = os.environ.get('DB_NAME')
-        self._client = None
-        self._db = None
-    
     @property
     def db(self):
-        if self._db is None:
-            self._client = AsyncIOMotorClient(self.mongo_url)
-            self._db = self._client[self.db_name]
-        return self._db
+        # Usa o pool compartilhado do processo (database.provider)
+        return shared_db
     
     async def get_settings(self) -> PaymentSettings:
         """Obtém as configurações de pagamento"""
@@ -90,13 +82,13 @@ class PaymentGatewayService:
         """Atualiza o status de uma transação"""
         update_data = {
             "status": status,
-            "updated_at": datetime.now().isoformat()
+            "updated_at": timestamps.now()
         }
         
         if status in [PaymentStatus.APPROVED, PaymentStatus.PAID]:
-            update_data["paid_at"] = datetime.now().isoformat()
+            update_data["paid_at"] = timestamps.now()
         elif status == PaymentStatus.REFUNDED:
-            update_data["refunded_at"] = datetime.now().isoformat()
+            update_data["refunded_at"] = timestamps.now()
         
         if gateway_data:
             update_data["metadata"] = gateway_data
@@ -0,0 +1,385 @@
+"""
+Livro de pontos (coleções points_ledger e points_daily)
+Todo ganho ou ajuste de pontos passa por award() (ou award_many(), em lote), que:
+1. grava um lançamento imutável em points_ledger
+2. soma o valor no balde usuário x dia de points_daily (com role/supervisor_id/category_id
+   do dono, como em activity_rollups)
+3. atualiza users.points, que passa a ser um cache derivado do livro (e o ranking
+   e o nível, services/levels)
+
+Lançamentos com `key` (ex.: "badge:<id>") são únicos por usuário: reprocessar o mesmo
+prêmio (nova tentativa de um handler do event bus) não soma de novo, mas conclui o
+lançamento se a tentativa anterior falhou antes de aplicá-lo (applied=False).
+Rankings por período (semana, mês, intervalo) saem de uma agregação em points_daily.
+Lançamentos com `key` que ficaram sem aplicar e cuja nova tentativa não veio são
+concluídos pela tarefa agendada points.apply_pending; os sem `key` (ajustes manuais)
+não são reaplicados, porque quem chamou recebeu o erro e pode ter repetido o ajuste:
+a tarefa os informa no log e rebuild() os incorpora.
+rebuild() recalcula points_daily e users.points a partir do livro; exige a migração
+0002 (saldo de abertura dos pontos anteriores ao livro).
+"""
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from database import db
+from services import event_bus, leaderboard, levels, migrations, scheduler, timestamps
+
+logger = logging.getLogger(__name__)
+
+# Motivos dos lançamentos
+MODULE = "module"
+ASSESSMENT = "assessment"
+CHALLENGE = "challenge"
+BADGE = "badge"
+ADJUSTMENT = "adjustment"
+OPENING_BALANCE = "opening_balance"
+
+# Saldo de abertura fica num dia anterior a qualquer período consultado
+OPENING_DAY = "1970-01-01"
+OPENING_MIGRATION = 2
+
+OWNER_FIELDS = ("role", "supervisor_id", "category_id")
+
+PERIODS = ("week", "month", "custom")
+
+APPLY_PENDING_JOB = "points.apply_pending"
+# Lançamento não aplicado há mais tempo que isso é considerado abandonado pela tentativa
+PENDING_GRACE_SECONDS = 300
+
+
+def _day(moment: datetime) -> str:
+    return timestamps.local(moment).strftime("%Y-%m-%d")
+
+
+# ==================== LANÇAMENTOS ====================
+
+def _entry(user_id: str, amount: int, reason: str, key: Optional[str], ref: Optional[str],
+           now: datetime) -> dict:
+    entry = {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "amount": amount,
+        "reason": reason,
+        "ref": ref,
+        "day": _day(now),
+        "applied": False,
+        "created_at": now,
+    }
+    if key:
+        entry["key"] = key
+    return entry
+
+
+def _bucket_query(entry: dict) -> dict:
+    return {"user_id": entry["user_id"], "day": entry["day"], "points_pending": {"$ne": entry["id"]}}
+
+
+def _bucket_update(entry: dict, user: dict) -> dict:
+    return {
+        "$inc": {"points": entry["amount"]},
+        "$set": {field: user.get(field) for field in OWNER_FIELDS},
+        "$push": {"points_pending": entry["id"]}
+    }
+
+
+async def _add_to_bucket(entry: dict, user: dict):
+    """Soma o lançamento no balde do dia uma única vez (o id fica em points_pending)"""
+    try:
+        await db.points_daily.update_one(_bucket_query(entry), _bucket_update(entry, user), upsert=True)
+    except DuplicateKeyError:
+        # O balde já existe: ou outra escrita o criou agora, ou já recebeu este lançamento
+        await db.points_daily.update_one(_bucket_query(entry), _bucket_update(entry, user))
+
+
+async def _mark_applied(entries: List[dict]):
+    """Conclui os lançamentos e limpa os ids pendentes do usuário e do balde"""
+    await db.points_ledger.update_many(
+        {"id": {"$in": [entry["id"] for entry in entries]}}, {"$set": {"applied": True}}
+    )
+    by_user, by_bucket = {}, {}
+    for entry in entries:
+        by_user.setdefault(entry["user_id"], []).append(entry["id"])
+        by_bucket.setdefault((entry["user_id"], entry["day"]), []).append(entry["id"])
+    await db.users.bulk_write([
+        UpdateOne({"id": user_id}, {"$pull": {"points_pending": {"$in": ids}}})
+        for user_id, ids in by_user.items()
+    ], ordered=False)
+    await db.points_daily.bulk_write([
+        UpdateOne({"user_id": user_id, "day": day}, {"$pull": {"points_pending": {"$in": ids}}})
+        for (user_id, day), ids in by_bucket.items()
+    ], ordered=False)
+
+
+async def _unapplied(user_id: str, key: str) -> Optional[dict]:
+    """Lançamento com a chave que uma tentativa anterior gravou mas não concluiu"""
+    return await db.points_ledger.find_one({"user_id": user_id, "key": key, "applied": False}, {"_id": 0})
+
+
+async def award(user_id: str, amount: int, reason: str, key: Optional[str] = None,
+                ref: Optional[str] = None) -> Optional[int]:
+    """
+    Lança `amount` pontos para o usuário; retorna o novo total, ou None se não houve
+    lançamento (valor zero, usuário inexistente ou `key` já lançada)
+
+    Cada passo (users.points, balde do dia) é idempotente por lançamento e o lançamento
+    só fica `applied` depois de todos: uma nova tentativa com a mesma `key` conclui um
+    lançamento que a anterior gravou mas não aplicou (falha no meio).
+    """
+    if not amount:
+        return None
+    entry = _entry(user_id, amount, reason, key, ref, timestamps.now())
+    try:
+        await db.points_ledger.insert_one(entry)
+    except DuplicateKeyError:
+        entry = await _unapplied(user_id, key)
+        if entry is None:
+            return None
+
+    user = await _apply(entry)
+    return user.get("points", 0) if user else None
+
+
+async def _apply(entry: dict) -> Optional[dict]:
+    """Aplica um lançamento gravado (users.points, balde, nível, evento); None se o usuário não existe"""
+    user = await leaderboard.award_points(entry["user_id"], entry["amount"], entry["id"])
+    if user is None:
+        await db.points_ledger.delete_one({"id": entry["id"]})
+        return None
+    await _add_to_bucket(entry, user)
+    await _mark_applied([entry])
+    await levels.apply(user)
+    await event_bus.publish(
+        event_bus.POINTS_AWARDED,
+        {"user_id": entry["user_id"], "amount": entry["amount"], "reason": entry["reason"]}
+    )
+    return user
+
+
+async def award_many(awards: List[dict]) -> int:
+    """
+    award() em lote para itens {user_id, amount, reason, key?, ref?}: insert_many no livro e
+    bulk_write nos usuários e baldes, com os mesmos passos idempotentes. Itens com `key` já
+    lançada são ignorados (ou concluídos, se a tentativa anterior não os aplicou).
+    Retorna a quantidade de lançamentos feitos.
+    """
+    now = timestamps.now()
+    entries = [
+        _entry(item["user_id"], item["amount"], item["reason"], item.get("key"), item.get("ref"), now)
+        for item in awards if item["amount"]
+    ]
+    if not entries:
+        return 0
+
+    try:
+        await db.points_ledger.insert_many(entries, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != 11000 for error in errors):
+            raise
+        duplicated = {error["index"] for error in errors}
+        retried = [await _unapplied(entries[i]["user_id"], entries[i]["key"]) for i in sorted(duplicated)]
+        entries = [entry for i, entry in enumerate(entries) if i not in duplicated]
+        # A mesma chave repetida no lote aponta para um lançamento deste próprio lote
+        inserted = {entry["id"] for entry in entries}
+        entries += list({entry["id"]: entry for entry in retried if entry and entry["id"] not in inserted}.values())
+    if not entries:
+        return 0
+
+    users = await leaderboard.award_points_many(entries)
+    missing = [entry["id"] for entry in entries if entry["user_id"] not in users]
+    if missing:
+        await db.points_ledger.delete_many({"id": {"$in": missing}})
+    entries = [entry for entry in entries if entry["user_id"] in users]
+    if not entries:
+        return 0
+
+    try:
+        await db.points_daily.bulk_write([
+            UpdateOne(_bucket_query(entry), _bucket_update(entry, users[entry["user_id"]]), upsert=True)
+            for entry in entries
+        ], ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != 11000 for error in errors):
+            raise
+        for error in errors:
+            entry = entries[error["index"]]
+            await _add_to_bucket(entry, users[entry["user_id"]])
+    await _mark_applied(entries)
+
+    for user in users.values():
+        await levels.apply(user)
+    for entry in entries:
+        await event_bus.publish(
+            event_bus.POINTS_AWARDED,
+            {"user_id": entry["user_id"], "amount": entry["amount"], "reason": entry["reason"]}
+        )
+    return len(entries)
+
+
+async def set_balance(user_id: str, points: int, ref: Optional[str] = None) -> Optional[int]:
+    """Ajuste manual: lança a diferença entre o saldo atual e `points`"""
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "points": 1})
+    if user is None:
+        return None
+    delta = points - (user.get("points") or 0)
+    if not delta:
+        return points
+    return await award(user_id, delta, ADJUSTMENT, ref=ref)
+
+
+async def update_owner(user_id: str, role: Optional[str], supervisor_id: Optional[str],
+                       category_id: Optional[str]):
+    """Reflete a troca de perfil/supervisor/categoria do usuário nos baldes já gravados"""
+    await db.points_daily.update_many(
+        {"user_id": user_id},
+        {"$set": {"role": role, "supervisor_id": supervisor_id, "category_id": category_id}}
+    )
+
+
+# ==================== CONSULTAS ====================
+
+def period_range(period: str, start: Optional[str] = None, end: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Dias (YYYY-MM-DD, inclusivos) do período: semana atual (desde segunda), mês atual
+    ou intervalo informado. ValueError para período ou datas inválidos.
+    """
+    today = datetime.now()
+    if period == "week":
+        return (today - timedelta(days=today.weekday())).strftime("%Y-%m-%d"), today.strftime("%Y-%m-%d")
+    if period == "month":
+        return today.strftime("%Y-%m-01"), today.strftime("%Y-%m-%d")
+    if period == "custom" and start:
+        start_day = datetime.strptime(start[:10], "%Y-%m-%d").strftime("%Y-%m-%d")
+        end_day = datetime.strptime(end[:10], "%Y-%m-%d").strftime("%Y-%m-%d") if end else today.strftime("%Y-%m-%d")
+        if end_day < start_day:
+            raise ValueError("Data final anterior à inicial")
+        return start_day, end_day
+    raise ValueError(f"Período inválido. Opções: {', '.join(PERIODS)} (custom exige start)")
+
+
+async def window_leaderboard(start_day: str, end_day: str, scope: str = leaderboard.GLOBAL,
+                             limit: int = 100) -> List[dict]:
+    """[{user_id, points, position}] dos licenciados com mais pontos ganhos entre os dias"""
+    rows = await db.points_daily.aggregate([
+        {"$match": {
+            "role": "licenciado",
+            "day": {"$gte": start_day, "$lte": end_day},
+            **leaderboard.scope_filter(scope)
+        }},
+        {"$group": {"_id": "$user_id", "points": {"$sum": "$points"}}},
+        {"$match": {"points": {"$gt": 0}}},
+        {"$sort": {"points": -1, "_id": 1}},
+        {"$limit": limit}
+    ]).to_list(limit)
+
+    result = []
+    for i, row in enumerate(rows):
+        # Empates dividem a posição, como no ranking geral
+        tied = result and result[-1]["points"] == row["points"]
+        position = result[-1]["position"] if tied else i + 1
+        result.append({"user_id": row["_id"], "points": row["points"], "position": position})
+    return result
+
+
+async def points_between(user_id: str, start_day: str, end_day: str) -> int:
+    """Pontos ganhos pelo usuário entre os dias (inclusivos)"""
+    rows = await db.points_daily.aggregate([
+        {"$match": {"user_id": user_id, "day": {"$gte": start_day, "$lte": end_day}}},
+        {"$group": {"_id": None, "points": {"$sum": "$points"}}}
+    ]).to_list(1)
+    return rows[0]["points"] if rows else 0
+
+
+async def history(user_id: str, limit: int = 50) -> List[dict]:
+    """Últimos lançamentos do usuário"""
+    return await db.points_ledger.find(
+        {"user_id": user_id}, {"_id": 0}
+    ).sort("created_at", -1).limit(limit).to_list(limit)
+
+
+# ==================== RECÁLCULO ====================
+
+class OpeningBalanceMissing(Exception):
+    """Livro sem os saldos anteriores a ele (migração 0002 pendente)"""
+
+
+async def rebuild() -> dict:
+    """Recalcula points_daily e users.points a partir do livro"""
+    migration = await db.schema_migrations.find_one({"version": OPENING_MIGRATION}, {"_id": 0, "status": 1})
+    if not migration or migration.get("status") != migrations.APPLIED:
+        raise OpeningBalanceMissing("Aplique a migração 0002 (saldo de abertura) antes de recalcular os pontos")
+
+    rebuilt_at = datetime.now(timezone.utc)
+    # O recálculo conta todos os lançamentos do livro, inclusive os que ficaram sem aplicar,
+    # e descarta as marcas de aplicação em andamento
+    unapplied = await db.points_ledger.update_many({"applied": False}, {"$set": {"applied": True}})
+    await db.users.update_many({"points_pending.0": {"$exists": True}}, {"$set": {"points_pending": []}})
+    owners = {
+        user["id"]: user
+        async for user in db.users.find({}, {"_id": 0, "id": 1, "points": 1, **{f: 1 for f in OWNER_FIELDS}})
+    }
+
+    totals = {}
+    operations = []
+    async for row in db.points_ledger.aggregate([
+        {"$group": {"_id": {"user_id": "$user_id", "day": "$day"}, "points": {"$sum": "$amount"}}}
+    ], allowDiskUse=True):
+        user_id, day = row["_id"]["user_id"], row["_id"]["day"]
+        totals[user_id] = totals.get(user_id, 0) + row["points"]
+        owner = owners.get(user_id, {})
+        operations.append(UpdateOne(
+            {"user_id": user_id, "day": day},
+            {"$set": {"points": row["points"], "rebuilt_at": rebuilt_at, "points_pending": [],
+                      **{field: owner.get(field) for field in OWNER_FIELDS}}},
+            upsert=True
+        ))
+    for i in range(0, len(operations), 1000):
+        await db.points_daily.bulk_write(operations[i:i + 1000], ordered=False)
+    removed = await db.points_daily.delete_many({"rebuilt_at": {"$ne": rebuilt_at}})
+
+    corrected = 0
+    for user_id, user in owners.items():
+        if (user.get("points") or 0) != totals.get(user_id, 0):
+            await db.users.update_one({"id": user_id}, {"$set": {"points": totals.get(user_id, 0)}})
+            await leaderboard.touch(user_id)
+            corrected += 1
+    if corrected:
+        await levels.recompute()
+    return {
+        "buckets": len(operations),
+        "removed_buckets": removed.deleted_count,
+        "users_corrected": corrected,
+        "unapplied_entries": unapplied.modified_count,
+    }
+
+
+async def apply_pending() -> dict:
+    """
+    Conclui os lançamentos com `key` abandonados sem aplicar (nova tentativa que não veio)
+    e informa os sem `key`, que só rebuild() incorpora
+    """
+    cutoff = timestamps.now() - timedelta(seconds=PENDING_GRACE_SECONDS)
+    applied, unkeyed = 0, []
+    async for entry in db.points_ledger.find({"applied": False, "created_at": {"$lt": cutoff}}, {"_id": 0}):
+        if not entry.get("key"):
+            unkeyed.append(entry["id"])
+            continue
+        if await _apply(entry):
+            applied += 1
+    if unkeyed:
+        logger.warning(
+            "Lançamentos de pontos sem chave não aplicados: %s (verifique e rode POST /system/points/rebuild): %s",
+            len(unkeyed), unkeyed[:20]
+        )
+    return {"applied": applied, "unkeyed_unapplied": len(unkeyed)}
+
+
+@scheduler.every(PENDING_GRACE_SECONDS, name=APPLY_PENDING_JOB)
+async def scheduled_apply_pending():
+    return await apply_pending()
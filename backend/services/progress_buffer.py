@@ -0,0 +1,110 @@
+"""
+Buffer de coalescência dos heartbeats de progresso (watched_percentage)
+Mantém apenas o maior percentual por usuário x capítulo e grava tudo de uma vez
+(bulk_write com $max) a cada PROGRESS_FLUSH_INTERVAL_MS.
+Conclusões de capítulo não passam por aqui: seguem o caminho completo de progress_routes.
+
+Variáveis de ambiente:
+- PROGRESS_FLUSH_INTERVAL_MS (padrão 2000)
+- PROGRESS_BUFFER_MAX_PENDING (padrão 5000): acima disso o flush é antecipado
+"""
+import asyncio
+import logging
+import os
+import uuid
+from typing import Dict, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressBuffer:
+    def __init__(self):
+        self._pending: Dict[Tuple[str, str], dict] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.interval_ms = int(os.environ.get('PROGRESS_FLUSH_INTERVAL_MS', 2000))
+        self.max_pending = int(os.environ.get('PROGRESS_BUFFER_MAX_PENDING', 5000))
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def add(self, user_id: str, module_id: str, chapter_id: str, watched_percentage: float):
+        """Registra um heartbeat; só o maior percentual do par usuário x capítulo é mantido"""
+        key = (user_id, chapter_id)
+        entry = self._pending.get(key)
+        if entry is None:
+            self._pending[key] = {"module_id": module_id, "watched_percentage": watched_percentage}
+        elif watched_percentage > entry["watched_percentage"]:
+            entry["watched_percentage"] = watched_percentage
+
+        if len(self._pending) >= self.max_pending and self._wakeup is not None:
+            self._wakeup.set()
+
+    def take(self, user_id: str, chapter_id: str) -> Optional[float]:
+        """Remove e retorna o percentual pendente (usado antes de gravar uma conclusão)"""
+        entry = self._pending.pop((user_id, chapter_id), None)
+        return entry["watched_percentage"] if entry else None
+
+    async def flush(self) -> int:
+        """Grava os percentuais pendentes em um único bulk_write"""
+        if not self._pending:
+            return 0
+
+        batch, self._pending = self._pending, {}
+        operations = [
+            UpdateOne(
+                {"user_id": user_id, "chapter_id": chapter_id},
+                {
+                    "$max": {"watched_percentage": entry["watched_percentage"]},
+                    "$setOnInsert": {
+                        "id": str(uuid.uuid4()),
+                        "module_id": entry["module_id"],
+                        "completed": False,
+                        "completed_at": None
+                    }
+                },
+                upsert=True
+            )
+            for (user_id, chapter_id), entry in batch.items()
+        ]
+
+        try:
+            await db.user_progress.bulk_write(operations, ordered=False)
+        except Exception as e:
+            # Devolve ao buffer sem perder percentuais mais novos
+            logger.error("Erro ao gravar heartbeats de progresso (%s itens): %s", len(batch), e)
+            for (user_id, chapter_id), entry in batch.items():
+                self.add(user_id, entry["module_id"], chapter_id, entry["watched_percentage"])
+            return 0
+
+        return len(operations)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Para o loop e grava o que restou"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+
+buffer = ProgressBuffer()
@@ -0,0 +1,245 @@
+"""
+Exportação de relatórios em streaming (CSV e XLSX)
+Cada relatório é um cursor de agregação percorrido em lotes; as linhas são formatadas
+e enviadas conforme chegam, sem limite de linhas e com memória constante:
+- CSV: blocos de CSV_CHUNK_ROWS linhas codificados em UTF-8, o download começa na hora
+- XLSX: workbook write-only do openpyxl (as linhas vão para arquivo temporário);
+  o arquivo é salvo em disco e enviado em blocos ao final
+
+Supervisores exportam só os próprios licenciados; o admin exporta tudo.
+"""
+import asyncio
+import csv
+import io
+import tempfile
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+from database import db
+from services import timestamps
+from services.analytics_service import licensee_match
+
+CSV = "csv"
+XLSX = "xlsx"
+MEDIA_TYPES = {
+    CSV: "text/csv; charset=utf-8",
+    XLSX: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+CURSOR_BATCH_SIZE = 1000
+CSV_CHUNK_ROWS = 500
+XLSX_CHUNK_BYTES = 64 * 1024
+
+Row = Callable[[dict, dict], list]
+
+
+# ==================== FORMATAÇÃO ====================
+
+def _date(value) -> str:
+    moment = timestamps.local(value)
+    return moment.strftime("%Y-%m-%d") if moment else ""
+
+
+def _datetime(value) -> str:
+    moment = timestamps.local(value)
+    return moment.strftime("%Y-%m-%d %H:%M") if moment else ""
+
+
+def _yes_no(value) -> str:
+    return "Sim" if value else "Não"
+
+
+def _user(doc: dict, field: str) -> str:
+    return (doc.get("user") or {}).get(field, "")
+
+
+# ==================== RELATÓRIOS ====================
+
+class Report:
+    """
+    Relatório exportável. Sem `collection`, as linhas são os próprios licenciados;
+    com ela, cada documento da coleção (filtrado por `match`) ganha o campo user
+    {full_name, email} do dono (user_id).
+    """
+
+    def __init__(self, name: str, title: str, columns: List[str], row: Row,
+                 collection: Optional[str] = None, match: Optional[dict] = None,
+                 catalogs: tuple = (), admin_only: bool = False):
+        self.name = name
+        self.title = title
+        self.columns = columns
+        self.row = row
+        self.collection = collection
+        self.match = match or {}
+        self.catalogs = catalogs
+        self.admin_only = admin_only
+
+    def cursor(self, current_user: dict):
+        options = {"batchSize": CURSOR_BATCH_SIZE, "allowDiskUse": True}
+        if self.collection is None:
+            return db.users.aggregate([
+                {"$match": licensee_match(current_user)},
+                {"$sort": {"points": -1}},
+                {"$project": {"_id": 0, "password_hash": 0}}
+            ], **options)
+
+        if current_user.get("role") == "admin":
+            # Percorre a coleção inteira e busca o dono de cada documento
+            return db[self.collection].aggregate([
+                {"$match": self.match},
+                {"$sort": {"_id": 1}},
+                {"$lookup": {
+                    "from": "users",
+                    "localField": "user_id",
+                    "foreignField": "id",
+                    "pipeline": [{"$project": {"_id": 0, "full_name": 1, "email": 1}}],
+                    "as": "user"
+                }},
+                {"$set": {"user": {"$first": "$user"}}},
+                {"$project": {"_id": 0}}
+            ], **options)
+
+        # Supervisor: parte dos seus licenciados (índice supervisor_id/role)
+        return db.users.aggregate([
+            {"$match": licensee_match(current_user)},
+            {"$project": {"_id": 0, "id": 1, "full_name": 1, "email": 1}},
+            {"$lookup": {
+                "from": self.collection,
+                "localField": "id",
+                "foreignField": "user_id",
+                "pipeline": [{"$match": self.match}, {"$project": {"_id": 0}}],
+                "as": "row"
+            }},
+            {"$unwind": "$row"},
+            {"$set": {"row.user": {"full_name": "$full_name", "email": "$email"}}},
+            {"$replaceRoot": {"newRoot": "$row"}}
+        ], **options)
+
+
+async def _modules() -> Dict[str, dict]:
+    return {m["id"]: m async for m in db.modules.find({}, {"_id": 0, "id": 1, "title": 1})}
+
+
+async def _assessments() -> Dict[str, dict]:
+    return {a["id"]: a async for a in db.assessments.find({}, {"_id": 0, "id": 1, "title": 1, "module_id": 1})}
+
+
+async def _classes() -> Dict[str, dict]:
+    return {c["id"]: c async for c in db.training_classes_v2.find({}, {"_id": 0, "id": 1, "date": 1, "location": 1})}
+
+
+CATALOG_LOADERS = {"modules": _modules, "assessments": _assessments, "classes": _classes}
+
+
+def _assessment_module(doc: dict, catalogs: dict) -> str:
+    assessment = catalogs["assessments"].get(doc.get("assessment_id"), {})
+    return catalogs["modules"].get(assessment.get("module_id"), {}).get("title", "")
+
+
+REPORTS: Dict[str, Report] = {report.name: report for report in [
+    Report(
+        "licensees", "Licenciados",
+        ["Nome", "Email", "Pontos", "Nível", "Data Cadastro"],
+        lambda d, c: [d.get("full_name", ""), d.get("email", ""), d.get("points", 0),
+                      d.get("level_title", ""), _date(d.get("created_at"))]
+    ),
+    Report(
+        "progress", "Progresso por módulo",
+        ["Licenciado", "Email", "Módulo", "Capítulos concluídos", "Total de capítulos", "Concluído", "Concluído em"],
+        lambda d, c: [_user(d, "full_name"), _user(d, "email"),
+                      c["modules"].get(d.get("module_id"), {}).get("title", ""),
+                      d.get("completed_chapters", 0), d.get("total_chapters", 0),
+                      _yes_no(d.get("completed")), _datetime(d.get("completed_at"))],
+        collection="user_module_progress", catalogs=("modules",)
+    ),
+    Report(
+        "assessments", "Avaliações",
+        ["Licenciado", "Email", "Avaliação", "Módulo", "Pontuação", "Aprovado", "Realizada em"],
+        lambda d, c: [_user(d, "full_name"), _user(d, "email"),
+                      c["assessments"].get(d.get("assessment_id"), {}).get("title", ""),
+                      _assessment_module(d, c), d.get("score", 0),
+                      _yes_no(d.get("passed")), _datetime(d.get("completed_at"))],
+        collection="user_assessments", catalogs=("modules", "assessments")
+    ),
+    Report(
+        "training_registrations", "Inscrições no treinamento",
+        ["Licenciado", "Email", "Turma", "Local", "Valor", "Pagamento", "Presença", "Inscrito em"],
+        lambda d, c: [_user(d, "full_name") or (d.get("personal_data") or {}).get("full_name", ""),
+                      _user(d, "email"),
+                      c["classes"].get(d.get("class_id"), {}).get("date", ""),
+                      c["classes"].get(d.get("class_id"), {}).get("location", ""),
+                      d.get("price", 0), d.get("payment_status", ""),
+                      d.get("attendance_status") or "", _datetime(d.get("created_at"))],
+        collection="training_registrations", catalogs=("classes",)
+    ),
+    Report(
+        "transactions", "Transações",
+        ["Usuário", "Email", "Finalidade", "Gateway", "Método", "Valor", "Status", "Criada em", "Paga em"],
+        lambda d, c: [_user(d, "full_name"), _user(d, "email"), d.get("purpose", ""),
+                      d.get("gateway", ""), d.get("payment_method", ""), d.get("amount", 0),
+                      d.get("status", ""), _datetime(d.get("created_at")), _datetime(d.get("paid_at"))],
+        collection="transactions", admin_only=True
+    ),
+]}
+
+
+def get_report(name: str) -> Optional[Report]:
+    return REPORTS.get(name)
+
+
+# ==================== STREAMING ====================
+
+async def _load_catalogs(report: Report) -> dict:
+    return {name: await CATALOG_LOADERS[name]() for name in report.catalogs}
+
+
+async def _csv_chunks(report: Report, current_user: dict) -> AsyncIterator[bytes]:
+    catalogs = await _load_catalogs(report)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(report.columns)
+
+    pending = 1
+    async for doc in report.cursor(current_user):
+        writer.writerow(report.row(doc, catalogs))
+        pending += 1
+        if pending >= CSV_CHUNK_ROWS:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+    if pending:
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _xlsx_value(value):
+    if isinstance(value, str):
+        return ILLEGAL_CHARACTERS_RE.sub("", value)
+    return value
+
+
+async def _xlsx_chunks(report: Report, current_user: dict) -> AsyncIterator[bytes]:
+    catalogs = await _load_catalogs(report)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(report.title[:31])
+    sheet.append(report.columns)
+    async for doc in report.cursor(current_user):
+        sheet.append([_xlsx_value(value) for value in report.row(doc, catalogs)])
+
+    with tempfile.TemporaryFile() as output:
+        # Compactação do arquivo fora do event loop
+        await asyncio.to_thread(workbook.save, output)
+        output.seek(0)
+        while True:
+            chunk = await asyncio.to_thread(output.read, XLSX_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+
+
+def stream(report: Report, current_user: dict, file_format: str) -> AsyncIterator[bytes]:
+    if file_format == XLSX:
+        return _xlsx_chunks(report, current_user)
+    return _csv_chunks(report, current_user)
@@ -0,0 +1,137 @@
+"""
+Tarefas periódicas com execução única entre processos (coleção scheduled_jobs)
+Cada tarefa tem um documento com next_run_at; o processo que consegue avançar next_run_at
+(find_one_and_update condicional) executa aquela rodada, os demais a ignoram.
+Se o processo cair no meio, a tarefa simplesmente roda de novo no próximo intervalo.
+
+Variáveis de ambiente:
+- SCHEDULER_ENABLED (padrão true)
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# Frequência com que cada processo verifica se há tarefa vencida
+TICK_SECONDS = 15
+
+Job = Callable[[], Awaitable[object]]
+_jobs: Dict[str, dict] = {}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def every(seconds: int, name: Optional[str] = None, run_at_start: bool = False):
+    """Decorator que registra uma tarefa periódica"""
+    def decorator(func: Job) -> Job:
+        job_name = name or f"{func.__module__}.{func.__name__}"
+        _jobs[job_name] = {"func": func, "interval": seconds, "run_at_start": run_at_start}
+        return func
+    return decorator
+
+
+async def _claim(name: str, interval: int) -> bool:
+    """Avança next_run_at da tarefa se ela venceu; True se este processo ganhou a rodada"""
+    now = _now()
+    claimed = await db.scheduled_jobs.find_one_and_update(
+        {"id": name, "next_run_at": {"$lte": now}},
+        {"$set": {"next_run_at": now + timedelta(seconds=interval), "last_started_at": now}},
+        projection={"_id": 0, "id": 1}
+    )
+    return claimed is not None
+
+
+async def _register(name: str, interval: int, run_at_start: bool):
+    first_run = _now() if run_at_start else _now() + timedelta(seconds=interval)
+    try:
+        await db.scheduled_jobs.update_one(
+            {"id": name},
+            {"$setOnInsert": {"id": name, "next_run_at": first_run}, "$set": {"interval_seconds": interval}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        pass
+
+
+async def run_job(name: str) -> object:
+    """Executa a tarefa agora (independente do agendamento) e registra o resultado"""
+    job = _jobs[name]
+    started = _now()
+    try:
+        result = await job["func"]()
+    except Exception as e:
+        logger.error("Tarefa agendada %s falhou: %s", name, e)
+        await db.scheduled_jobs.update_one(
+            {"id": name}, {"$set": {"last_error": str(e), "last_finished_at": _now()}}
+        )
+        raise
+    await db.scheduled_jobs.update_one(
+        {"id": name},
+        {"$set": {
+            "last_error": None,
+            "last_finished_at": _now(),
+            "last_duration_ms": int((_now() - started).total_seconds() * 1000)
+        }}
+    )
+    return result
+
+
+async def run_soon(name: str, delay_seconds: int = 0):
+    """Antecipa a próxima rodada da tarefa (executada por qualquer processo) para daqui a delay_seconds"""
+    await db.scheduled_jobs.update_one(
+        {"id": name},
+        {"$min": {"next_run_at": _now() + timedelta(seconds=delay_seconds)}}
+    )
+
+
+class Scheduler:
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None and os.environ.get('SCHEDULER_ENABLED', 'true').lower() == 'true':
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        try:
+            for name, job in _jobs.items():
+                await _register(name, job["interval"], job["run_at_start"])
+        except Exception as e:
+            logger.error("Agendador: erro ao registrar tarefas: %s", e)
+
+        while True:
+            for name, job in _jobs.items():
+                try:
+                    claimed = await _claim(name, job["interval"])
+                except Exception as e:
+                    logger.error("Agendador: erro ao verificar a tarefa %s: %s", name, e)
+                    continue
+                if claimed:
+                    try:
+                        await run_job(name)
+                    except Exception:
+                        # Erro já registrado por run_job; segue para as demais tarefas
+                        pass
+            await asyncio.sleep(TICK_SECONDS)
+
+
+scheduler = Scheduler()
+
+
+async def job_status() -> List[dict]:
+    return await db.scheduled_jobs.find({}, {"_id": 0}).sort("id", 1).to_list(None)
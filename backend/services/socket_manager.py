@@ -0,0 +1,129 @@
+"""
+Gerenciador de clientes do Socket.IO compartilhado entre processos
+Com SOCKETIO_MANAGER=redis ou mongo, emissões para salas (admins, user_{id}) e entradas/saídas
+de salas são repassadas a todos os processos, então o backend pode rodar com vários workers.
+O backend "mongo" usa uma coleção capped lida por cursor tailable (funciona em um mongod
+standalone, sem replica set).
+
+Variáveis de ambiente:
+- SOCKETIO_MANAGER: "local" (padrão, um único processo), "redis" ou "mongo"
+- SOCKETIO_CHANNEL (padrão "uniozoxx")
+- SOCKETIO_REDIS_URL (padrão redis://localhost:6379/0; requer o pacote redis)
+- SOCKETIO_MONGO_COLLECTION (padrão socketio_pubsub)
+- SOCKETIO_MONGO_CAPPED_BYTES (padrão 16 MB)
+"""
+import asyncio
+import logging
+import os
+import pickle
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import socketio
+from socketio.async_pubsub_manager import AsyncPubSubManager
+from bson import Binary
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+import database
+
+logger = logging.getLogger(__name__)
+
+# Janela relida ao recriar o cursor (tolerância a relógios diferentes entre processos)
+RESUME_WINDOW_SECONDS = 2
+RETRY_MAX_SECONDS = 30
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class MongoPubSubManager(AsyncPubSubManager):
+    """Pub/sub do Socket.IO sobre uma coleção capped do MongoDB"""
+
+    name = 'mongo'
+
+    def __init__(self, collection: str = 'socketio_pubsub', channel: str = 'socketio',
+                 size_bytes: int = 16 * 1024 * 1024, write_only: bool = False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.collection_name = collection
+        self.size_bytes = size_bytes
+        self._ready = False
+
+    async def _collection(self):
+        if not self._ready:
+            try:
+                await database.provider.database.create_collection(
+                    self.collection_name, capped=True, size=self.size_bytes
+                )
+                # Cursor tailable em coleção vazia morre na hora: semeia com um registro neutro
+                await database.db[self.collection_name].insert_one({"channel": None, "created_at": _now()})
+            except CollectionInvalid:
+                pass
+            self._ready = True
+        return database.db[self.collection_name]
+
+    async def _publish(self, data):
+        document = {"channel": self.channel, "data": Binary(pickle.dumps(data)), "created_at": _now()}
+        for attempt in range(2):
+            try:
+                collection = await self._collection()
+                return await collection.insert_one(document)
+            except PyMongoError as e:
+                self._get_logger().error('Socket.IO: falha ao publicar no MongoDB (tentativa %s): %s',
+                                         attempt + 1, e)
+
+    async def _listen(self):
+        since = _now()
+        # _ids já entregues desde `since`, para não repetir mensagens ao recriar o cursor
+        seen = deque(maxlen=5000)
+        seen_set = set()
+        retry_sleep = 1
+
+        while True:
+            try:
+                collection = await self._collection()
+                cursor = collection.find(
+                    {"channel": self.channel, "created_at": {"$gte": since - timedelta(seconds=RESUME_WINDOW_SECONDS)}},
+                    cursor_type=CursorType.TAILABLE_AWAIT
+                )
+                while cursor.alive:
+                    async for document in cursor:
+                        retry_sleep = 1
+                        if document["_id"] in seen_set:
+                            continue
+                        if len(seen) == seen.maxlen:
+                            seen_set.discard(seen[0])
+                        seen.append(document["_id"])
+                        seen_set.add(document["_id"])
+                        since = max(since, document["created_at"].replace(tzinfo=timezone.utc))
+                        yield document["data"]
+                # Cursor encerrado pelo servidor (ex.: sem documentos no filtro): recria
+                await asyncio.sleep(1)
+            except PyMongoError as e:
+                self._get_logger().error('Socket.IO: erro lendo do MongoDB, nova tentativa em %ss: %s',
+                                         retry_sleep, e)
+                await asyncio.sleep(retry_sleep)
+                retry_sleep = min(retry_sleep * 2, RETRY_MAX_SECONDS)
+
+
+def create_client_manager() -> Optional[socketio.AsyncManager]:
+    """Client manager configurado em SOCKETIO_MANAGER (None = gerenciador local padrão)"""
+    kind = os.environ.get('SOCKETIO_MANAGER', 'local').lower()
+    channel = os.environ.get('SOCKETIO_CHANNEL', 'uniozoxx')
+
+    if kind == 'redis':
+        url = os.environ.get('SOCKETIO_REDIS_URL', 'redis://localhost:6379/0')
+        logger.info("Socket.IO usando Redis (%s, canal %s)", url, channel)
+        return socketio.AsyncRedisManager(url, channel=channel)
+
+    if kind == 'mongo':
+        logger.info("Socket.IO usando MongoDB (canal %s)", channel)
+        return MongoPubSubManager(
+            collection=os.environ.get('SOCKETIO_MONGO_COLLECTION', 'socketio_pubsub'),
+            channel=channel,
+            size_bytes=int(os.environ.get('SOCKETIO_MONGO_CAPPED_BYTES', 16 * 1024 * 1024))
+        )
+
+    return None
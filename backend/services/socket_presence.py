@@ -0,0 +1,118 @@
+"""
+Registro compartilhado de conexões Socket.IO e presença (coleção socket_connections)
+Cada processo grava as conexões que atende com seu HOST_ID e renova last_seen periodicamente;
+conexões de um processo que morreu deixam de contar após PRESENCE_TTL_SECONDS e são
+apagadas pelo índice TTL.
+
+Variáveis de ambiente:
+- SOCKET_PRESENCE_TTL_SECONDS (padrão 90)
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+HOST_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+PRESENCE_TTL_SECONDS = int(os.environ.get('SOCKET_PRESENCE_TTL_SECONDS', 90))
+HEARTBEAT_SECONDS = max(PRESENCE_TTL_SECONDS // 3, 5)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def register(sid: str, user_id: str, role: str):
+    now = _now()
+    await db.socket_connections.update_one(
+        {"sid": sid},
+        {"$set": {
+            "sid": sid,
+            "user_id": user_id,
+            "role": role,
+            "host_id": HOST_ID,
+            "connected_at": now,
+            "last_seen": now
+        }},
+        upsert=True
+    )
+
+
+async def unregister(sid: str):
+    await db.socket_connections.delete_one({"sid": sid})
+
+
+def _alive() -> dict:
+    return {"last_seen": {"$gte": _now() - timedelta(seconds=PRESENCE_TTL_SECONDS)}}
+
+
+async def get_connection(sid: str) -> Optional[dict]:
+    return await db.socket_connections.find_one({"sid": sid, **_alive()}, {"_id": 0})
+
+
+async def online_user_ids(user_ids: Optional[List[str]] = None) -> List[str]:
+    """Usuários com ao menos uma conexão ativa em qualquer processo"""
+    query = _alive()
+    if user_ids is not None:
+        query["user_id"] = {"$in": user_ids}
+    return await db.socket_connections.distinct("user_id", query)
+
+
+async def is_online(user_id: str) -> bool:
+    return await db.socket_connections.count_documents({"user_id": user_id, **_alive()}, limit=1) > 0
+
+
+async def stats() -> Dict[str, object]:
+    """Conexões ativas por processo e total de usuários online"""
+    by_host = {
+        row["_id"]: row["n"]
+        async for row in db.socket_connections.aggregate([
+            {"$match": _alive()},
+            {"$group": {"_id": "$host_id", "n": {"$sum": 1}}}
+        ])
+    }
+    return {
+        "host_id": HOST_ID,
+        "connections": sum(by_host.values()),
+        "users_online": len(await online_user_ids()),
+        "by_host": by_host
+    }
+
+
+class PresenceHeartbeat:
+    """Renova last_seen das conexões deste processo; remove-as ao encerrar"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await db.socket_connections.delete_many({"host_id": HOST_ID})
+        except Exception as e:
+            logger.error("Presença: erro ao remover conexões do processo: %s", e)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            try:
+                await db.socket_connections.update_many({"host_id": HOST_ID}, {"$set": {"last_seen": _now()}})
+            except Exception as e:
+                logger.error("Presença: erro ao renovar conexões: %s", e)
+
+
+heartbeat = PresenceHeartbeat()
@@ -0,0 +1,71 @@
+"""
+Timestamps como datas BSON, com leitura dos dois formatos durante a migração
+Os campos convertidos pela migração 0001 (migrations/m0001_timestamps_to_dates.py) passam
+a ser gravados como datetime UTC; documentos ainda não migrados guardam strings ISO.
+- parse()/local(): normalizam qualquer um dos formatos para datetime com fuso
+- DateTime: tipo dos modelos pydantic que aceita os dois formatos (sempre com fuso)
+- range_query(): filtro por faixa que casa os dois formatos, cada ramo usando o índice
+  do campo (datas e strings não se comparam entre si no MongoDB)
+
+Strings ISO sem fuso foram gravadas com datetime.now() e são horário local do servidor;
+datetimes sem fuso vêm do driver e são UTC.
+"""
+from datetime import date, datetime, timezone
+from typing import Annotated, Optional, Union
+
+from pydantic import BeforeValidator
+
+Timestamp = Union[datetime, str]
+
+
+def now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def parse(value: Optional[Timestamp]) -> Optional[datetime]:
+    """datetime (UTC) a partir de datetime, date ou string ISO; None se vazio ou inválido"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day).astimezone(timezone.utc)
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.astimezone()
+    return parsed.astimezone(timezone.utc)
+
+
+def _validate(value):
+    # Valores inválidos seguem adiante para o pydantic rejeitar
+    return parse(value) or value
+
+
+DateTime = Annotated[datetime, BeforeValidator(_validate)]
+
+
+def local(value: Optional[Timestamp]) -> Optional[datetime]:
+    """Mesmo instante no fuso do servidor (o dos relatórios por dia/hora)"""
+    parsed = parse(value)
+    return parsed.astimezone() if parsed else None
+
+
+def range_query(field: str, start: Optional[Timestamp] = None, end: Optional[Timestamp] = None,
+                end_inclusive: bool = True) -> dict:
+    """
+    Filtro field em [start, end] para os dois formatos.
+    Strings recebidas são comparadas como antes com os documentos legados.
+    """
+    upper = "$lte" if end_inclusive else "$lt"
+    as_date, as_string = {}, {}
+    for op, bound in (("$gte", start), (upper, end)):
+        if bound is None:
+            continue
+        as_date[op] = parse(bound)
+        as_string[op] = bound if isinstance(bound, str) else parse(bound).isoformat()
+    if not as_date:
+        return {}
+    return {"$or": [{field: as_date}, {field: as_string}]}
@@ -0,0 +1,87 @@
+"""
+Envio de lotes de tradução ao backend (LLM) em blocos limitados por tokens
+Cada bloco vira um prompt próprio, executado com concorrência limitada por um semáforo
+compartilhado pelo processo. Um bloco que falha devolve traduções vazias (não memorizadas,
+o texto original é exibido) sem afetar os demais; só quando todos falham o erro sobe.
+
+Variáveis de ambiente:
+- TRANSLATION_CHUNK_TOKENS (padrão 1500): orçamento estimado de tokens por bloco
+- TRANSLATION_CHUNK_MAX_TEXTS (padrão 50): máximo de textos por bloco
+- TRANSLATION_CONCURRENCY (padrão 4): blocos em andamento ao mesmo tempo no processo
+"""
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+Translator = Callable[[List[str], str, str], Awaitable[List[str]]]
+
+# Tokens extras por texto (marcador "[n] " e quebra de linha)
+ITEM_OVERHEAD_TOKENS = 4
+
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa conservadora (~4 caracteres por token)"""
+    return len(text) // 4 + 1 + ITEM_OVERHEAD_TOKENS
+
+
+def chunk_texts(texts: List[str], max_tokens: Optional[int] = None,
+                max_texts: Optional[int] = None) -> List[List[str]]:
+    """
+    Divide os textos, na ordem, em blocos dentro do orçamento.
+    Um texto maior que o orçamento vai sozinho em seu bloco.
+    """
+    max_tokens = max_tokens or int(os.environ.get('TRANSLATION_CHUNK_TOKENS', 1500))
+    max_texts = max_texts or int(os.environ.get('TRANSLATION_CHUNK_MAX_TEXTS', 50))
+
+    chunks: List[List[str]] = []
+    current: List[str] = []
+    current_tokens = 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_texts):
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(int(os.environ.get('TRANSLATION_CONCURRENCY', 4)))
+    return _semaphore
+
+
+async def translate_in_chunks(texts: List[str], source_language: str, target_language: str,
+                              translator: Translator) -> List[str]:
+    """Traduz em blocos paralelos; o resultado mantém a ordem e o tamanho de `texts`"""
+    chunks = chunk_texts(texts)
+    semaphore = get_semaphore()
+
+    async def run(chunk: List[str]) -> List[str]:
+        async with semaphore:
+            return await translator(chunk, source_language, target_language)
+
+    results = await asyncio.gather(*[run(chunk) for chunk in chunks], return_exceptions=True)
+
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors and len(errors) == len(results):
+        raise errors[0]
+
+    translations: List[str] = []
+    for chunk, result in zip(chunks, results):
+        if isinstance(result, BaseException):
+            logger.warning("Bloco de %s textos (%s -> %s) falhou: %s",
+                           len(chunk), source_language, target_language, result)
+            translations += [""] * len(chunk)
+        else:
+            translations += list(result)[:len(chunk)] + [""] * (len(chunk) - len(result))
+    return translations
@@ -0,0 +1,221 @@
+"""
+Memória de traduções (coleção translation_memory) com LRU em processo na frente
+Chave: SHA-256 de (idioma de origem, idioma de destino, texto normalizado).
+Só os textos ausentes da memória vão ao tradutor (LLM); textos já em tradução por outra
+requisição do processo aguardam o mesmo resultado (singleflight) em vez de gerar outra chamada.
+
+Variáveis de ambiente:
+- TRANSLATION_LRU_SIZE (padrão 20000 entradas)
+- TRANSLATION_WARM_LANGUAGES (padrão "en,es"): idiomas pré-aquecidos ao salvar conteúdo
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from database import db
+from services import event_bus
+
+logger = logging.getLogger(__name__)
+
+Translator = Callable[[List[str], str, str], Awaitable[List[str]]]
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Campos exibidos como texto único na interface (conteúdo longo é traduzido sob demanda)
+WARM_FIELDS = ("title", "description")
+WARM_BATCH_SIZE = 50
+
+
+def normalize(text: str) -> str:
+    """Forma canônica do texto: NFC, sem espaços nas pontas e com espaços internos colapsados"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def memory_key(source_language: str, target_language: str, normalized: str) -> str:
+    raw = f"{source_language}\x1f{target_language}\x1f{normalized}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def warm_languages() -> List[str]:
+    return [lang.strip() for lang in os.environ.get('TRANSLATION_WARM_LANGUAGES', 'en,es').split(",") if lang.strip()]
+
+
+class TranslationLRU:
+    """LRU simples (OrderedDict) chave -> tradução"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: "OrderedDict[str, str]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: str):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+lru = TranslationLRU(int(os.environ.get('TRANSLATION_LRU_SIZE', 20000)))
+
+# Traduções em andamento no processo: chave -> future com a tradução ("" se falhou)
+_inflight: Dict[str, "asyncio.Future[str]"] = {}
+
+
+async def lookup(keys: List[str]) -> Dict[str, str]:
+    """Traduções conhecidas das chaves: LRU primeiro, depois uma consulta na coleção"""
+    found: Dict[str, str] = {}
+    missing = []
+    for key in keys:
+        value = lru.get(key)
+        if value is not None:
+            found[key] = value
+        else:
+            missing.append(key)
+
+    if missing:
+        async for row in db.translation_memory.find(
+            {"key": {"$in": missing}}, {"_id": 0, "key": 1, "translation": 1}
+        ):
+            found[row["key"]] = row["translation"]
+            lru.put(row["key"], row["translation"])
+
+    return found
+
+
+async def store(source_language: str, target_language: str, entries: Dict[str, str]):
+    """Grava pares texto normalizado -> tradução (upsert em lote)"""
+    if not entries:
+        return
+
+    now = datetime.now().isoformat()
+    operations = []
+    for text, translation in entries.items():
+        key = memory_key(source_language, target_language, text)
+        lru.put(key, translation)
+        operations.append(UpdateOne(
+            {"key": key},
+            {
+                "$set": {"translation": translation, "updated_at": now},
+                "$setOnInsert": {
+                    "key": key,
+                    "source_language": source_language,
+                    "target_language": target_language,
+                    "text": text,
+                    "created_at": now
+                }
+            },
+            upsert=True
+        ))
+
+    await db.translation_memory.bulk_write(operations, ordered=False)
+
+
+async def _translate_misses(misses: List[str], source_language: str, target_language: str,
+                            translator: Translator) -> Dict[str, str]:
+    """
+    Traduz textos fora da memória com singleflight por chave: o que outra requisição já está
+    traduzindo é aguardado, o restante vai ao tradutor e fica visível para as próximas.
+    """
+    loop = asyncio.get_running_loop()
+    waiting: Dict[str, "asyncio.Future[str]"] = {}
+    owned: Dict[str, "asyncio.Future[str]"] = {}
+    for text in misses:
+        key = memory_key(source_language, target_language, text)
+        future = _inflight.get(key)
+        if future is None:
+            future = loop.create_future()
+            _inflight[key] = future
+            owned[text] = future
+        else:
+            waiting[key] = future
+
+    results: Dict[str, str] = {}
+    if owned:
+        texts = list(owned)
+        try:
+            translated = await translator(texts, source_language, target_language)
+            learned = {text: result for text, result in zip(texts, translated) if result}
+            await store(source_language, target_language, learned)
+        except BaseException:
+            # Quem aguarda recebe "" (texto original); o erro só sobe para o dono da chamada
+            for future in owned.values():
+                if not future.done():
+                    future.set_result("")
+            raise
+        finally:
+            for text in texts:
+                _inflight.pop(memory_key(source_language, target_language, text), None)
+
+        for text, future in owned.items():
+            result = learned.get(text, "")
+            future.set_result(result)
+            if result:
+                results[memory_key(source_language, target_language, text)] = result
+
+    for key, future in waiting.items():
+        # shield: o cancelamento de quem aguarda não cancela o future compartilhado
+        result = await asyncio.shield(future)
+        if result:
+            results[key] = result
+
+    return results
+
+
+async def translate(texts: List[str], source_language: str, target_language: str,
+                    translator: Translator) -> List[str]:
+    """
+    Traduz usando a memória; textos desconhecidos (sem repetição) vão ao tradutor em um lote.
+    Traduções vazias não são memorizadas e o texto original é devolvido no lugar.
+    """
+    normalized = [normalize(text) for text in texts]
+    keys = [memory_key(source_language, target_language, text) for text in normalized]
+    known = await lookup(keys)
+
+    misses = list(dict.fromkeys(
+        text for text, key in zip(normalized, keys) if key not in known and text
+    ))
+
+    if misses:
+        known.update(await _translate_misses(misses, source_language, target_language, translator))
+
+    return [known.get(key, original) for key, original in zip(keys, texts)]
+
+
+async def warm(texts: List[str], translator: Translator, source_language: str = "pt-BR"):
+    """Pré-aquece a memória para os idiomas de TRANSLATION_WARM_LANGUAGES"""
+    texts = [text for text in texts if text and normalize(text)]
+    if not texts:
+        return
+    for target_language in warm_languages():
+        if target_language != source_language:
+            await translate(texts, source_language, target_language, translator)
+
+
+async def schedule_warm(*documents: dict):
+    """Publica o pré-aquecimento dos campos traduzíveis de conteúdos recém-salvos"""
+    texts = [doc.get(field) for doc in documents for field in WARM_FIELDS]
+    texts = list(dict.fromkeys(text for text in texts if isinstance(text, str) and normalize(text)))
+    for start in range(0, len(texts), WARM_BATCH_SIZE):
+        await event_bus.publish(event_bus.CONTENT_SAVED, {
+            "texts": texts[start:start + WARM_BATCH_SIZE],
+            "source_language": "pt-BR"
+        })
@@ -0,0 +1,155 @@
+"""
+Contadores de não lidas mantidos atomicamente (coleção unread_counters)
+Um documento por usuário ({id: user_id, notifications, chat}) e um documento da equipe
+(id "staff", chat = conversas com mensagens não lidas pela equipe).
+Os contadores por conversa ficam na própria conversa: unread_count (lado da equipe)
+e user_unread_count (lado do dono).
+
+Atualizados com $inc na criação/leitura/remoção; reconcile() recalcula tudo a partir
+dos dados e corrige qualquer deriva (tarefa agendada e POST /system/unread/reconcile).
+
+Variáveis de ambiente:
+- UNREAD_RECONCILE_INTERVAL_SECONDS (padrão 3600)
+"""
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from pymongo import ReturnDocument, UpdateOne
+
+from database import db
+from services import scheduler
+from services.chat_routing import STAFF_ROLES
+
+logger = logging.getLogger(__name__)
+
+STAFF_KEY = "staff"
+NOTIFICATIONS = "notifications"
+CHAT = "chat"
+
+
+async def incr(key: str, field: str, amount: int = 1) -> int:
+    """Aplica o incremento e retorna o novo valor do contador"""
+    if not amount:
+        return (await get(key))[field]
+    counters = await db.unread_counters.find_one_and_update(
+        {"id": key},
+        {"$inc": {field: amount}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+        projection={"_id": 0, field: 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return max(counters.get(field, 0), 0)
+
+
+async def get(key: str) -> Dict[str, int]:
+    counters = await db.unread_counters.find_one({"id": key}, {"_id": 0}) or {}
+    return {
+        NOTIFICATIONS: max(counters.get(NOTIFICATIONS, 0), 0),
+        CHAT: max(counters.get(CHAT, 0), 0),
+    }
+
+
+async def incr_many(keys: List[str], field: str, amount: int = 1):
+    """Mesmo incremento para vários contadores em um único bulk_write"""
+    if not keys or not amount:
+        return
+    now = datetime.now(timezone.utc)
+    await db.unread_counters.bulk_write([
+        UpdateOne({"id": key}, {"$inc": {field: amount}, "$set": {"updated_at": now}}, upsert=True)
+        for key in keys
+    ], ordered=False)
+
+
+async def get_many(keys: List[str]) -> Dict[str, Dict[str, int]]:
+    rows = await db.unread_counters.find({"id": {"$in": keys}}, {"_id": 0}).to_list(None)
+    return {
+        row["id"]: {NOTIFICATIONS: max(row.get(NOTIFICATIONS, 0), 0), CHAT: max(row.get(CHAT, 0), 0)}
+        for row in rows
+    }
+
+
+# ==================== RECONCILIAÇÃO ====================
+
+def _unread_messages_lookup(reader_watermark: str, sender_match: dict) -> dict:
+    """$lookup que conta mensagens depois da marca d'água (ou read=False em conversas sem marca)"""
+    return {
+        "$lookup": {
+            "from": "messages",
+            "let": {"cid": "$id", "w": f"$read_watermarks.{reader_watermark}"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$conversation_id", "$$cid"]}, **sender_match}},
+                {"$match": {"$expr": {"$cond": [
+                    {"$eq": [{"$ifNull": ["$$w", None]}, None]},
+                    {"$eq": ["$read", False]},
+                    {"$gt": ["$created_at", "$$w"]}
+                ]}}},
+                {"$count": "n"}
+            ],
+            "as": f"unread_{reader_watermark}"
+        }
+    }
+
+
+async def reconcile() -> dict:
+    """Recalcula os contadores por conversa e por usuário; retorna quantos foram corrigidos"""
+    staff_roles = list(STAFF_ROLES)
+
+    # Conversas: recontagem a partir das mensagens e marcas d'água
+    conversations = await db.conversations.aggregate([
+        _unread_messages_lookup("staff", {"sender_role": {"$nin": staff_roles}}),
+        _unread_messages_lookup("user", {"sender_role": {"$in": staff_roles}}),
+        {"$project": {
+            "_id": 0, "id": 1, "user_id": 1,
+            "unread_count": {"$ifNull": ["$unread_count", 0]},
+            "user_unread_count": {"$ifNull": ["$user_unread_count", 0]},
+            "staff_actual": {"$ifNull": [{"$first": "$unread_staff.n"}, 0]},
+            "user_actual": {"$ifNull": [{"$first": "$unread_user.n"}, 0]},
+        }}
+    ]).to_list(None)
+
+    conversation_fixes = [
+        UpdateOne({"id": c["id"]}, {"$set": {"unread_count": c["staff_actual"], "user_unread_count": c["user_actual"]}})
+        for c in conversations
+        if c["unread_count"] != c["staff_actual"] or c["user_unread_count"] != c["user_actual"]
+    ]
+    if conversation_fixes:
+        await db.conversations.bulk_write(conversation_fixes, ordered=False)
+
+    # Usuários: soma das conversas + notificações não lidas
+    expected: Dict[str, Dict[str, int]] = {}
+    for c in conversations:
+        if c["user_actual"]:
+            expected.setdefault(c["user_id"], {NOTIFICATIONS: 0, CHAT: 0})[CHAT] += c["user_actual"]
+    async for row in db.notifications.aggregate([
+        {"$match": {"read": False}},
+        {"$group": {"_id": "$user_id", "n": {"$sum": 1}}}
+    ]):
+        expected.setdefault(row["_id"], {NOTIFICATIONS: 0, CHAT: 0})[NOTIFICATIONS] = row["n"]
+    expected[STAFF_KEY] = {NOTIFICATIONS: 0, CHAT: sum(1 for c in conversations if c["staff_actual"] > 0)}
+
+    current = {
+        row["id"]: row
+        async for row in db.unread_counters.find({}, {"_id": 0, "id": 1, NOTIFICATIONS: 1, CHAT: 1})
+    }
+    now = datetime.now(timezone.utc)
+    counter_fixes = []
+    for key in set(expected) | set(current):
+        values = expected.get(key, {NOTIFICATIONS: 0, CHAT: 0})
+        row = current.get(key, {})
+        if row.get(NOTIFICATIONS, 0) != values[NOTIFICATIONS] or row.get(CHAT, 0) != values[CHAT]:
+            counter_fixes.append(UpdateOne({"id": key}, {"$set": {**values, "updated_at": now}}, upsert=True))
+    if counter_fixes:
+        await db.unread_counters.bulk_write(counter_fixes, ordered=False)
+
+    if conversation_fixes or counter_fixes:
+        logger.warning("Contadores de não lidas corrigidos: %s conversas, %s usuários",
+                       len(conversation_fixes), len(counter_fixes))
+    return {"conversations_fixed": len(conversation_fixes), "counters_fixed": len(counter_fixes)}
+
+
+@scheduler.every(int(os.environ.get('UNREAD_RECONCILE_INTERVAL_SECONDS', 3600)), name="unread_counters.reconcile",
+                 run_at_start=True)
+async def scheduled_reconcile():
+    return await reconcile()
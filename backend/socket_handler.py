@@ -1,23 +1,23 @@
 import socketio
 import os
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
 from datetime import datetime
 import jwt
+from services import chat_messages, chat_routing, socket_presence
+from services.socket_manager import create_client_manager
 
 # Criar servidor Socket.IO com CORS configurado
+# O client manager (SOCKETIO_MANAGER) repassa emissões para salas a todos os processos
 sio = socketio.AsyncServer(
     async_mode='asgi',
+    client_manager=create_client_manager(),
     cors_allowed_origins='*',
     logger=True,
     engineio_logger=True
 )
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
-# Armazenar conexões ativas
-active_connections = {}
+# A identidade de cada conexão (user_id, role, full_name) fica na sessão do socket,
+# resolvida uma vez no connect; o registro compartilhado fica em socket_presence
 
 async def verify_token(token: str):
     """Verifica o token JWT"""
@@ -49,46 +49,62 @@ async def connect(sid, environ, auth):
         await sio.disconnect(sid)
         return False
     
-    # Armazenar conexão
+    # Armazenar identidade na sessão
     user_id = user_data.get('sub')
     user_role = user_data.get('role')
     
-    active_connections[sid] = {
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "full_name": 1})
+    if not user:
+        print(f"Usuário {user_id} não encontrado para {sid}")
+        await sio.disconnect(sid)
+        return False
+    
+    await sio.save_session(sid, {
         'user_id': user_id,
-        'role': user_role
-    }
+        'role': user_role,
+        'full_name': user.get('full_name', '')
+    })
+    await socket_presence.register(sid, user_id, user_role)
     
     print(f"Usuário autenticado: {user_id} (role: {user_role})")
     
     # Se for admin/supervisor, adicionar à sala de admins
-    if user_role in ['admin', 'supervisor']:
-        await sio.enter_room(sid, 'admins')
+    if user_role in chat_routing.STAFF_ROLES:
+        await sio.enter_room(sid, chat_routing.ADMIN_ROOM)
         print(f"Admin/Supervisor {user_id} entrou na sala de admins")
     
     # Adicionar usuário à sua própria sala
-    await sio.enter_room(sid, f"user_{user_id}")
+    await sio.enter_room(sid, chat_routing.user_room(user_id))
     
     return True
 
+
+async def get_identity(sid):
+    """Identidade salva no connect (None se a conexão não foi autenticada)"""
+    try:
+        session = await sio.get_session(sid)
+    except KeyError:
+        return None
+    return session if session.get('user_id') else None
+
 @sio.event
 async def disconnect(sid):
     """Evento de desconexão"""
     print(f"Cliente desconectado: {sid}")
-    if sid in active_connections:
-        del active_connections[sid]
+    await socket_presence.unregister(sid)
 
 @sio.event
 async def send_message(sid, data):
-    """Evento de envio de mensagem"""
+    """Evento de envio de mensagem (só o insert da mensagem e o update da conversa)"""
     print(f"Mensagem recebida de {sid}: {data}")
     
-    if sid not in active_connections:
+    identity = await get_identity(sid)
+    if not identity:
         print(f"Conexão não autenticada: {sid}")
         return
     
-    connection_data = active_connections[sid]
-    user_id = connection_data['user_id']
-    user_role = connection_data['role']
+    user_id = identity['user_id']
+    user_role = identity['role']
     
     try:
         conversation_id = data.get('conversation_id')
@@ -98,16 +114,14 @@ async def send_message(sid, data):
             await sio.emit('error', {'message': 'Dados inválidos'}, room=sid)
             return
         
-        # Buscar informações do usuário
-        user = await db.users.find_one({"id": user_id}, {"_id": 0})
-        if not user:
-            await sio.emit('error', {'message': 'Usuário não encontrado'}, room=sid)
+        # Dono da conversa (cache de roteamento)
+        route = await chat_routing.get_route(conversation_id)
+        if not route:
+            await sio.emit('error', {'message': 'Conversa não encontrada'}, room=sid)
             return
         
-        # Buscar conversa
-        conversation = await db.conversations.find_one({"id": conversation_id}, {"_id": 0})
-        if not conversation:
-            await sio.emit('error', {'message': 'Conversa não encontrada'}, room=sid)
+        if not chat_routing.can_access(route, user_id, user_role):
+            await sio.emit('error', {'message': 'Acesso negado'}, room=sid)
             return
         
         # Criar mensagem
@@ -115,32 +129,13 @@ async def send_message(sid, data):
         message = Message(
             conversation_id=conversation_id,
             sender_id=user_id,
-            sender_name=user["full_name"],
+            sender_name=identity['full_name'],
             sender_role=user_role,
             message=message_text
         )
         
-        await db.messages.insert_one(message.model_dump())
-        
-        # Atualizar conversa
-        update_data = {
-            "last_message": message_text[:100],
-            "last_message_at": message.created_at
-        }
-        
-        if user_role in ["admin", "supervisor"]:
-            await db.conversations.update_one(
-                {"id": conversation_id},
-                {"$set": update_data}
-            )
-        else:
-            await db.conversations.update_one(
-                {"id": conversation_id},
-                {
-                    "$set": update_data,
-                    "$inc": {"unread_count": 1}
-                }
-            )
+        # Grava a mensagem, atualiza a conversa e os contadores de não lidas
+        await chat_messages.save_message(message.model_dump())
         
         # Preparar mensagem para emitir
         message_data = message.model_dump()
@@ -148,22 +143,23 @@ async def send_message(sid, data):
         # Emitir para o remetente
         await sio.emit('new_message', message_data, room=sid)
         
-        # Emitir para o destinatário apropriado
-        if user_role in ["admin", "supervisor"]:
-            # Admin/Supervisor enviou, notificar o usuário
-            target_user_id = conversation["user_id"]
-            await sio.emit('new_message', message_data, room=f"user_{target_user_id}")
-        else:
-            # Usuário enviou, notificar todos os admins
-            await sio.emit('new_message', message_data, room='admins')
-            
+        # Emitir para o destinatário apropriado (dono da conversa ou admins)
+        await sio.emit('new_message', message_data, room=chat_routing.target_room(route, user_role))
+        
+        if user_role not in chat_routing.STAFF_ROLES:
             # Criar notificação para admins
             from routes.notification_routes import notify_admins
             await notify_admins(
                 "Nova mensagem de suporte",
-                f"{user['full_name']} enviou uma mensagem: {message_text[:50]}...",
+                f"{identity['full_name']} enviou uma mensagem: {message_text[:50]}...",
                 "chat_message",
-                conversation_id
+                conversation_id,
+                digest={
+                    "key": f"chat:{conversation_id}",
+                    "title": "Novas mensagens de suporte",
+                    "message": f"{{count}} novas mensagens de {identity['full_name']}"
+                },
+                key=f"chat_message:{message.id}"
             )
         
         print(f"Mensagem enviada com sucesso: {message.id}")
@@ -174,21 +170,20 @@ async def send_message(sid, data):
 
 @sio.event
 async def typing(sid, data):
-    """Evento de digitação"""
-    if sid not in active_connections:
+    """Evento de digitação (sessão + cache de roteamento, sem consulta ao banco)"""
+    identity = await get_identity(sid)
+    if not identity:
         return
     
-    connection_data = active_connections[sid]
-    user_id = connection_data['user_id']
-    user_role = connection_data['role']
+    user_id = identity['user_id']
+    user_role = identity['role']
     conversation_id = data.get('conversation_id')
     
     if not conversation_id:
         return
     
-    # Buscar conversa
-    conversation = await db.conversations.find_one({"id": conversation_id}, {"_id": 0})
-    if not conversation:
+    route = await chat_routing.get_route(conversation_id)
+    if not route or not chat_routing.can_access(route, user_id, user_role):
         return
     
     typing_data = {
@@ -198,51 +193,25 @@ async def typing(sid, data):
     }
     
     # Notificar o destinatário
-    if user_role in ["admin", "supervisor"]:
-        target_user_id = conversation["user_id"]
-        await sio.emit('user_typing', typing_data, room=f"user_{target_user_id}")
-    else:
-        await sio.emit('user_typing', typing_data, room='admins')
+    await sio.emit('user_typing', typing_data, room=chat_routing.target_room(route, user_role))
 
 @sio.event
 async def mark_as_read(sid, data):
-    """Marca mensagens como lidas"""
-    if sid not in active_connections:
+    """Marca a conversa como lida até a última mensagem (marca d'água do lado de quem leu)"""
+    identity = await get_identity(sid)
+    if not identity:
         return
     
-    connection_data = active_connections[sid]
-    user_role = connection_data['role']
     conversation_id = data.get('conversation_id')
-    
     if not conversation_id:
         return
     
     try:
-        if user_role in ["admin", "supervisor"]:
-            # Admin/supervisor marcando como lidas as mensagens do usuário
-            await db.messages.update_many(
-                {
-                    "conversation_id": conversation_id,
-                    "sender_role": {"$ne": user_role},
-                    "read": False
-                },
-                {"$set": {"read": True}}
-            )
-            await db.conversations.update_one(
-                {"id": conversation_id},
-                {"$set": {"unread_count": 0}}
-            )
-        else:
-            # Usuário marcando como lidas as mensagens do admin
-            await db.messages.update_many(
-                {
-                    "conversation_id": conversation_id,
-                    "sender_role": {"$in": ["admin", "supervisor"]},
-                    "read": False
-                },
-                {"$set": {"read": True}}
-            )
+        route = await chat_routing.get_route(conversation_id)
+        if not route or not chat_routing.can_access(route, identity['user_id'], identity['role']):
+            return
         
-        await sio.emit('messages_read', {'conversation_id': conversation_id}, room=sid)
+        read_at = await chat_messages.mark_read(conversation_id, identity['role'])
+        await sio.emit('messages_read', {'conversation_id': conversation_id, 'read_at': read_at}, room=sid)
     except Exception as e:
         print(f"Erro ao marcar mensagens como lidas: {e}")
@@ -4,10 +4,13 @@ module.exports = {
       name: 'uniozoxx-backend',
       cwd: './backend',
       script: 'uvicorn',
-      args: 'server:app --host 0.0.0.0 --port 8001',
+      // Vários workers do uvicorn: o Socket.IO compartilha salas e presença via MongoDB.
+      // Sem sessão fixa entre workers, o cliente (ChatContext) conecta só por WebSocket
+      args: 'server:app --host 0.0.0.0 --port 8001 --workers 4',
       interpreter: 'python3',
       env: {
-        NODE_ENV: 'production'
+        NODE_ENV: 'production',
+        SOCKETIO_MANAGER: 'mongo'
       },
       instances: 1,
       autorestart: true,
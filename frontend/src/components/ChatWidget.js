@@ -15,7 +15,9 @@ const ChatWidget = () => {
     sendMessage,
     sendTyping,
     openChat,
-    closeChat
+    closeChat,
+    loadOlderMessages,
+    hasOlderMessages
   } = useChat();
 
   const [messageText, setMessageText] = useState('');
@@ -28,9 +30,11 @@ const ChatWidget = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   };
 
+  // Só rola quando chega uma mensagem nova (não ao carregar as anteriores)
+  const lastMessageId = messages[messages.length - 1]?.id;
   useEffect(() => {
     scrollToBottom();
-  }, [messages]);
+  }, [lastMessageId]);
 
   // Foco no input quando abrir
   useEffect(() => {
@@ -132,6 +136,16 @@ const ChatWidget = () => {
               </div>
             ) : (
               <>
+                {hasOlderMessages && (
+                  <div className="flex justify-center">
+                    <button
+                      onClick={loadOlderMessages}
+                      className="text-xs text-cyan-600 hover:text-cyan-700 font-medium"
+                    >
+                      Carregar mensagens anteriores
+                    </button>
+                  </div>
+                )}
                 {messages.map((message) => {
                   const isOwn = message.sender_id === user?.id;
                   return (
@@ -1,8 +1,17 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import axios from 'axios';
 import { Bell, Check, Trash2, X } from 'lucide-react';
 import { Button } from './ui/button';
 import { toast } from 'sonner';
+import { useChat } from '../contexts/ChatContext';
+
+const MAX_NOTIFICATIONS = 50;
+
+// Junta notificações novas às atuais, sem repetir, mais recentes primeiro
+const mergeNotifications = (incoming, current) => {
+  const seen = new Set(incoming.map((n) => n.id));
+  return [...incoming, ...current.filter((n) => !seen.has(n.id))].slice(0, MAX_NOTIFICATIONS);
+};
 
 const NotificationBell = () => {
   const [notifications, setNotifications] = useState([]);
@@ -10,20 +19,64 @@ const NotificationBell = () => {
   const [showPanel, setShowPanel] = useState(false);
   const [loading, setLoading] = useState(false);
 
+  const { socket, connected } = useChat();
+  // created_at da notificação mais recente recebida (cursor de reconexão)
+  const lastSeenRef = useRef(null);
+
   const API_URL = process.env.REACT_APP_BACKEND_URL;
 
   useEffect(() => {
     fetchNotifications();
-    // Poll for new notifications every 30 seconds
+  }, []);
+
+  // Sem socket conectado, volta ao polling
+  useEffect(() => {
+    if (connected) return;
     const interval = setInterval(fetchNotifications, 30000);
     return () => clearInterval(interval);
-  }, []);
+  }, [connected]);
+
+  // Notificações em tempo real; ao (re)conectar, busca só o que chegou desde a última vista
+  useEffect(() => {
+    if (!socket) return;
+
+    const handleNotification = ({ notification, unread_count, unread_delta }) => {
+      setNotifications((prev) => mergeNotifications([notification], prev));
+      // Resumos atualizados não trazem o contador, só o delta (0)
+      if (unread_count !== undefined) {
+        setUnreadCount(unread_count);
+      } else if (unread_delta) {
+        setUnreadCount((prev) => prev + unread_delta);
+      }
+      const seenAt = notification.updated_at || notification.created_at;
+      if (!lastSeenRef.current || seenAt > lastSeenRef.current) {
+        lastSeenRef.current = seenAt;
+      }
+    };
+    const handleCount = ({ unread_count }) => setUnreadCount(unread_count);
+    const handleConnect = () => fetchNotifications(lastSeenRef.current);
+
+    socket.on('notification', handleNotification);
+    socket.on('notification_count', handleCount);
+    socket.on('connect', handleConnect);
+    return () => {
+      socket.off('notification', handleNotification);
+      socket.off('notification_count', handleCount);
+      socket.off('connect', handleConnect);
+    };
+  }, [socket]);
 
-  const fetchNotifications = async () => {
+  const fetchNotifications = async (since = null) => {
     try {
-      const response = await axios.get(`${API_URL}/api/notifications/my`);
-      setNotifications(response.data.notifications);
+      const response = await axios.get(`${API_URL}/api/notifications/my`, {
+        params: since ? { since } : {}
+      });
+      const received = response.data.notifications;
+      setNotifications((prev) => (since ? mergeNotifications(received, prev) : received));
       setUnreadCount(response.data.unread_count);
+      if (received.length > 0 && (!lastSeenRef.current || received[0].created_at > lastSeenRef.current)) {
+        lastSeenRef.current = received[0].created_at;
+      }
     } catch (error) {
       console.error('Erro ao buscar notificações:', error);
     }
@@ -5,6 +5,8 @@ import { useAuth } from './AuthContext';
 
 const ChatContext = createContext();
 
+const MESSAGES_PAGE_SIZE = 50;
+
 export const useChat = () => {
   const context = useContext(ChatContext);
   if (!context) {
@@ -22,6 +24,7 @@ export const ChatProvider = ({ children }) => {
   const [unreadCount, setUnreadCount] = useState(0);
   const [isTyping, setIsTyping] = useState(false);
   const [isChatOpen, setIsChatOpen] = useState(false);
+  const [hasOlderMessages, setHasOlderMessages] = useState(false);
 
   const API_URL = process.env.REACT_APP_BACKEND_URL;
   const SOCKET_URL = process.env.REACT_APP_BACKEND_URL || 'http://localhost:8001';
@@ -36,7 +39,10 @@ export const ChatProvider = ({ children }) => {
         auth: {
           token: token
         },
-        transports: ['websocket', 'polling'],
+        // Só WebSocket: o backend roda vários workers do uvicorn na mesma porta, sem sessão
+        // fixa, e o long-polling mandaria cada requisição da sessão para um worker diferente
+        transports: ['websocket'],
+        upgrade: false,
         reconnection: true,
         reconnectionDelay: 1000,
         reconnectionAttempts: 5
@@ -108,15 +114,33 @@ export const ChatProvider = ({ children }) => {
 
     try {
       const response = await axios.get(
-        `${API_URL}/api/chat/conversations/${conversationId}/messages`
+        `${API_URL}/api/chat/conversations/${conversationId}/messages`,
+        { params: { limit: MESSAGES_PAGE_SIZE } }
       );
       setMessages(response.data);
+      setHasOlderMessages(response.data.length === MESSAGES_PAGE_SIZE);
       setUnreadCount(0);
     } catch (error) {
       console.error('Erro ao carregar mensagens:', error);
     }
   }, [API_URL]);
 
+  // Carregar mensagens anteriores (cursor: a mais antiga já carregada)
+  const loadOlderMessages = useCallback(async () => {
+    if (!conversation || messages.length === 0) return;
+
+    try {
+      const response = await axios.get(
+        `${API_URL}/api/chat/conversations/${conversation.id}/messages`,
+        { params: { before: messages[0].id, limit: MESSAGES_PAGE_SIZE } }
+      );
+      setMessages((prev) => [...response.data, ...prev]);
+      setHasOlderMessages(response.data.length === MESSAGES_PAGE_SIZE);
+    } catch (error) {
+      console.error('Erro ao carregar mensagens anteriores:', error);
+    }
+  }, [API_URL, conversation, messages]);
+
   // Enviar mensagem
   const sendMessage = useCallback((message) => {
     if (!socket || !connected || !conversation) {
@@ -204,6 +228,8 @@ export const ChatProvider = ({ children }) => {
     closeChat,
     getOrCreateConversation,
     loadMessages,
+    loadOlderMessages,
+    hasOlderMessages,
     fetchUnreadCount
   };
 
@@ -103,11 +103,14 @@ const ChapterView = () => {
 
   const saveProgress = async (percentage, completed) => {
     try {
-      await axios.post(`${API_URL}/api/progress/update`, {
-        chapter_id: chapterId,
-        module_id: moduleId,
-        completed: completed,
-        watched_percentage: Math.round(percentage)
+      // Heartbeat: gravado em lote pelo servidor (conclusão usa /progress/update)
+      await axios.post(`${API_URL}/api/progress/heartbeat`, {
+        heartbeats: [{
+          chapter_id: chapterId,
+          module_id: moduleId,
+          completed: completed,
+          watched_percentage: Math.round(percentage)
+        }]
       });
     } catch (error) {
       console.error('Erro ao salvar progresso:', error.response?.data);
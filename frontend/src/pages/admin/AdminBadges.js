@@ -12,6 +12,9 @@ const CRITERIA_TYPES = [
   { value: 'all_modules', label: 'Todos os Módulos Completos' },
   { value: 'points_reached', label: 'Alcançar X Pontos' },
   { value: 'days_streak', label: 'Streak de X Dias' },
+  { value: 'chapters_completed', label: 'X Capítulos Completos' },
+  { value: 'assessments_passed', label: 'X Avaliações Aprovadas' },
+  { value: 'certificates_earned', label: 'X Certificados' },
   { value: 'manual', label: 'Concedido Manualmente' },
 ];
 
@@ -396,7 +399,7 @@ const AdminBadges = () => {
                   </select>
                 </div>
 
-                {['modules_completed', 'points_reached', 'days_streak'].includes(formData.criteria_type) && (
+                {['modules_completed', 'points_reached', 'days_streak', 'chapters_completed', 'assessments_passed', 'certificates_earned'].includes(formData.criteria_type) && (
                   <div>
                     <label className="block text-sm font-medium text-slate-700 mb-1">
                       Valor do Critério
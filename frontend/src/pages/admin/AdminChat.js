@@ -7,6 +7,8 @@ import { MessageCircle, Send, Users, Clock, CheckCheck } from 'lucide-react';
 import { format, formatDistanceToNow } from 'date-fns';
 import { ptBR } from 'date-fns/locale';
 
+const MESSAGES_PAGE_SIZE = 50;
+
 const AdminChat = () => {
   const { user } = useAuth();
   const { socket, connected, sendMessage, sendTyping } = useChat();
@@ -17,6 +19,7 @@ const AdminChat = () => {
   const [loading, setLoading] = useState(true);
   const [isTyping, setIsTyping] = useState(false);
   const [typingTimeout, setTypingTimeout] = useState(null);
+  const [hasOlderMessages, setHasOlderMessages] = useState(false);
   const messagesEndRef = useRef(null);
   const inputRef = useRef(null);
 
@@ -55,10 +58,11 @@ const AdminChat = () => {
     }
   }, [socket, connected, selectedConversation]);
 
-  // Auto scroll
+  // Auto scroll (só quando chega uma mensagem nova, não ao carregar as anteriores)
+  const lastMessageId = messages[messages.length - 1]?.id;
   useEffect(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
-  }, [messages]);
+  }, [lastMessageId]);
 
   const fetchConversations = async () => {
     try {
@@ -74,9 +78,11 @@ const AdminChat = () => {
   const loadMessages = async (conversation) => {
     try {
       const response = await axios.get(
-        `${API_URL}/api/chat/conversations/${conversation.id}/messages`
+        `${API_URL}/api/chat/conversations/${conversation.id}/messages`,
+        { params: { limit: MESSAGES_PAGE_SIZE } }
       );
       setMessages(response.data);
+      setHasOlderMessages(response.data.length === MESSAGES_PAGE_SIZE);
       setSelectedConversation(conversation);
       
       // Marcar como lida
@@ -91,6 +97,21 @@ const AdminChat = () => {
     }
   };
 
+  const loadOlderMessages = async () => {
+    if (!selectedConversation || messages.length === 0) return;
+
+    try {
+      const response = await axios.get(
+        `${API_URL}/api/chat/conversations/${selectedConversation.id}/messages`,
+        { params: { before: messages[0].id, limit: MESSAGES_PAGE_SIZE } }
+      );
+      setMessages((prev) => [...response.data, ...prev]);
+      setHasOlderMessages(response.data.length === MESSAGES_PAGE_SIZE);
+    } catch (error) {
+      console.error('Erro ao carregar mensagens anteriores:', error);
+    }
+  };
+
   const markAsRead = (conversationId) => {
     if (socket && connected) {
       socket.emit('mark_as_read', { conversation_id: conversationId });
@@ -224,6 +245,16 @@ const AdminChat = () => {
 
                 {/* Mensagens */}
                 <div className="flex-1 overflow-y-auto p-6 space-y-4 bg-slate-50">
+                  {hasOlderMessages && (
+                    <div className="flex justify-center">
+                      <button
+                        onClick={loadOlderMessages}
+                        className="text-xs text-cyan-600 hover:text-cyan-700 font-medium"
+                      >
+                        Carregar mensagens anteriores
+                      </button>
+                    </div>
+                  )}
                   {messages.map((message) => {
                     const isOwn = message.sender_id === user?.id;
                     return (
@@ -8,10 +8,25 @@ import {
 } from 'lucide-react';
 import { Button } from '../../components/ui/button';
 import { Card, CardContent, CardHeader, CardTitle } from '../../components/ui/card';
+import {
+  DropdownMenu,
+  DropdownMenuContent,
+  DropdownMenuItem,
+  DropdownMenuLabel,
+  DropdownMenuTrigger,
+} from '../../components/ui/dropdown-menu';
 import { toast } from 'sonner';
 
 const API_URL = process.env.REACT_APP_BACKEND_URL;
 
+// Relatórios exportáveis por supervisores (transações são só do admin)
+const EXPORT_REPORTS = [
+  { id: 'licensees', label: 'Licenciados' },
+  { id: 'progress', label: 'Progresso por módulo' },
+  { id: 'assessments', label: 'Avaliações' },
+  { id: 'training_registrations', label: 'Inscrições no treinamento' },
+];
+
 const SupervisorAnalytics = () => {
   const [overview, setOverview] = useState(null);
   const [licensees, setLicensees] = useState([]);
@@ -49,19 +64,21 @@ const SupervisorAnalytics = () => {
     }
   };
 
-  const exportCSV = async () => {
+  const exportReport = async (reportType, format) => {
     try {
-      const response = await axios.get(`${API_URL}/api/analytics/export/csv?report_type=licensees`, {
+      const response = await axios.get(`${API_URL}/api/analytics/export`, {
+        params: { report_type: reportType, format },
         responseType: 'blob'
       });
       
       const url = window.URL.createObjectURL(new Blob([response.data]));
       const link = document.createElement('a');
       link.href = url;
-      link.setAttribute('download', `relatorio_${new Date().toISOString().split('T')[0]}.csv`);
+      link.setAttribute('download', `relatorio_${reportType}_${new Date().toISOString().split('T')[0]}.${format}`);
       document.body.appendChild(link);
       link.click();
       link.remove();
+      window.URL.revokeObjectURL(url);
       
       toast.success('Relatório exportado!');
     } catch (error) {
@@ -103,10 +120,23 @@ const SupervisorAnalytics = () => {
             <h1 className="text-3xl font-outfit font-bold text-slate-900 dark:text-white">Analytics</h1>
             <p className="text-slate-600 dark:text-slate-400 mt-1">Acompanhe o progresso dos seus licenciados</p>
           </div>
-          <Button onClick={exportCSV} variant="outline" data-testid="export-csv-btn">
-            <Download className="w-4 h-4 mr-2" />
-            Exportar CSV
-          </Button>
+          <DropdownMenu>
+            <DropdownMenuTrigger asChild>
+              <Button variant="outline" data-testid="export-csv-btn">
+                <Download className="w-4 h-4 mr-2" />
+                Exportar
+              </Button>
+            </DropdownMenuTrigger>
+            <DropdownMenuContent align="end" className="w-64">
+              {EXPORT_REPORTS.map((report) => (
+                <React.Fragment key={report.id}>
+                  <DropdownMenuLabel>{report.label}</DropdownMenuLabel>
+                  <DropdownMenuItem onClick={() => exportReport(report.id, 'csv')}>CSV</DropdownMenuItem>
+                  <DropdownMenuItem onClick={() => exportReport(report.id, 'xlsx')}>Excel (XLSX)</DropdownMenuItem>
+                </React.Fragment>
+              ))}
+            </DropdownMenuContent>
+          </DropdownMenu>
         </div>
 
         {/* Tabs */}
@@ -22,50 +22,18 @@ async def init_database():
     client = AsyncIOMotorClient(mongo_url)
     db = client[db_name]
     
-    # 1. Criar índices
+    # 1. Criar índices (registro declarativo em backend/indexes.py)
     print("Criando índices...")
     
-    await db.users.create_index("email", unique=True)
-    await db.users.create_index("id", unique=True)
-    await db.users.create_index("supervisor_id")
-    await db.users.create_index("role")
+    from indexes import ensure_indexes
+    report = await ensure_indexes(db)
     
-    await db.modules.create_index("order")
-    await db.modules.create_index("id", unique=True)
-    
-    await db.chapters.create_index("module_id")
-    await db.chapters.create_index("id", unique=True)
-    
-    await db.progress.create_index([("user_id", 1), ("chapter_id", 1)], unique=True)
-    await db.progress.create_index("user_id")
-    
-    await db.badges.create_index("id", unique=True)
-    await db.user_badges.create_index([("user_id", 1), ("badge_id", 1)], unique=True)
-    
-    await db.files.create_index("id", unique=True)
-    await db.files.create_index("folder_id")
-    
-    await db.folders.create_index("id", unique=True)
-    
-    await db.assessments.create_index("module_id")
-    await db.assessment_results.create_index([("user_id", 1), ("assessment_id", 1)])
-    
-    await db.certificates.create_index([("user_id", 1), ("module_id", 1)], unique=True)
-    
-    await db.notifications.create_index("user_id")
-    await db.notifications.create_index([("user_id", 1), ("read", 1)])
-    
-    await db.appointments.create_index("user_id")
-    await db.appointments.create_index([("user_id", 1), ("start_time", 1)])
-    
-    await db.training_classes_v2.create_index("id", unique=True)
-    await db.training_classes_v2.create_index("date")
-    
-    await db.training_registrations.create_index("user_id")
-    await db.training_registrations.create_index("class_id")
-    
-    await db.levels.create_index("id", unique=True)
-    await db.levels.create_index("min_points")
+    for item in report["created"]:
+        print(f"  - {item['collection']}.{item['name']} criado")
+    for item in report["drift"]:
+        print(f"  ! drift em {item['collection']}.{item['name']}: esperado {item['expected']}, encontrado {item['actual']}")
+    for item in report["errors"]:
+        print(f"  ! erro em {item['collection']}.{item['name']}: {item['error']}")
     
     print("Índices criados!")
     
@@ -0,0 +1,130 @@
+"""
+Regression benchmark for supervisor analytics - counts MongoDB round-trips per report
+The reports must cost the same number of queries for 5 or 200 licensees.
+Requires a reachable MongoDB (MONGO_URL); seeds and drops a throwaway database.
+"""
+import asyncio
+import os
+import sys
+import uuid
+
+import pytest
+from pymongo import monitoring
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+
+# getMore depende do tamanho do resultado, não do número de consultas
+COUNTED_COMMANDS = {"find", "aggregate", "count", "distinct"}
+
+MAX_ROUND_TRIPS = {
+    "overview": 2,
+    "licensees_progress": 2,
+    "module_engagement": 2,
+}
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Conta os comandos de leitura enviados ao servidor"""
+
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        if event.command_name in COUNTED_COMMANDS:
+            self.commands.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+@pytest.fixture(scope="module")
+def analytics_env():
+    os.environ['MONGO_URL'] = MONGO_URL
+    os.environ['DB_NAME'] = f"test_analytics_{uuid.uuid4().hex[:8]}"
+
+    import database
+    from services import analytics_service
+
+    loop = asyncio.new_event_loop()
+    # O client do Motor se liga ao loop corrente na criação: o mesmo loop roda os testes
+    asyncio.set_event_loop(loop)
+    counter = CommandCounter()
+    database.provider.close()
+    database.provider.connect(event_listeners=[counter], serverSelectionTimeoutMS=2000)
+
+    try:
+        loop.run_until_complete(database.provider.database.command("ping"))
+    except Exception as e:
+        database.provider.close()
+        loop.close()
+        asyncio.set_event_loop(None)
+        pytest.skip(f"MongoDB not reachable at {MONGO_URL}: {e}")
+
+    yield loop, counter, database, analytics_service
+
+    loop.run_until_complete(database.provider.client.drop_database(os.environ['DB_NAME']))
+    database.provider.close()
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+async def seed(db, supervisor_id: str, licensees: int):
+    """Cria módulos, capítulos e progresso para N licenciados"""
+    await db.modules.delete_many({})
+    await db.chapters.delete_many({})
+    await db.users.delete_many({})
+    await db.user_progress.delete_many({})
+    await db.user_assessments.delete_many({})
+    await db.certificates.delete_many({})
+
+    modules = [{"id": f"m{i}", "title": f"Module {i}", "order": i, "has_assessment": True} for i in range(5)]
+    chapters = [{"id": f"m{i}_c{j}", "module_id": f"m{i}", "order": j} for i in range(5) for j in range(4)]
+    await db.modules.insert_many(modules)
+    await db.chapters.insert_many(chapters)
+    await db.assessments.insert_many([{"id": f"a{i}", "module_id": f"m{i}"} for i in range(5)])
+
+    users, progress, results = [], [], []
+    for u in range(licensees):
+        user_id = f"u{u}"
+        users.append({"id": user_id, "role": "licenciado", "supervisor_id": supervisor_id,
+                      "full_name": f"User {u}", "points": u})
+        for chapter in chapters[: (u % len(chapters)) + 1]:
+            progress.append({"user_id": user_id, "module_id": chapter["module_id"],
+                             "chapter_id": chapter["id"], "completed": True})
+        results.append({"user_id": user_id, "assessment_id": "a0", "passed": u % 2 == 0, "score": 50 + u % 50})
+
+    await db.users.insert_many(users)
+    await db.user_progress.insert_many(progress)
+    await db.user_assessments.insert_many(results)
+
+
+@pytest.mark.parametrize("licensees", [5, 200])
+def test_report_round_trips_do_not_grow_with_licensees(analytics_env, licensees):
+    loop, counter, database, analytics_service = analytics_env
+    current_user = {"sub": "sup1", "role": "supervisor"}
+
+    loop.run_until_complete(seed(database.db, "sup1", licensees))
+
+    reports = {
+        "overview": analytics_service.get_overview,
+        "licensees_progress": analytics_service.get_licensees_progress,
+        "module_engagement": analytics_service.get_module_engagement,
+    }
+
+    for name, report in reports.items():
+        counter.commands.clear()
+        result = loop.run_until_complete(report(current_user))
+        round_trips = len(counter.commands)
+
+        print(f"✓ {name} ({licensees} licensees): {round_trips} round-trips {counter.commands}")
+        assert round_trips <= MAX_ROUND_TRIPS[name], f"{name} issued {round_trips} queries: {counter.commands}"
+        assert result is not None
+
+    progress = loop.run_until_complete(analytics_service.get_licensees_progress(current_user))
+    assert len(progress) == licensees
+    assert progress[0]["points"] >= progress[-1]["points"]
@@ -0,0 +1,123 @@
+"""
+Regression test for certificate jobs left "running" by a restarted process
+The periodic resume task must reclaim jobs whose heartbeat went stale, so the module
+is not blocked (409) forever; jobs with a fresh heartbeat must be left alone.
+Requires a reachable MongoDB (MONGO_URL); seeds and drops a throwaway database.
+"""
+import asyncio
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+
+
+@pytest.fixture(scope="module")
+def jobs_env():
+    os.environ['MONGO_URL'] = MONGO_URL
+    os.environ['DB_NAME'] = f"test_certificate_jobs_{uuid.uuid4().hex[:8]}"
+
+    import database
+    from services import certificate_jobs
+
+    loop = asyncio.new_event_loop()
+    # O client do Motor se liga ao loop corrente na criação: o mesmo loop roda os testes
+    asyncio.set_event_loop(loop)
+    database.provider.close()
+    database.provider.connect(serverSelectionTimeoutMS=2000)
+
+    try:
+        loop.run_until_complete(database.provider.database.command("ping"))
+    except Exception as e:
+        database.provider.close()
+        loop.close()
+        asyncio.set_event_loop(None)
+        pytest.skip(f"MongoDB not reachable at {MONGO_URL}: {e}")
+
+    yield loop, database, certificate_jobs
+
+    loop.run_until_complete(database.provider.client.drop_database(os.environ['DB_NAME']))
+    database.provider.close()
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+def running_job(module_id: str, heartbeat_age_seconds: int) -> dict:
+    heartbeat = datetime.now() - timedelta(seconds=heartbeat_age_seconds)
+    return {
+        "id": str(uuid.uuid4()),
+        "module_id": module_id,
+        "status": "running",
+        "created_by": "admin",
+        "created_at": heartbeat.isoformat(),
+        "heartbeat_at": heartbeat.isoformat(),
+    }
+
+
+def test_stale_running_job_is_reclaimed_after_restart(jobs_env):
+    loop, database, certificate_jobs = jobs_env
+    db = database.provider.database
+
+    async def scenario():
+        # Processo que executava o job caiu e o novo processo subiu antes do prazo:
+        # o resume da subida não o assume, a tarefa periódica sim
+        module_id = str(uuid.uuid4())
+        job = running_job(module_id, heartbeat_age_seconds=certificate_jobs.STALE_AFTER_SECONDS - 5)
+        await db.certificate_jobs.insert_one(job)
+
+        await certificate_jobs.resume_jobs()
+        await asyncio.gather(*list(certificate_jobs._tasks))
+        assert (await certificate_jobs.get_active_job(module_id))["status"] == "running"
+
+        await db.certificate_jobs.update_one(
+            {"id": job["id"]},
+            {"$set": {"heartbeat_at": (datetime.now() - timedelta(seconds=certificate_jobs.STALE_AFTER_SECONDS + 5)).isoformat()}}
+        )
+        assert await certificate_jobs.resume_stale_jobs() == 1
+        await asyncio.gather(*list(certificate_jobs._tasks))
+
+        # O módulo não existe neste banco: o job reassumido termina como falha e libera o módulo
+        finished = await db.certificate_jobs.find_one({"id": job["id"]}, {"_id": 0})
+        assert finished["status"] == "failed"
+        assert await certificate_jobs.get_active_job(module_id) is None
+
+    loop.run_until_complete(scenario())
+
+
+def test_job_with_fresh_heartbeat_is_not_reclaimed(jobs_env):
+    loop, database, certificate_jobs = jobs_env
+    db = database.provider.database
+
+    async def scenario():
+        module_id = str(uuid.uuid4())
+        job = running_job(module_id, heartbeat_age_seconds=10)
+        await db.certificate_jobs.insert_one(job)
+
+        assert await certificate_jobs.resume_stale_jobs() == 0
+        assert (await certificate_jobs.get_active_job(module_id))["status"] == "running"
+
+    loop.run_until_complete(scenario())
+
+
+def test_reclaimed_job_stops_previous_owner(jobs_env):
+    loop, database, certificate_jobs = jobs_env
+    db = database.provider.database
+
+    async def scenario():
+        # Execução lenta cujo heartbeat atrasou: outro processo reassume o job e a
+        # execução anterior perde o direito de gravar certificados
+        job = running_job(str(uuid.uuid4()), heartbeat_age_seconds=certificate_jobs.STALE_AFTER_SECONDS + 5)
+        job["owner"] = "previous"
+        await db.certificate_jobs.insert_one(job)
+
+        claimed = await certificate_jobs._claim(job["id"])
+        assert claimed["owner"] != "previous"
+        assert await certificate_jobs._heartbeat(job["id"], "previous") is False
+        assert await certificate_jobs._heartbeat(job["id"], claimed["owner"]) is True
+
+    loop.run_until_complete(scenario())
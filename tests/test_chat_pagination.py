@@ -0,0 +1,80 @@
+"""
+Test suite for cursor-paginated chat history
+Tests GET /api/chat/conversations/{id}/messages with limit/before/after
+"""
+import time
+
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+# Test credentials
+ADMIN_EMAIL = "admin@ozoxx.com"
+ADMIN_PASSWORD = "admin123"
+
+
+class TestChatPagination:
+    """Tests for keyset pagination and read watermarks"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Setup test session with auth and a few fresh messages"""
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+
+        login_response = self.session.post(f"{BASE_URL}/api/auth/login", json={
+            "email": ADMIN_EMAIL,
+            "password": ADMIN_PASSWORD
+        })
+
+        if login_response.status_code != 200:
+            pytest.skip(f"Admin login failed: {login_response.status_code}")
+
+        token = login_response.json().get("access_token")
+        self.session.headers.update({"Authorization": f"Bearer {token}"})
+
+        self.conversation_id = self.session.get(f"{BASE_URL}/api/chat/conversations/my").json()["id"]
+        run = int(time.time())
+        self.sent = [
+            self.session.post(f"{BASE_URL}/api/chat/messages", json={
+                "conversation_id": self.conversation_id,
+                "message": f"TEST_page {run} #{i}"
+            }).json()["id"]
+            for i in range(6)
+        ]
+
+    def _page(self, **params):
+        return self.session.get(
+            f"{BASE_URL}/api/chat/conversations/{self.conversation_id}/messages",
+            params=params
+        )
+
+    def test_latest_page_is_chronological(self):
+        """Without a cursor the newest messages come back oldest-first"""
+        response = self._page(limit=3)
+
+        assert response.status_code == 200, response.text
+        ids = [m["id"] for m in response.json()]
+        assert ids == self.sent[-3:]
+        print("✓ Latest page returned in chronological order")
+
+    def test_before_and_after_cursors(self):
+        """before/after continue from a message id without gaps or overlap"""
+        older = self._page(before=self.sent[3], limit=3).json()
+        assert [m["id"] for m in older] == self.sent[0:3]
+
+        newer = self._page(after=self.sent[1], limit=2).json()
+        assert [m["id"] for m in newer] == self.sent[2:4]
+        print("✓ Cursors page backwards and forwards")
+
+    def test_invalid_cursor(self):
+        """Unknown cursor is 404, both cursors at once is 400"""
+        assert self._page(before="does-not-exist").status_code == 404
+        assert self._page(before=self.sent[0], after=self.sent[1]).status_code == 400
+        print("✓ Invalid cursors rejected")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
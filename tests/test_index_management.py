@@ -0,0 +1,70 @@
+"""
+Test suite for Index Management - declarative index registry
+Tests GET /api/system/indexes and POST /api/system/indexes/sync
+"""
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+# Test credentials
+ADMIN_EMAIL = "admin@ozoxx.com"
+ADMIN_PASSWORD = "admin123"
+
+
+class TestIndexManagement:
+    """Tests for the index registry admin endpoints"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Setup test session with auth"""
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+
+        login_response = self.session.post(f"{BASE_URL}/api/auth/login", json={
+            "email": ADMIN_EMAIL,
+            "password": ADMIN_PASSWORD
+        })
+
+        if login_response.status_code == 200:
+            token = login_response.json().get("access_token")
+            self.session.headers.update({"Authorization": f"Bearer {token}"})
+        else:
+            pytest.skip(f"Admin login failed: {login_response.status_code}")
+
+    def test_sync_creates_no_missing_indexes(self):
+        """After sync, the registry should have nothing missing"""
+        response = self.session.post(f"{BASE_URL}/api/system/indexes/sync")
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}: {response.text}"
+
+        data = response.json()
+        for field in ["missing", "drift", "extra", "created", "errors", "ok"]:
+            assert field in data, f"Response should contain '{field}'"
+
+        assert data["missing"] == [] or data["errors"], "Missing indexes should be created or reported as errors"
+        print(f"✓ Index sync: {data['ok']} ok, {len(data['created'])} created, {len(data['errors'])} errors")
+
+    def test_index_report_lists_hot_query_indexes(self):
+        """The report should include usage stats for the collections the routes query"""
+        self.session.post(f"{BASE_URL}/api/system/indexes/sync")
+
+        response = self.session.get(f"{BASE_URL}/api/system/indexes")
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}: {response.text}"
+
+        data = response.json()
+        assert "report" in data
+        assert "usage" in data
+        assert "unused" in data
+
+        indexed = {(u["collection"], u.get("name")) for u in data["usage"]}
+        assert ("user_progress", "user_id_1_module_id_1_completed_1") in indexed
+        assert ("training_registrations", "class_id_1_payment_status_1") in indexed
+        assert ("messages", "conversation_id_1_created_at_1_id_1") in indexed
+        assert ("transactions", "user_id_1_purpose_1_status_1") in indexed
+        print(f"✓ Index report lists {len(data['usage'])} indexes")
+
+    def test_index_report_requires_admin(self):
+        """Endpoint must not be public"""
+        response = requests.get(f"{BASE_URL}/api/system/indexes")
+        assert response.status_code in [401, 403], f"Expected 401/403, got {response.status_code}"
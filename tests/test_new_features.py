@@ -219,6 +219,27 @@ class TestAnalyticsExportCSV:
         response = requests.get(f"{BASE_URL}/api/analytics/export/csv", headers=licensee_headers)
         assert response.status_code == 403
 
+    def test_admin_can_export_xlsx(self, admin_headers):
+        """Admin should export every report type as XLSX"""
+        for report_type in ["licensees", "progress", "assessments", "training_registrations", "transactions"]:
+            response = requests.get(
+                f"{BASE_URL}/api/analytics/export",
+                params={"report_type": report_type, "format": "xlsx"},
+                headers=admin_headers
+            )
+            assert response.status_code == 200, f"{report_type}: {response.status_code} {response.text[:200]}"
+            assert "spreadsheetml" in response.headers.get("content-type", "")
+            # XLSX is a zip archive
+            assert response.content[:2] == b"PK"
+        print("XLSX export successful for all report types")
+
+    def test_invalid_report_type(self, admin_headers):
+        """Unknown report type or format should return 400"""
+        response = requests.get(f"{BASE_URL}/api/analytics/export", params={"report_type": "nope"}, headers=admin_headers)
+        assert response.status_code == 400
+        response = requests.get(f"{BASE_URL}/api/analytics/export", params={"format": "pdf"}, headers=admin_headers)
+        assert response.status_code == 400
+
 
 # ==================== PROFILE PICTURE TESTS ====================
 
@@ -509,5 +530,60 @@ class TestFavoritesIntegration:
         print("Full favorites flow completed successfully")
 
 
+# ==================== LEADERBOARD TESTS ====================
+
+class TestLeaderboardPosition:
+    """Test GET /api/stats/leaderboard/me"""
+    
+    def test_licensee_position_matches_dashboard_rank(self, licensee_headers):
+        """Position and neighbours should agree with the dashboard rank"""
+        response = requests.get(f"{BASE_URL}/api/stats/leaderboard/me?radius=1", headers=licensee_headers)
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}: {response.text}"
+        
+        data = response.json()
+        assert data["position"] >= 1
+        assert data["total"] >= data["position"]
+        assert 1 <= len(data["neighbours"]) <= 3
+        
+        dashboard = requests.get(f"{BASE_URL}/api/stats/dashboard", headers=licensee_headers).json()
+        assert dashboard["my_rank"] == data["position"]
+    
+    def test_weekly_leaderboard(self, licensee_headers):
+        """Weekly leaderboard ranks points earned this week"""
+        response = requests.get(f"{BASE_URL}/api/stats/leaderboard?period=week", headers=licensee_headers)
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}: {response.text}"
+        
+        rows = response.json()
+        assert all(row["points"] > 0 for row in rows)
+        assert [row["points"] for row in rows] == sorted((row["points"] for row in rows), reverse=True)
+    
+    def test_invalid_period(self, licensee_headers):
+        """Unknown period should be rejected"""
+        response = requests.get(f"{BASE_URL}/api/stats/leaderboard?period=year", headers=licensee_headers)
+        assert response.status_code == 400
+
+
+# ==================== CHALLENGE TESTS ====================
+
+class TestChallengeEvaluation:
+    """Test POST /api/gamification/challenges/evaluate"""
+
+    def test_admin_evaluates_active_challenges(self, admin_headers, licensee_headers):
+        """Batch evaluation runs and progress stays readable"""
+        response = requests.post(f"{BASE_URL}/api/gamification/challenges/evaluate", headers=admin_headers)
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}: {response.text}"
+
+        data = response.json()
+        assert "challenges" in data and "rewards" in data
+
+        progress = requests.get(f"{BASE_URL}/api/gamification/challenges/my-progress", headers=licensee_headers)
+        assert progress.status_code == 200
+
+    def test_licensee_cannot_evaluate(self, licensee_headers):
+        """Only admins can trigger the batch evaluation"""
+        response = requests.post(f"{BASE_URL}/api/gamification/challenges/evaluate", headers=licensee_headers)
+        assert response.status_code == 403
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,105 @@
+"""
+Test suite for batched watch-progress heartbeats
+Tests POST /api/progress/heartbeat (coalesced writes) and its completion path
+"""
+import time
+
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+# Test credentials
+ADMIN_EMAIL = "admin@ozoxx.com"
+ADMIN_PASSWORD = "admin123"
+
+# Maior que PROGRESS_FLUSH_INTERVAL_MS padrão (2000)
+FLUSH_WAIT_SECONDS = 3
+
+
+class TestProgressHeartbeat:
+    """Tests for the heartbeat batch endpoint"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Setup test session with auth and a scratch module/chapter"""
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+
+        login_response = self.session.post(f"{BASE_URL}/api/auth/login", json={
+            "email": ADMIN_EMAIL,
+            "password": ADMIN_PASSWORD
+        })
+
+        if login_response.status_code != 200:
+            pytest.skip(f"Admin login failed: {login_response.status_code}")
+
+        token = login_response.json().get("access_token")
+        self.session.headers.update({"Authorization": f"Bearer {token}"})
+
+        module = self.session.post(f"{BASE_URL}/api/modules/", json={
+            "title": "TEST_Heartbeat Module",
+            "description": "Módulo de teste",
+            "order": 999
+        }).json()
+        self.module_id = module["id"]
+        self.chapters = [
+            self.session.post(f"{BASE_URL}/api/chapters/", json={
+                "module_id": self.module_id,
+                "title": f"TEST_Heartbeat Chapter {i}",
+                "description": "Capítulo de teste",
+                "order": i,
+                "content_type": "text"
+            }).json()["id"]
+            for i in range(2)
+        ]
+
+        yield
+
+        self.session.delete(f"{BASE_URL}/api/modules/{self.module_id}")
+
+    def _my_progress(self):
+        response = self.session.get(f"{BASE_URL}/api/progress/my-progress")
+        assert response.status_code == 200
+        return {p["chapter_id"]: p for p in response.json() if p["module_id"] == self.module_id}
+
+    def test_heartbeats_are_coalesced_to_max_percentage(self):
+        """Many ticks for the same chapter end up as the highest percentage"""
+        heartbeats = [
+            {"chapter_id": self.chapters[0], "module_id": self.module_id, "watched_percentage": pct}
+            for pct in [10, 40, 25, 60, 55]
+        ]
+        response = self.session.post(f"{BASE_URL}/api/progress/heartbeat", json={"heartbeats": heartbeats})
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}: {response.text}"
+
+        data = response.json()
+        assert data["buffered"] == 5
+        assert data["completed"] == []
+
+        time.sleep(FLUSH_WAIT_SECONDS)
+        progress = self._my_progress()
+        assert progress[self.chapters[0]]["watched_percentage"] == 60
+        assert progress[self.chapters[0]]["completed"] is False
+        print("✓ Heartbeats coalesced to max percentage")
+
+    def test_completion_goes_through_full_path(self):
+        """A completed heartbeat is written immediately; low percentages are rejected"""
+        response = self.session.post(f"{BASE_URL}/api/progress/heartbeat", json={"heartbeats": [
+            {"chapter_id": self.chapters[0], "module_id": self.module_id, "watched_percentage": 95, "completed": True},
+            {"chapter_id": self.chapters[1], "module_id": self.module_id, "watched_percentage": 20, "completed": True},
+        ]})
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}: {response.text}"
+
+        data = response.json()
+        assert data["completed"] == [self.chapters[0]]
+        assert [r["chapter_id"] for r in data["rejected"]] == [self.chapters[1]]
+
+        progress = self._my_progress()
+        assert progress[self.chapters[0]]["completed"] is True
+        print("✓ Completion heartbeat written synchronously")
+
+    def test_heartbeat_requires_auth(self):
+        """Endpoint must not be public"""
+        response = requests.post(f"{BASE_URL}/api/progress/heartbeat", json={"heartbeats": []})
+        assert response.status_code in [401, 403], f"Expected 401/403, got {response.status_code}"
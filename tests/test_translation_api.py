@@ -6,6 +6,7 @@ import pytest
 import requests
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
 
@@ -236,5 +237,46 @@ class TestTranslationPerformance:
         print(f"✓ Translation completed in {elapsed_time:.2f}s")
 
 
+class TestTranslationBatching:
+    """Concurrent identical requests and large batches (chunked on the server)"""
+    
+    def _translate(self, texts):
+        return requests.post(
+            f"{BASE_URL}/api/translate",
+            json={"texts": texts, "target_language": "es", "source_language": "pt-BR"},
+            headers={"Content-Type": "application/json"},
+            timeout=120
+        )
+    
+    def test_concurrent_identical_requests_agree(self):
+        """Identical batches sent at the same time get the same translations"""
+        texts = [f"Capítulo de teste concorrente {i} - {int(time.time())}" for i in range(5)]
+        
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            responses = list(pool.map(lambda _: self._translate(texts), range(8)))
+        
+        for response in responses:
+            assert response.status_code == 200, response.text
+        results = [response.json()["translations"] for response in responses]
+        assert all(result == results[0] for result in results)
+        assert len(results[0]) == len(texts)
+        print(f"✓ 8 concurrent requests returned identical translations")
+    
+    def test_large_batch_keeps_order_and_size(self):
+        """A batch larger than one chunk comes back complete and in order"""
+        texts = [f"Item número {i} da lista de treinamento" for i in range(120)]
+        
+        response = self._translate(texts)
+        
+        assert response.status_code == 200, response.text
+        translations = response.json()["translations"]
+        assert len(translations) == len(texts)
+        assert all(translations)
+        
+        if os.environ.get("TRANSLATION_BACKEND") == "stub":
+            assert translations == [f"[es] {text}" for text in texts]
+        print(f"✓ Batch of {len(texts)} texts translated")
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v", "--tb=short"])